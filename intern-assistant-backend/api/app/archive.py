@@ -0,0 +1,252 @@
+﻿"""
+Sıcak / soğuk vizit arşivi.
+
+Uçlar hep tek bir güne bakar ama visits tablosu (ve indeksleri) sürekli büyür.
+ARCHIVE_AFTER_DAYS > 0 iken bu süreden eski günlerin vizitleri bakım komutuyla
+visits_archive tablosuna taşınır; sınır archive_state.cutoff'ta tutulur:
+
+    gün <  cutoff -> visits_archive
+    gün >= cutoff -> visits
+
+Okuma: gün kapsamlı uçlar tabloyu model_for_day ile seçer; ufuktan yeni günler
+(bugün - ARCHIVE_AFTER_DAYS ve sonrası) hiç sorgu yapılmadan visits'ten okunur,
+daha eski bir gün istenirse cutoff okunur. Aralık okumaları (rapor, dışa aktarım)
+sources, rollup doğrulaması all_sources ile iki tabloyu sınırda bölerek okur.
+
+Taşıma (gün gün, partiler halinde; yarıda kesilirse yeniden çalıştırılabilir):
+1. kopya: günün vizitleri visits_archive'a kopyalanır (okumalar hâlâ visits'ten)
+2. geçiş: cutoff günün ertesine alınır (okumalar artık arşivden)
+3. silme: süren okumalar bitsin diye ARCHIVE_GRACE_SECONDS beklenir, sonra
+   cutoff'tan eski canlı satırlar (ve arama indeksi kayıtları) silinir
+Günlük özetler, gün sürümleri ve değişiklik günlüğü değişmez: görünen veri
+aynıdır (ETag'ler ve PDF önbellek anahtarları geçerli kalır). /sync arşivdeki
+vizitleri de bulur. Arama indeksi sadece sıcak tabloyu kapsar.
+Ufuktan eski vizitler salt okunurdur (düzenleme / silme 409).
+ARCHIVE_AFTER_DAYS=0 iken uçlar arşive bakmaz; arşivlenmiş veri varken
+kapatılmamalı (status uyarır). Rollup doğrulama / yeniden hesaplama, /sync ve
+düzenleme kontrolleri arşivi ayardan bağımsız olarak hesaba katar.
+
+Postgres'te tabloyu aralık bölümlerine (partition) çevirmek yerine aynı arşiv
+tablosu kullanılır: mevcut visits tablosu, birincil anahtarı ve arama kolonu
+olduğu gibi kalır.
+
+Komut satırı (api/ klasöründen):
+    python -m app.archive status
+    python -m app.archive run [--batch 5000] [--dry-run]
+"""
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, distinct, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import search
+from .models import ArchiveState, Visit, VisitArchive
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # 0 -> kapalı
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "5000"))
+ARCHIVE_GRACE_SECONDS = float(os.getenv("ARCHIVE_GRACE_SECONDS", "5"))
+
+_COLUMNS = [c.name for c in VisitArchive.__table__.columns]
+_STATE_ID = 1
+
+
+def enabled() -> bool:
+    return ARCHIVE_AFTER_DAYS > 0
+
+
+def local_today() -> date:
+    # vizit ts'leri yerel (UTC+3) naive saat
+    return (datetime.utcnow() + timedelta(hours=3)).date()
+
+
+def horizon() -> date:
+    """Bu günden eski günler arşivlenebilir (ve salt okunurdur)."""
+    return local_today() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def cutoff(db: Session) -> Optional[date]:
+    return db.execute(select(ArchiveState.cutoff).where(ArchiveState.id == _STATE_ID)).scalar()
+
+
+# ================== Okuma yönlendirme ==================
+def model_for_day(db: Session, d: date):
+    """Yerel gün d'nin vizitlerinin okunacağı model (Visit | VisitArchive)."""
+    if not enabled() or d >= horizon():
+        return Visit
+    c = cutoff(db)
+    return VisitArchive if c is not None and d < c else Visit
+
+
+def sources(db: Session, first: Optional[date] = None, last: Optional[date] = None) -> List[Tuple[type, List]]:
+    """
+    [first, last] (dahil; None -> sınırsız) günleri için (model, sınır koşulları)
+    listesi, zaman sırasıyla (önce arşiv). Sınır koşulları taşıma sırasında iki
+    tabloda birden bulunan satırların iki kez okunmasını önler.
+    """
+    if not enabled() or (first is not None and first >= horizon()):
+        return [(Visit, [])]
+    return _split(db, first, last)
+
+
+def all_sources(db: Session) -> List[Tuple[type, List]]:
+    """Tüm vizitler, ayar kapalı olsa da arşivdekiler dahil (rollup yeniden hesaplama / doğrulama)."""
+    return _split(db, None, None)
+
+
+def _split(db: Session, first: Optional[date], last: Optional[date]) -> List[Tuple[type, List]]:
+    c = cutoff(db)
+    if c is None:
+        return [(Visit, [])]
+    out: List[Tuple[type, List]] = []
+    if first is None or first < c:
+        out.append((VisitArchive, [VisitArchive.day < c]))
+    if last is None or last >= c:
+        out.append((Visit, [Visit.day >= c]))
+    return out
+
+
+def is_frozen(v: Visit) -> bool:
+    """Ufuktan eski (arşivlenmiş ya da arşivlenecek) vizit: düzenlenemez / silinemez."""
+    d = v.day or (v.ts.date() if v.ts else None)
+    return enabled() and d is not None and d < horizon()
+
+
+def is_archived(db: Session, visit_id: int) -> bool:
+    return db.get(VisitArchive, visit_id) is not None
+
+
+# ================== Taşıma ==================
+def _set_cutoff(db: Session, d: date) -> None:
+    state = db.get(ArchiveState, _STATE_ID)
+    if state is None:
+        db.add(ArchiveState(id=_STATE_ID, cutoff=d, updated_at=datetime.utcnow()))
+    elif d > state.cutoff:
+        state.cutoff = d
+        state.updated_at = datetime.utcnow()
+    db.commit()
+
+
+def _copy_day(db: Session, d: date, batch: int) -> int:
+    """Günün canlı vizitlerini arşive kopyala (parti başına commit); kopya sayısı."""
+    # Önceki yarım kalmış kopya (gün henüz cutoff'un gerisinde değil, arşivden okunmuyor)
+    db.execute(delete(VisitArchive).where(VisitArchive.day == d))
+    db.commit()
+    cols = [getattr(Visit, c) for c in _COLUMNS]
+    n, last = 0, 0
+    while True:
+        ids = db.execute(
+            select(Visit.id).where(Visit.day == d, Visit.id > last).order_by(Visit.id).limit(batch)
+        ).scalars().all()
+        if not ids:
+            return n
+        db.execute(insert(VisitArchive).from_select(_COLUMNS, select(*cols).where(Visit.id.in_(ids))))
+        db.commit()
+        n += len(ids)
+        last = ids[-1]
+
+
+def _delete_archived(db: Session, c: date, batch: int) -> int:
+    """cutoff'tan eski, arşivde kopyası olan canlı satırları sil (parti başına commit)."""
+    keep = None
+    if db.get_bind().dialect.name == "sqlite":
+        # AUTOINCREMENT'siz tabloda SQLite yeni id'yi max(id)+1 verir; en büyük id'li
+        # satır canlıda kalır ki arşivdeki id'ler yeniden kullanılmasın (okumalar onu
+        # cutoff sınırı sayesinde görmez).
+        keep = db.execute(select(func.max(Visit.id))).scalar()
+    archived = select(VisitArchive.id).where(VisitArchive.day < c)
+    n = 0
+    while True:
+        q = select(Visit.id).where(Visit.day < c, Visit.id.in_(archived))
+        if keep is not None:
+            q = q.where(Visit.id != keep)
+        ids = db.execute(q.order_by(Visit.id).limit(batch)).scalars().all()
+        if not ids:
+            return n
+        search.unindex_ids(db, ids)
+        db.execute(delete(Visit).where(Visit.id.in_(ids)))
+        db.commit()
+        n += len(ids)
+
+
+def run(
+    db: Session,
+    batch: int = ARCHIVE_BATCH,
+    grace: float = ARCHIVE_GRACE_SECONDS,
+    dry_run: bool = False,
+    log=print,
+) -> Dict:
+    """Ufuktan eski günleri arşive taşı; özet döndür."""
+    if not enabled():
+        raise RuntimeError("Arşiv kapalı (ARCHIVE_AFTER_DAYS=0)")
+    target = horizon()
+    start = cutoff(db)
+    q = select(Visit.day, func.count()).where(Visit.day < target)
+    if start is not None:
+        q = q.where(Visit.day >= start)
+    days = db.execute(q.group_by(Visit.day).order_by(Visit.day)).all()
+    if dry_run:
+        for d, n in days:
+            log(f"{d}: {n} vizit taşınacak")
+        return {"cutoff": start, "target": target, "days": len(days), "visits": sum(n for _, n in days)}
+
+    copied = 0
+    for d, _ in days:
+        t0 = time.perf_counter()
+        n = _copy_day(db, d, batch)
+        _set_cutoff(db, d + timedelta(days=1))
+        copied += n
+        log(f"{d}: {n} vizit kopyalandı ({time.perf_counter() - t0:.1f} sn)")
+    if start is None or target > start:
+        _set_cutoff(db, target)
+
+    c = cutoff(db)
+    if copied and grace > 0:
+        time.sleep(grace)
+    deleted = _delete_archived(db, c, batch)
+    log(f"cutoff={c}: {copied} vizit arşive kopyalandı, {deleted} canlı satır silindi")
+    return {"cutoff": c, "target": target, "days": len(days), "copied": copied, "deleted": deleted}
+
+
+def status(db: Session) -> Dict:
+    c = cutoff(db)
+    out = {
+        "enabled": enabled(),
+        "after_days": ARCHIVE_AFTER_DAYS,
+        "horizon": horizon().isoformat() if enabled() else None,
+        "cutoff": c.isoformat() if c else None,
+        "live_visits": db.execute(select(func.count(Visit.id))).scalar(),
+        "archived_visits": db.execute(select(func.count(VisitArchive.id))).scalar(),
+    }
+    if enabled():
+        out["pending_days"] = db.execute(
+            select(func.count(distinct(Visit.day))).where(Visit.day < horizon(), Visit.day >= (c or date.min))
+        ).scalar()
+    return out
+
+
+if __name__ == "__main__":
+    import json
+
+    from .db import SessionLocal
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=["status", "run"])
+    ap.add_argument("--batch", type=int, default=ARCHIVE_BATCH)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    db = SessionLocal()
+    try:
+        if args.cmd == "run":
+            if not enabled():
+                raise SystemExit("Arşiv kapalı: ARCHIVE_AFTER_DAYS > 0 verilmeli")
+            run(db, batch=args.batch, dry_run=args.dry_run)
+        st = status(db)
+        print(json.dumps(st, indent=2, ensure_ascii=False))
+        if not st["enabled"] and st["archived_visits"]:
+            print("UYARI: arşivde vizit var ama ARCHIVE_AFTER_DAYS=0; uçlar arşivi okumaz.")
+    finally:
+        db.close()
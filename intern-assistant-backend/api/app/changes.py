@@ -0,0 +1,104 @@
+﻿"""
+Delta senkronizasyon (/sync) için değişiklik günlüğü.
+
+Yazma uçları commit'ten hemen önce, aynı transaction içinde visit_changed /
+visits_changed / patients_changed çağırır; her değişiklik `change_log`a artan
+bir seq ile yazılır (silmeler dahil: tombstone). İstemci son gördüğü seq'i
+imleç olarak saklar ve sadece ondan sonraki satırları ister; maliyet gün
+büyüklüğüyle değil değişiklik sayısıyla orantılıdır.
+
+Postgres'te seq (sequence) ekleme anında verilir, commit sırası farklı
+olabilir: geç commit eden düşük bir seq, imleci çoktan ilerlemiş istemcide
+kaçırılırdı. Yazıcılar günlüğe eklemeden önce advisory lock'u *paylaşımlı*
+alır (transaction sonuna kadar); birbirlerini beklemezler. Okuyucu ayrı kısa
+bir transaction'da aynı kilidi *özel* alır: o an ekleme yapıp commit etmemiş
+yazıcı kalmamıştır, görünen en büyük seq "kesinleşmiş" sınırdır ve okuma /
+imleç bu sınırı geçmez. Bedel /sync başına bir ek bağlantı ve süren yazımların
+(günlüğe ekleme -> commit arası) bitmesini beklemektir; bu sırada yeni gelen
+yazıcılar da kısa süre bekler. SQLite zaten tek yazıcılıdır.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from .models import ChangeLog, Patient, Visit
+
+_C = ChangeLog.__table__
+_LOCK_KEY = 7340002
+
+
+def _postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _append(db: Session, rows: List[dict]) -> None:
+    if not rows:
+        return
+    if _postgres(db):
+        db.execute(text("SELECT pg_advisory_xact_lock_shared(:k)"), {"k": _LOCK_KEY})
+    now = datetime.utcnow()
+    db.execute(_C.insert(), [{**r, "at": now} for r in rows])
+
+
+# ================== Yazım kancaları ==================
+def visits_changed(db: Session, visits: Iterable[Visit], op: str = "upsert") -> None:
+    """op: upsert (ekleme / düzenleme) | delete (tombstone)."""
+    _append(db, [
+        {"visit_id": v.id, "patient_id": v.patient_id, "op": op, "author_id": v.author_id}
+        for v in visits
+    ])
+
+
+def visit_changed(db: Session, v: Visit, op: str = "upsert") -> None:
+    visits_changed(db, [v], op)
+
+
+def patients_changed(db: Session, patients: Iterable[Patient]) -> None:
+    _append(db, [
+        {"visit_id": None, "patient_id": p.patient_id, "op": "upsert", "author_id": p.created_by}
+        for p in patients
+    ])
+
+
+# ================== Okuma ==================
+def _max_seq(conn) -> int:
+    return int(conn.execute(select(func.coalesce(func.max(_C.c.seq), 0))).scalar())
+
+
+def _settled(db: Session) -> Optional[int]:
+    """
+    Postgres: bu seq'e kadar (dahil) tüm günlük satırları commit edilmiş ya da
+    geri alınmıştır. Ayrı bağlantıda kısa transaction: kilit commit ile bırakılır
+    (hata olsa da rollback ile). SQLite'ta None (sınır gerekmez).
+    """
+    if not _postgres(db):
+        return None
+    with db.get_bind().connect() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+        high = _max_seq(conn)  # READ COMMITTED: kilitten sonraki yeni snapshot
+        conn.commit()
+    return high
+
+
+def current_cursor(db: Session) -> int:
+    high = _settled(db)
+    return high if high is not None else _max_seq(db)
+
+
+def read(db: Session, since: int, author_id: Optional[int], limit: int) -> Tuple[List, int, bool]:
+    """
+    since'ten sonraki günlük satırları (seq sıralı, en fazla limit).
+    author_id verilirse sadece o kullanıcının kapsamı. Dönüş: (satırlar, yeni imleç, devamı var mı).
+    """
+    q = select(_C).where(_C.c.seq > since)
+    high = _settled(db)
+    if high is not None:
+        q = q.where(_C.c.seq <= high)
+    if author_id is not None:
+        q = q.where(_C.c.author_id == author_id)
+    rows = db.execute(q.order_by(_C.c.seq).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1].seq if rows else since), has_more
@@ -7,6 +7,10 @@ JWT_SECRET = os.getenv("JWT_SECRET", "super-secret-key")  # değiştirilmeli!
 JWT_ALG = "HS256"
 JWT_EXP_MINUTES = 60 * 12  # 12 saat
 
+# Doğrulanmış token -> kullanıcı önbelleği (süreç içi, LRU + TTL)
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "2048"))
+
 # -------------------------------------------------------------------
 # HMAC ayarları (TC'den patient_id türetmek için)
 # -------------------------------------------------------------------
@@ -17,3 +21,11 @@ HMAC_SECRET = os.getenv("HMAC_SECRET", b"intern-assistant-secret")
 # -------------------------------------------------------------------
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASS = os.getenv("ADMIN_PASS", "admin123")
+
+# -------------------------------------------------------------------
+# /metrics erişimi
+# -------------------------------------------------------------------
+# Route / gecikme bilgisi içerir; dışarı açılmamalı. Boşsa /metrics kapalıdır (404);
+# verilirse sadece "Authorization: Bearer <METRICS_TOKEN>" ile okunur (Prometheus:
+# scrape_config -> authorization.credentials).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
@@ -0,0 +1,133 @@
+﻿"""
+Kullanıcı dizini önbelleği (süreç içi).
+
+Uçlar yazar id -> display_name eşlemesi ve author parametresinin
+(önce username, sonra display_name) id'ye çözümlenmesi için her istekte
+users tablosunu okumasın diye tek bir paylaşılan kopya tutulur.
+
+Geçersiz kılma: User ekleyen/değiştiren/silen her commit'ten sonra
+(Session olayları ile) otomatik; toplu `query(...).update()` gibi ORM
+dışı yazımlardan sonra `user_directory.invalidate()` çağrılmalı.
+"""
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import User
+
+
+# (id -> display_name, username -> id, display_name -> id)
+_Snapshot = Tuple[Dict[int, str], Dict[str, int], Dict[str, int]]
+
+
+class UserDirectory:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snap: Optional[_Snapshot] = None
+        self._generation = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._digest: Optional[Tuple[_Snapshot, str]] = None
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- yükleme / geçersiz kılma ----------
+    def add_listener(self, fn: Callable[[], None]) -> None:
+        """Kullanıcılar değiştiğinde (invalidate) çağrılacak fonksiyon ekle."""
+        self._listeners.append(fn)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snap = None
+            self._generation += 1
+        for fn in self._listeners:
+            fn()
+
+    def _ensure(self, db: Session) -> _Snapshot:
+        with self._lock:
+            if self._snap is not None:
+                self.hits += 1
+                return self._snap
+            self.misses += 1
+            gen = self._generation
+
+        names: Dict[int, str] = {}
+        by_username: Dict[str, int] = {}
+        by_display: Dict[str, int] = {}
+        rows = db.query(User.id, User.username, User.display_name).order_by(User.id).all()
+        for uid, username, display_name in rows:
+            names[uid] = display_name
+            by_username[username] = uid
+            # aynı display_name birden çoksa ilk kayıt (eski .first() davranışı)
+            by_display.setdefault(display_name, uid)
+        snap = (names, by_username, by_display)
+
+        with self._lock:
+            # yükleme sırasında geçersiz kılındıysa eski görüntüyü saklama
+            if gen == self._generation:
+                self._snap = snap
+        return snap
+
+    def digest(self, db: Session) -> str:
+        """
+        Kullanıcı dizininin (id, username, display_name) özeti; süreç içi bir
+        sayaç değil veriden türetilir, worker'lar ve yeniden başlatmalar arasında
+        aynıdır (ETag'ler ve diske yazılan PDF önbellek anahtarları için).
+        """
+        snap = self._ensure(db)
+        with self._lock:
+            if self._digest is not None and self._digest[0] is snap:
+                return self._digest[1]
+        names, by_username, _ = snap
+        usernames = {uid: u for u, uid in by_username.items()}
+        rows = sorted((uid, usernames.get(uid, ""), nm) for uid, nm in names.items())
+        value = hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            self._digest = (snap, value)
+        return value
+
+    # ---------- sorgular ----------
+    def names(self, db: Session) -> Dict[int, str]:
+        """id -> display_name (salt okunur kullanın)."""
+        return self._ensure(db)[0]
+
+    def resolve(self, db: Session, author: str) -> Optional[int]:
+        """author: önce username, yoksa display_name -> kullanıcı id (yoksa None)."""
+        _, by_username, by_display = self._ensure(db)
+        uid = by_username.get(author)
+        if uid is None:
+            uid = by_display.get(author)
+        return uid
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._snap[0]) if self._snap else 0,
+            }
+
+
+user_directory = UserDirectory()
+
+
+# ================== Otomatik geçersiz kılma ==================
+@event.listens_for(Session, "before_flush")
+def _mark_user_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            session.info["users_changed"] = True
+            break
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("users_changed", False):
+        user_directory.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("users_changed", None)
@@ -0,0 +1,118 @@
+﻿"""
+Vizit değişiklik akışı (Server-Sent Events) için süreç içi yayıncı.
+
+Yazma uçları commit'ten sonra `broadcaster.publish(...)` çağırır; her /events
+aboneliği kendi event loop'undaki bir kuyruğa, rol filtresinden geçen
+olayları alır (intern -> sadece kendi vizitleri). Son olaylar küçük bir
+halkada tutulur; yeniden bağlanan istemci Last-Event-ID ile kaçırdıklarını alır.
+
+Not: yayıncı süreç içidir; birden çok worker ile çalışırken her worker
+yalnızca kendi yazımlarını yayınlar.
+"""
+import asyncio
+import itertools
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .models import Visit
+
+QUEUE_MAX = 1000
+REPLAY_MAX = 2000
+
+
+class Subscription:
+    def __init__(self, user_id: int, role: str, department: Optional[str], day: Optional[str]):
+        self.user_id = user_id
+        self.role = role
+        self.department = department  # None -> tümü
+        self.day = day  # None -> tümü
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Dict]" = asyncio.Queue(maxsize=QUEUE_MAX)
+        self.overflow = False  # kuyruk taştı -> istemci tam yenileme yapmalı
+
+    def accepts(self, ev: Dict) -> bool:
+        if self.role == "intern" and ev["author_id"] != self.user_id:
+            return False
+        if self.department and ev["department"] != self.department:
+            return False
+        if self.day and ev["day"] != self.day:
+            return False
+        return True
+
+    def _offer(self, ev: Dict) -> None:
+        # sadece abonenin event loop'unda çalışır
+        try:
+            self.queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            self.overflow = True
+
+
+def visit_event(kind: str, visit: Visit, author: str) -> Dict:
+    """
+    Olay gövdesi (commit'ten önce oluşturulur; commit sonrası nesneyi yeniden
+    yüklemek gerekmesin). kind: created | updated | deleted
+    """
+    return {
+        "kind": kind,
+        "visit_id": visit.id,
+        "day": visit.ts.date().isoformat(),
+        "department": visit.department,
+        "author_id": visit.author_id,
+        "author": author,
+    }
+
+
+class Broadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: List[Subscription] = []
+        self._seq = itertools.count(1)
+        self._recent: Deque[Dict] = deque(maxlen=REPLAY_MAX)
+
+    def subscribe(
+        self,
+        user_id: int,
+        role: str,
+        department: Optional[str] = None,
+        day: Optional[str] = None,
+        last_event_id: Optional[int] = None,
+    ) -> Subscription:
+        """Async bağlamdan çağrılmalı (abonenin event loop'u kaydedilir)."""
+        sub = Subscription(user_id, role, department, day)
+        with self._lock:
+            self._subs.append(sub)
+            missed = [ev for ev in self._recent if last_event_id is not None and ev["seq"] > last_event_id]
+        for ev in missed:
+            if sub.accepts(ev):
+                sub._offer(ev)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def publish(self, ev: Dict) -> Dict:
+        """
+        visit_event() çıktısını yayınla. Herhangi bir thread'den çağrılabilir;
+        yazma uçları commit başarılı olduktan sonra çağırır.
+        """
+        with self._lock:
+            ev = {"seq": next(self._seq), **ev}
+            self._recent.append(ev)
+            subs = [s for s in self._subs if s.accepts(ev)]
+        for s in subs:
+            try:
+                s.loop.call_soon_threadsafe(s._offer, ev)
+            except RuntimeError:
+                # event loop kapanmış (bağlantı koptu) -> aboneliği bırak
+                self.unsubscribe(s)
+        return ev
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+
+broadcaster = Broadcaster()
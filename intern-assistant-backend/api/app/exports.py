@@ -0,0 +1,82 @@
+﻿"""
+Vizit dışa aktarımı (CSV / NDJSON) için akış üreticileri.
+
+Satırlar sunucu tarafı imleçle (yield_per -> Postgres'te adlandırılmış imleç,
+SQLite'ta parça parça fetch) okunur ve parça parça yazılır; bellek kullanımı
+satır sayısından bağımsızdır. ORM nesnesi değil yalnızca kolonlar okunur.
+Yazar adları satır başına kullanıcı dizininden (bellekteki küçük sözlük) çözülür.
+
+Üreticiler kendi DB oturumlarını açar/kapatır: yanıt gövdesi, isteğin
+bağımlılıkları (get_db) kapandıktan sonra akar. Okuma kopyası (READ_DATABASE_URL)
+varsa oradan okunur. Sorgu (model, koşullar) parçaları sırayla okunur: arşive
+taşınmış günler önce visits_archive'dan (bkz. archive.sources).
+"""
+import csv
+import io
+import json
+from typing import Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from .db import ReadSessionLocal
+from .directory import user_directory
+
+FETCH_ROWS = 2000  # imleçten parça boyu
+FLUSH_ROWS = 500  # yanıta yazma parça boyu
+
+COLUMNS = (
+    "id", "ts", "patient_id", "author", "department", "text",
+    "drug", "test", "consult", "critical", "edited_at",
+)
+
+
+def _rows(parts: List[Tuple[type, List]]) -> Iterator[tuple]:
+    db: Session = ReadSessionLocal()
+    try:
+        users = user_directory.names(db)
+        for V, conds in parts:
+            q = (
+                db.query(
+                    V.id, V.ts, V.patient_id, V.author_id, V.department, V.text,
+                    V.ops_drug, V.ops_test, V.ops_consult, V.ops_critical, V.edited_at,
+                )
+                .filter(*conds)
+                .order_by(V.ts, V.id)
+                .execution_options(yield_per=FETCH_ROWS)
+            )
+            for vid, ts, pid, aid, dep, text, drug, test, consult, critical, edited in q:
+                yield (
+                    vid, ts.isoformat() if ts else None, pid, users.get(aid, "Bilinmiyor"), dep, text or "",
+                    bool(drug), bool(test), bool(consult), bool(critical),
+                    edited.isoformat() if edited else None,
+                )
+    finally:
+        db.close()
+
+
+def csv_stream(parts: List[Tuple[type, List]]) -> Iterator[str]:
+    # BOM: Excel Türkçe karakterleri UTF-8 olarak tanısın
+    buf = io.StringIO()
+    buf.write("\ufeff")
+    w = csv.writer(buf)
+    w.writerow(COLUMNS)
+    n = 0
+    for row in _rows(parts):
+        w.writerow(["" if v is None else int(v) if isinstance(v, bool) else v for v in row])
+        n += 1
+        if n % FLUSH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def ndjson_stream(parts: List[Tuple[type, List]]) -> Iterator[str]:
+    lines = []
+    for row in _rows(parts):
+        lines.append(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False))
+        if len(lines) == FLUSH_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -1,23 +1,46 @@
-﻿from fastapi import FastAPI, Depends, HTTPException, status, Query, Path
+﻿from fastapi import FastAPI, Depends, HTTPException, status, Query, Path, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, case, insert, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from jose import JWTError
 from datetime import date, datetime, timedelta
 from io import BytesIO
+import asyncio, json
 import hmac, hashlib, base64
 from typing import Optional, Dict, List, Tuple
 
-from .db import Base, engine, get_db
-from .models import User, Patient, Visit
+from .db import DB_ASYNC, SessionLocal, ReadSessionLocal, engine, get_db, get_async_db, get_read_db, get_async_read_db
+from .models import User, Patient, Visit, VisitArchive
 from .schemas import (
     TokenResponse, DeriveRequest, DeriveResponse,
-    PatientCreate, PatientOut, VisitCreate, VisitOut,
-    ReportDaily, AuthorOut
+    PatientCreate, PatientOut, PatientBulkCreate, PatientBulkItem, PatientBulkOut,
+    VisitCreate, VisitOut,
+    VisitBulkCreate, VisitBulkItem, VisitBulkOut,
+    ReportDaily, ReportRange, AuthorOut
 )
-from .security import create_access_token, verify_password, hash_password
-from .config import HMAC_SECRET, ADMIN_USER, ADMIN_PASS
+from .security import create_access_token, decode_access_token, verify_password, hash_password
+from .config import HMAC_SECRET, ADMIN_USER, ADMIN_PASS, METRICS_TOKEN
+from .migrations import upgrade as run_migrations
+from .directory import user_directory
+from .principals import Principal, principal_cache
+from .pdf import HAVE_REPORTLAB, pdf_cache_key, pdf_renderer
+from .prerender import pdf_prerender, prerender_scheduler
+from . import archive, changes, exports, rollups, search
+from .metrics import MetricsMiddleware, registry as metrics_registry
+from .slowlog import slow_query_log
+from .events import broadcaster, visit_event
+
+# ---- Hızlı JSON: orjson (requirements.txt'te sabit; kurulu değilse yerelde json'a düşülür)
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:
+    HAVE_ORJSON = False
 
 
 # ================== App & CORS ==================
@@ -34,41 +57,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-Base.metadata.create_all(bind=engine)
+# Route başına gecikme / durum kodu / SQL ölçümleri (/metrics)
+app.add_middleware(MetricsMiddleware)
 
-# ---- PDF motoru (opsiyonel): reportlab
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib import colors
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    HAVE_REPORTLAB = True
-except Exception:
-    HAVE_REPORTLAB = False
-
-
-# ---- PDF font ayarı (Windows Arial) ----
-def _register_pdf_fonts() -> bool:
-    if not HAVE_REPORTLAB:
-        return False
-    try:
-        # Windows sistem fontları
-        arial_regular = r"C:\Windows\Fonts\arial.ttf"
-        arial_bold    = r"C:\Windows\Fonts\arialbd.ttf"
-        pdfmetrics.registerFont(TTFont("Arial", arial_regular))
-        pdfmetrics.registerFont(TTFont("Arial-Bold", arial_bold))
-        return True
-    except Exception as e:
-        print("PDF font kaydı yapılamadı, Helvetica'ya düşülecek:", e)
-        return False
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# EventSource başlık gönderemez: /events token'ı sorgu parametresinden de kabul eder
+oauth2_optional = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
-_PDF_FONTS_OK = _register_pdf_fonts()
 
+def read_route(path: str, is_async: bool = False, **kwargs):
+    """
+    Okuma uçları için GET kaydı: DB_ASYNC ayarına göre aynı path'e ya sync
+    (threadpool) ya da async sürüm kaydedilir; diğeri düz fonksiyon kalır.
+    """
+    if is_async != DB_ASYNC:
+        return lambda fn: fn
+    return app.get(path, **kwargs)
 
 # ================== Helpers ==================
+class FastJSONResponse(Response):
+    """
+    orjson ile JSON yanıt (yoksa json). jsonable_encoder adımı atlanır: içerik
+    sadece dict/list/str/int/bool/None ve datetime içermeli (datetime -> isoformat;
+    çıktı varsayılan JSONResponse ile aynı).
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if HAVE_ORJSON:
+            return orjson.dumps(content)
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+            default=lambda o: o.isoformat(),
+        ).encode("utf-8")
+
+
+def _fast_json(content, response: Response) -> FastJSONResponse:
+    # Doğrudan dönen Response'a FastAPI, enjekte edilen response'un başlıklarını
+    # (ETag, Cache-Control) eklemez; burada taşınır.
+    return FastJSONResponse(content, headers=dict(response.headers))
+
+
 def _seed_admin(db: Session):
     """İlk kullanıcıları ve hocayı ekle (tek seferlik)."""
     if not db.query(User).filter(User.username == ADMIN_USER).first():
@@ -101,32 +130,62 @@ def _seed_admin(db: Session):
 
 @app.on_event("startup")
 def on_start():
+    # Şema: sürümlü göçler (eksik tablo/indeksler mevcut DB'ye eklenir)
+    run_migrations(engine)
     db = next(get_db())
     _seed_admin(db)
+    # Gün sonu PDF ön üretimi (PDF_PRERENDER_AT verilmişse)
+    if HAVE_REPORTLAB:
+        prerender_scheduler.start(_prerender_day)
+
+
+@app.on_event("shutdown")
+def on_stop():
+    prerender_scheduler.stop()
 
 
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme),
 ) -> User:
-    """JWT'den kullanıcıyı çöz."""
-    from jose import jwt, JWTError
-    from .config import JWT_SECRET, JWT_ALG
+    """
+    JWT'den kullanıcıyı çöz.
+    Doğrulanmış token'lar principal_cache'te tutulur; önbellekten gelen
+    kullanıcı oturuma bağlı olmayan (transient) bir User nesnesidir.
+    """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return User(**cached._asdict())
 
     cred_exc = HTTPException(status_code=401, detail="Invalid credentials")
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise cred_exc
     except JWTError:
         raise cred_exc
+    generation = principal_cache.generation
     user = db.query(User).filter(User.username == username).first()
     if not user:
         raise cred_exc
+    principal_cache.put(
+        token,
+        Principal(id=user.id, username=user.username, display_name=user.display_name, role=user.role),
+        exp=payload.get("exp"),
+        generation=generation,
+    )
     return user
 
 
+async def get_current_user_async(
+    adb: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme),
+) -> User:
+    """get_current_user'ın async karşılığı (aynı doğrulama ve önbellek)."""
+    return await adb.run_sync(lambda db: get_current_user(db=db, token=token))
+
+
 def ist_day_range(day_str: Optional[str]) -> Tuple[datetime, datetime]:
     """
     Seçilen gün için İstanbul (UTC+3) yerel gün aralığını [00:00, 24:00) döndürür.
@@ -141,6 +200,42 @@ def ist_day_range(day_str: Optional[str]) -> Tuple[datetime, datetime]:
     return start, end
 
 
+def _not_modified(
+    request: Request,
+    response: Response,
+    db: Session,
+    current: User,
+    day: Optional[str],
+    department: str = "ALL",
+) -> Optional[Response]:
+    """
+    Koşullu GET: ETag = (uç + sorgu parametreleri, gün, bölüm sürümü, rol kapsamı,
+    kullanıcı dizini özeti). Hepsi veriden türetilir: worker'lar ve yeniden
+    başlatmalar aynı veri için aynı ETag'i üretir. If-None-Match eşleşirse 304
+    döner (vizit sorgusu yok); aksi halde ETag yanıta yazılır ve None döner.
+    Sürüm veriden önce okunur: arada gelen yazım en fazla gereksiz bir 200'e yol açar.
+    """
+    d = ist_day_range(day)[0].date()
+    dep = department.upper() if department != "ALL" else None
+    version = rollups.data_version(db, d, dep)
+    scope = f"intern:{current.id}" if current.role == "intern" else "all"
+    raw = "|".join([
+        request.url.path,
+        "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items())),
+        d.isoformat(), dep or "ALL", str(version), scope, user_directory.digest(db),
+    ])
+    etag = '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    inm = request.headers.get("if-none-match")
+    if inm:
+        tags = [t.strip() for t in inm.split(",")]
+        if "*" in tags or etag in tags or f"W/{etag}" in tags:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 # ================== Auth ==================
 @app.post("/auth/login", response_model=TokenResponse)
 def login(
@@ -162,9 +257,13 @@ def login(
 # ================== Patient ID türetme ==================
 @app.post("/patients/derive", response_model=DeriveResponse)
 def derive_id(inp: DeriveRequest, current: User = Depends(get_current_user)):
-    mac = hmac.new(HMAC_SECRET, inp.tc.encode(), hashlib.sha256).digest()
+    return DeriveResponse(patient_id=_derive_patient_id(inp.tc))
+
+
+def _derive_patient_id(tc: str) -> str:
+    mac = hmac.new(HMAC_SECRET, tc.encode(), hashlib.sha256).digest()
     short = base64.urlsafe_b64encode(mac).decode()[:8].lower()
-    return DeriveResponse(patient_id=f"PX-{short}")
+    return f"PX-{short}"
 
 
 # ================== Patients ==================
@@ -179,12 +278,82 @@ def create_or_get_patient(
         return PatientOut(patient_id=existing.patient_id, label=existing.label)
     obj = Patient(patient_id=p.patient_id, label=p.label or "", created_by=current.id)
     db.add(obj)
+    changes.patients_changed(db, [obj])
     db.commit()
     return PatientOut(patient_id=obj.patient_id, label=obj.label)
 
 
-@app.get("/patients/list")
+@app.post("/patients/bulk", response_model=PatientBulkOut)
+def create_or_get_patients_bulk(
+    body: PatientBulkCreate,
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Toplu hasta kabulü: TC -> hasta kodu türetme + create_or_get tek istekte.
+    Mevcutlar tek sorguda bulunur, eksikler tek çok satırlı INSERT ile eklenir
+    (ON CONFLICT DO NOTHING: eşzamanlı aynı hastayı ekleyen istek hata vermez).
+    Ham TC hiçbir yerde saklanmaz / döndürülmez.
+    """
+    pids = [_derive_patient_id(it.tc) for it in body.items]
+    labels: Dict[str, str] = {}
+    first: Dict[str, int] = {}
+    for i, (pid, it) in enumerate(zip(pids, body.items)):
+        if pid not in labels:  # aynı hasta iki kez: ilk öğe geçerli
+            labels[pid] = it.label or ""
+            first[pid] = i
+
+    existing = dict(
+        db.query(Patient.patient_id, Patient.label).filter(Patient.patient_id.in_(labels)).all()
+    )
+    missing = [pid for pid in labels if pid not in existing]
+    created = set()
+    if missing:
+        rows = [{"patient_id": pid, "label": labels[pid], "created_by": current.id} for pid in missing]
+        name = db.get_bind().dialect.name
+        if name in ("sqlite", "postgresql"):
+            ins = (sqlite_insert if name == "sqlite" else pg_insert)(Patient)
+            stmt = ins.on_conflict_do_nothing(index_elements=["patient_id"]).returning(Patient.patient_id)
+            created = set(db.execute(stmt, rows).scalars().all())
+        else:
+            db.execute(insert(Patient), rows)
+            created = set(missing)
+        lost = [pid for pid in missing if pid not in created]
+        if lost:
+            # Yarışı kaybedenler: diğer isteğin eklediği etiket geçerli
+            existing.update(
+                db.query(Patient.patient_id, Patient.label).filter(Patient.patient_id.in_(lost)).all()
+            )
+        changes.patients_changed(
+            db, [Patient(patient_id=pid, created_by=current.id) for pid in missing if pid in created]
+        )
+    db.commit()
+
+    results = [
+        PatientBulkItem(
+            index=i,
+            patient_id=pid,
+            label=labels[pid] if pid in created else (existing.get(pid) or ""),
+            created=pid in created and first[pid] == i,
+        )
+        for i, pid in enumerate(pids)
+    ]
+    return PatientBulkOut(created=len(created), results=results)
+
+
+def _patient_item(pid: str, label: Optional[str], cnt: int, last_ts: Optional[datetime]) -> Dict:
+    return {
+        "patient_id": pid,
+        "label": label or "",
+        "count_today": int(cnt),
+        "last_visit_ts": last_ts.isoformat() if last_ts else None,
+    }
+
+
+@read_route("/patients/list")
 def list_patients(
+    request: Request,
+    response: Response,
     current: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     department: str = "ALL",
@@ -195,37 +364,36 @@ def list_patients(
     Intern -> sadece kendi vizitlerinden oluşan hastalar
     Supervisor/Admin -> tüm öğrenciler
     """
+    nm = _not_modified(request, response, db, current, day, department)
+    if nm is not None:
+        return nm
     start, end = ist_day_range(day)
+    V = archive.model_for_day(db, start.date())
+    # Etiket aynı sorguda (LEFT JOIN) gelir; hasta başına ek sorgu yok.
     q = (
         db.query(
-            Visit.patient_id.label("pid"),
-            func.count(Visit.id).label("cnt"),
-            func.max(Visit.ts).label("last_ts"),
+            V.patient_id.label("pid"),
+            Patient.label.label("label"),
+            func.count(V.id).label("cnt"),
+            func.max(V.ts).label("last_ts"),
         )
-        .filter(and_(Visit.ts >= start, Visit.ts < end))
+        .outerjoin(Patient, Patient.patient_id == V.patient_id)
+        .filter(and_(V.ts >= start, V.ts < end))
     )
     if department != "ALL":
-        q = q.filter(Visit.department == department.upper())
+        q = q.filter(V.department == department.upper())
     if current.role == "intern":
-        q = q.filter(Visit.author_id == current.id)
-    q = q.group_by(Visit.patient_id).order_by(func.max(Visit.ts).desc())
-
-    items = []
-    for row in q.all():
-        p = db.query(Patient).filter(Patient.patient_id == row.pid).first()
-        items.append(
-            {
-                "patient_id": row.pid,
-                "label": p.label if p else "",
-                "count_today": int(row.cnt),
-                "last_visit_ts": row.last_ts.isoformat() if row.last_ts else None,
-            }
-        )
+        q = q.filter(V.author_id == current.id)
+    q = q.group_by(V.patient_id, Patient.label).order_by(func.max(V.ts).desc(), V.patient_id)
+
+    items = [_patient_item(row.pid, row.label, row.cnt, row.last_ts) for row in q.all()]
     return {"items": items}
 
 
-@app.get("/patients/{patient_id}/visits")
+@read_route("/patients/{patient_id}/visits")
 def patient_visits(
+    request: Request,
+    response: Response,
     patient_id: str = Path(...),
     current: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -235,35 +403,42 @@ def patient_visits(
     Seçili hasta için sadece SEÇİLİ GÜN vizitleri (departmandan bağımsız).
     Intern -> sadece kendi vizitlerini görür.
     """
+    nm = _not_modified(request, response, db, current, day)
+    if nm is not None:
+        return nm
     start, end = ist_day_range(day)
-    q = db.query(Visit).filter(
-        Visit.patient_id == patient_id, and_(Visit.ts >= start, Visit.ts < end)
+    V = archive.model_for_day(db, start.date())
+    # ORM nesnesi değil sadece gereken kolonlar (satır başına hidrasyon yok)
+    q = db.query(
+        V.id, V.ts, V.author_id, V.text, V.department, V.edited_at,
+        V.ops_drug, V.ops_test, V.ops_consult, V.ops_critical,
+    ).filter(
+        V.patient_id == patient_id, and_(V.ts >= start, V.ts < end)
     )
     if current.role == "intern":
-        q = q.filter(Visit.author_id == current.id)
-
-    rows = q.order_by(Visit.ts.asc()).all()
-    users = {u.id: u.display_name for u in db.query(User).all()}
-    out = []
-    for r in rows:
-        out.append(
-            {
-                "id": r.id,
-                "ts": r.ts.isoformat(),
-                "author": users.get(r.author_id, "?"),
-                "text": r.text,
-                "department": r.department,
-                "edited_at": r.edited_at.isoformat() if r.edited_at else None,
-                "ops": {
-                    "drug": bool(r.ops_drug),
-                    "test": bool(r.ops_test),
-                    "consult": bool(r.ops_consult),
-                    "critical": bool(r.ops_critical),
-                },
-            }
-        )
-    p = db.query(Patient).filter(Patient.patient_id == patient_id).first()
-    return {"patient_id": patient_id, "label": (p.label if p else ""), "visits": out}
+        q = q.filter(V.author_id == current.id)
+
+    rows = q.order_by(V.ts.asc()).all()
+    users = user_directory.names(db)
+    out = [
+        {
+            "id": r.id,
+            "ts": r.ts,
+            "author": users.get(r.author_id, "?"),
+            "text": r.text,
+            "department": r.department,
+            "edited_at": r.edited_at,
+            "ops": {
+                "drug": bool(r.ops_drug),
+                "test": bool(r.ops_test),
+                "consult": bool(r.ops_consult),
+                "critical": bool(r.ops_critical),
+            },
+        }
+        for r in rows
+    ]
+    label = db.query(Patient.label).filter(Patient.patient_id == patient_id).scalar()
+    return _fast_json({"patient_id": patient_id, "label": label or "", "visits": out}, response)
 
 
 # ================== Visits (CRUD) ==================
@@ -290,11 +465,89 @@ def create_visit(
         ts=ist_now,
     )
     db.add(rec)
+    db.flush()
+    rollups.visit_added(db, rec)
+    search.index_visit(db, rec)
+    changes.visit_changed(db, rec)
+    ev = visit_event("created", rec, current.display_name)
     db.commit()
+    broadcaster.publish(ev)
     db.refresh(rec)
     return rec
 
 
+@app.post("/visits/bulk", response_model=VisitBulkOut)
+def create_visits_bulk(
+    body: VisitBulkCreate,
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Toplu vizit girişi (vizit turu, eski notların aktarımı).
+    Hasta varlığı tek sorguda denetlenir; geçerli öğeler tek INSERT (executemany)
+    ve tek transaction ile yazılır. Sonuç her öğe için ayrı döner (sıra korunur).
+    """
+    pids = {v.patient_id for v in body.items}
+    known = {pid for (pid,) in db.query(Patient.patient_id).filter(Patient.patient_id.in_(pids))}
+
+    ist_now = datetime.utcnow() + timedelta(hours=3)
+    rows = []
+    for v in body.items:
+        if v.patient_id in known:
+            rows.append(
+                dict(
+                    patient_id=v.patient_id,
+                    author_id=current.id,
+                    text=v.text,
+                    ops_drug=v.ops_drug,
+                    ops_test=v.ops_test,
+                    ops_consult=v.ops_consult,
+                    ops_critical=v.ops_critical,
+                    department=(v.department or "GENEL").upper(),
+                    ts=ist_now,
+                )
+            )
+
+    recs: List[Visit] = []
+    if rows:
+        # SQLite'ta parametre sıralı RETURNING satır satır INSERT'e düşer; orada
+        # rowid'ler VALUES sırasıyla artar, dönen id'leri sıralamak eşlemeye yeter.
+        sqlite = db.get_bind().dialect.name == "sqlite"
+        stmt = insert(Visit).returning(Visit.id, sort_by_parameter_order=not sqlite)
+        ids = db.execute(stmt, rows).scalars().all()
+        if sqlite:
+            ids = sorted(ids)
+        recs = [Visit(id=vid, **row) for vid, row in zip(ids, rows)]
+        rollups.visits_added(db, recs)
+        search.index_visits(db, recs)
+        changes.visits_changed(db, recs)
+    events = [visit_event("created", rec, current.display_name) for rec in recs]
+    db.commit()
+    for ev in events:
+        broadcaster.publish(ev)
+
+    results = []
+    it = iter(recs)
+    for i, v in enumerate(body.items):
+        if v.patient_id in known:
+            results.append(VisitBulkItem(index=i, ok=True, id=next(it).id))
+        else:
+            results.append(VisitBulkItem(index=i, ok=False, error="Patient not found"))
+    return VisitBulkOut(created=len(recs), results=results)
+
+
+def _writable_visit(db: Session, visit_id: int) -> Visit:
+    """Düzenlenecek / silinecek vizit; arşivdeki ya da arşiv ufkundan eski vizitler salt okunur (409)."""
+    rec = db.query(Visit).filter(Visit.id == visit_id).first()
+    if not rec:
+        if archive.is_archived(db, visit_id):
+            raise HTTPException(409, "Arşivlenmiş vizit değiştirilemez")
+        raise HTTPException(404, "Visit not found")
+    if archive.is_frozen(rec):
+        raise HTTPException(409, "Arşivlenmiş vizit değiştirilemez")
+    return rec
+
+
 @app.put("/visits/{visit_id}")
 def update_visit(
     visit_id: int,
@@ -302,13 +555,12 @@ def update_visit(
     current: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    rec = db.query(Visit).filter(Visit.id == visit_id).first()
-    if not rec:
-        raise HTTPException(404, "Visit not found")
+    rec = _writable_visit(db, visit_id)
     # Sadece yazan kişi düzenleyebilir
     if rec.author_id != current.id:
         raise HTTPException(403, "Sadece kendi vizitinizi düzenleyebilirsiniz")
 
+    old_flags = rollups.visit_flags(rec)
     text = patch.get("text")
     if text is not None:
         rec.text = text
@@ -321,7 +573,13 @@ def update_visit(
         if k in patch:
             setattr(rec, attr, bool(patch[k]))
     rec.edited_at = datetime.utcnow() + timedelta(hours=3)
+    rollups.visit_flags_changed(db, rec, old_flags)
+    if text is not None:
+        search.index_visit(db, rec)
+    changes.visit_changed(db, rec)
+    ev = visit_event("updated", rec, current.display_name)
     db.commit()
+    broadcaster.publish(ev)
     return {"ok": True}
 
 
@@ -331,74 +589,49 @@ def delete_visit(
     current: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    rec = db.query(Visit).filter(Visit.id == visit_id).first()
-    if not rec:
-        raise HTTPException(404, "Visit not found")
+    rec = _writable_visit(db, visit_id)
     if rec.author_id != current.id:
         raise HTTPException(403, "Sadece kendi vizitinizi silebilirsiniz")
     db.delete(rec)
+    db.flush()
+    rollups.visit_removed(db, rec)
+    search.unindex_visit(db, rec)
+    changes.visit_changed(db, rec, "delete")
+    ev = visit_event("deleted", rec, current.display_name)
     db.commit()
+    broadcaster.publish(ev)
     return {"ok": True}
 
 
 # ================== Reports & Feeds ==================
-@app.get("/reports/daily", response_model=ReportDaily)
-def report_daily(
-    current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    department: str = "ALL",
-    day: Optional[str] = None,
-    author: Optional[str] = None,
-):
+def _build_report(
+    per_author: List,
+    patients_by_author: Dict[int, int],
+    patients_seen: int,
+    users: Dict[int, str],
+) -> ReportDaily:
     """
-    Günlük özet: toplam kritik, ilaç, tetkik, konsültasyon ve
-    öğrenci bazlı (patients/visits/critical) detaylar.
-    Intern -> sadece kendi verisi; Hoca/Admin -> hepsi (isteğe bağlı author filtresi).
+    Yazar satırlarından (aid, visits, critical, drugs, tests, consults; ilk vizit
+    sırasına göre) günlük rapor gövdesi. /reports/daily ve /dashboard ortak kullanır.
     """
-    start, end = ist_day_range(day)
-    q = db.query(Visit).filter(and_(Visit.ts >= start, Visit.ts < end))
-    if department != "ALL":
-        q = q.filter(Visit.department == department.upper())
-
-    if current.role == "intern":
-        q = q.filter(Visit.author_id == current.id)
-    else:
-        if author:
-            # author: önce username, yoksa display_name
-            u = db.query(User).filter(User.username == author).first()
-            if not u:
-                u = db.query(User).filter(User.display_name == author).first()
-            if u:
-                q = q.filter(Visit.author_id == u.id)
-
-    rows = q.all()
-    patients_seen = len(set(r.patient_id for r in rows))
     totals = {"critical": 0, "drugs": 0, "tests": 0, "consults": 0}
     by_author: Dict[str, int] = {}
     by_author_detail: Dict[str, Dict[str, int]] = {}
-    users = {u.id: u.display_name for u in db.query(User).all()}
 
-    for r in rows:
-        if r.ops_critical:
-            totals["critical"] += 1
-        if r.ops_drug:
-            totals["drugs"] += 1
-        if r.ops_test:
-            totals["tests"] += 1
-        if r.ops_consult:
-            totals["consults"] += 1
-        nm = users.get(r.author_id, "Bilinmiyor")
-        by_author[nm] = by_author.get(nm, 0) + 1
-
-    # Öğrenci detayları
-    author_ids = list(set([r.author_id for r in rows]))
-    for aid in author_ids:
-        nm = users.get(aid, "Bilinmiyor")
-        arr = [r for r in rows if r.author_id == aid]
-        by_author_detail[nm] = {
-            "patients": len(set(x.patient_id for x in arr)),
-            "visits": len(arr),
-            "critical": sum(1 for x in arr if x.ops_critical),
+    for g in per_author:
+        for k in totals:
+            totals[k] += int(getattr(g, k) or 0)
+        nm = users.get(g.aid, "Bilinmiyor")
+        by_author[nm] = by_author.get(nm, 0) + int(g.visits)
+
+    # Öğrenci detayları (aynı isimli öğrencilerde eski davranış: set sırasında son yazan kazanır)
+    groups = {g.aid: g for g in per_author}
+    for aid in list(set(groups)):
+        g = groups[aid]
+        by_author_detail[users.get(aid, "Bilinmiyor")] = {
+            "patients": int(patients_by_author.get(aid, 0)),
+            "visits": int(g.visits),
+            "critical": int(g.critical or 0),
         }
 
     lines = []
@@ -420,131 +653,800 @@ def report_daily(
     )
 
 
-@app.get("/visits/by_department")
+@read_route("/reports/daily", response_model=ReportDaily)
+def report_daily(
+    request: Request,
+    response: Response,
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    department: str = "ALL",
+    day: Optional[str] = None,
+    author: Optional[str] = None,
+):
+    """
+    Günlük özet: toplam kritik, ilaç, tetkik, konsültasyon ve
+    öğrenci bazlı (patients/visits/critical) detaylar.
+    Intern -> sadece kendi verisi; Hoca/Admin -> hepsi (isteğe bağlı author filtresi).
+    """
+    nm = _not_modified(request, response, db, current, day, department)
+    if nm is not None:
+        return nm
+    start, end = ist_day_range(day)
+    dep = department.upper() if department != "ALL" else None
+    aid = None
+    if current.role == "intern":
+        aid = current.id
+    else:
+        if author:
+            # author: önce username, yoksa display_name
+            aid = user_directory.resolve(db, author)
+
+    # Sayımlar günlük özet tablolarından: yazar başına tek satır (vizit taraması yok).
+    # first_id, yazarın o günkü ilk vizit id'si -> by_author sırası korunur.
+    per_author, patients_by_author, patients_seen = rollups.daily_counts(
+        db, start.date(), department=dep, author_id=aid,
+    )
+
+    return _build_report(per_author, patients_by_author, patients_seen, user_directory.names(db))
+
+
+RANGE_MAX_DAYS = 366
+
+
+@read_route("/reports/range", response_model=ReportRange)
+def report_range(
+    day_from: str = Query(..., alias="from"),
+    day_to: str = Query(..., alias="to"),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    department: str = "ALL",
+    author: Optional[str] = None,
+):
+    """
+    Çok günlü özet (rotasyon haftası / ayı): gün, bölüm ve öğrenci kırılımları.
+    Tek GROUP BY sorgusu, visits.day (yerel gün) indeksinden; gün başına istek yok.
+    Intern -> sadece kendi verisi; Hoca/Admin -> hepsi (isteğe bağlı author filtresi).
+    """
+    try:
+        d1, d2 = date.fromisoformat(day_from), date.fromisoformat(day_to)
+    except ValueError:
+        raise HTTPException(400, "Tarih YYYY-AA-GG biçiminde olmalı")
+    if d2 < d1 or (d2 - d1).days >= RANGE_MAX_DAYS:
+        raise HTTPException(400, f"Aralık en fazla {RANGE_MAX_DAYS} gün olabilir (from <= to)")
+
+    keys = ("visits",) + tuple(col for col, _ in rollups.FLAGS)
+    aid = None
+    if current.role == "intern":
+        aid = current.id
+    elif author:
+        aid = user_directory.resolve(db, author)
+
+    def grouped(V, conds: List) -> List:
+        q = db.query(
+            V.day,
+            V.department,
+            V.author_id,
+            func.count(V.id),
+            *[func.sum(case((getattr(V, attr) == True, 1), else_=0)) for _, attr in rollups.FLAGS],  # noqa: E712
+        ).filter(V.day >= d1, V.day <= d2, *conds)
+        if department != "ALL":
+            q = q.filter(V.department == department.upper())
+        if aid is not None:
+            q = q.filter(V.author_id == aid)
+        return q.group_by(V.day, V.department, V.author_id).all()
+
+    def zero() -> Dict[str, int]:
+        return dict.fromkeys(keys, 0)
+
+    totals = zero()
+    by_day = {(d1 + timedelta(days=i)).isoformat(): zero() for i in range((d2 - d1).days + 1)}
+    by_department: Dict[str, Dict[str, int]] = {}
+    by_author: Dict[str, Dict[str, int]] = {}
+    users = user_directory.names(db)
+    # Arşive taşınmış günler arşiv tablosundan (aralık sınırı geçiyorsa iki sorgu)
+    rows = [r for V, conds in archive.sources(db, d1, d2) for r in grouped(V, conds)]
+    for d, dep, row_aid, *nums in rows:
+        for bucket in (
+            totals,
+            by_day[d.isoformat()],
+            by_department.setdefault(dep or "", zero()),
+            by_author.setdefault(users.get(row_aid, "Bilinmiyor"), zero()),
+        ):
+            for k, n in zip(keys, nums):
+                bucket[k] += int(n or 0)
+
+    return ReportRange(
+        day_from=d1.isoformat(),
+        day_to=d2.isoformat(),
+        totals=totals,
+        by_day=by_day,
+        by_department=dict(sorted(by_department.items())),
+        by_author=dict(sorted(by_author.items())),
+    )
+
+
+# Akış satırı için gereken kolonlar (by_department bunları düz satır olarak okur)
+_FEED_COLUMNS = (
+    "id", "patient_id", "author_id", "ts", "text", "department", "edited_at",
+    "ops_drug", "ops_test", "ops_consult", "ops_critical",
+)
+
+
+def _feed_columns(V=Visit) -> List:
+    return [getattr(V, c) for c in _FEED_COLUMNS]
+
+
+def _feed_item(r) -> Dict:
+    """Visit / VisitArchive ya da _FEED_COLUMNS satırı -> akış öğesi (datetime'lar JSON kodlamasında isoformat olur)."""
+    return {
+        "id": r.id,
+        "patient_id": r.patient_id,
+        "ts": r.ts,
+        "text": r.text,
+        "department": r.department,
+        "edited_at": r.edited_at,
+        "ops": {
+            "drug": bool(r.ops_drug),
+            "test": bool(r.ops_test),
+            "consult": bool(r.ops_consult),
+            "critical": bool(r.ops_critical),
+        },
+    }
+
+
+def _encode_cursor(r) -> str:
+    raw = f"{r.ts.isoformat()}|{r.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, vid = raw.split("|")
+        return datetime.fromisoformat(ts), int(vid)
+    except ValueError:
+        raise HTTPException(400, "Geçersiz cursor")
+
+
+@read_route("/visits/by_department")
 def by_department(
+    request: Request,
+    response: Response,
     current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     department: str = "ALL",
     day: Optional[str] = None,
     author: Optional[str] = None,
     limit: int = 200,
+    cursor: Optional[str] = None,
 ):
     """
     Bölüm akışı: seçili gün + bölüm için vizitler (zaman ters sıralı).
     Intern -> sadece kendi kayıtları; Hoca/Admin -> hepsi (isteğe bağlı author filtresi).
+    Sayfalama (ts, id) anahtarıyla: sonraki sayfa için next_cursor aynı filtrelerle
+    geri gönderilir. Derin sayfalar da indeksten doğrudan başlar; yeni vizitler
+    (daha yeni ts) sayfalara kayma / tekrar getirmez.
     """
+    nm = _not_modified(request, response, db, current, day, department)
+    if nm is not None:
+        return nm
     start, end = ist_day_range(day)
-    q = db.query(Visit).filter(and_(Visit.ts >= start, Visit.ts < end))
+    V = archive.model_for_day(db, start.date())
+    q = db.query(*_feed_columns(V)).filter(and_(V.ts >= start, V.ts < end))
     if department != "ALL":
-        q = q.filter(Visit.department == department.upper())
+        q = q.filter(V.department == department.upper())
 
     if current.role == "intern":
-        q = q.filter(Visit.author_id == current.id)
+        q = q.filter(V.author_id == current.id)
     else:
         if author:
-            u = db.query(User).filter(User.username == author).first()
-            if not u:
-                u = db.query(User).filter(User.display_name == author).first()
-            if u:
-                q = q.filter(Visit.author_id == u.id)
-
-    q = q.order_by(Visit.ts.desc()).limit(limit)
-    users = {u.id: u.display_name for u in db.query(User).all()}
+            aid = user_directory.resolve(db, author)
+            if aid is not None:
+                q = q.filter(V.author_id == aid)
+
+    if cursor:
+        q = q.filter(tuple_(V.ts, V.id) < _decode_cursor(cursor))
+
+    # Bir fazla satır: devam sayfası var mı?
+    rows = q.order_by(V.ts.desc(), V.id.desc()).limit(max(limit, 0) + 1).all()
+    page = rows[: max(limit, 0)]
+    users = user_directory.names(db)
     out: Dict[str, List[Dict]] = {}
-    for r in q.all():
+    for r in page:
         who = users.get(r.author_id, "Bilinmiyor")
-        out.setdefault(who, []).append(
-            {
-                "id": r.id,
-                "patient_id": r.patient_id,
-                "ts": r.ts.isoformat(),
-                "text": r.text,
-                "department": r.department,
-                "edited_at": r.edited_at.isoformat() if r.edited_at else None,
-                "ops": {
-                    "drug": bool(r.ops_drug),
-                    "test": bool(r.ops_test),
-                    "consult": bool(r.ops_consult),
-                    "critical": bool(r.ops_critical),
-                },
-            }
+        out.setdefault(who, []).append(_feed_item(r))
+    next_cursor = _encode_cursor(page[-1]) if page and len(rows) > len(page) else None
+    return _fast_json({"by_author": out, "next_cursor": next_cursor}, response)
+
+
+@read_route("/visits/search")
+def search_visits(
+    q: str = Query(..., min_length=1),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    department: str = "ALL",
+    day_from: Optional[str] = None,
+    day_to: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Not içeriğinde arama (tam metin indeksi; bkz. search.py). İlgililiğe göre sıralı.
+    Sadece sıcak tablo aranır (arşive taşınmış vizitler çıkmaz; bkz. archive.py).
+    day_from / day_to: dahil yerel gün aralığı (ikisi de isteğe bağlı).
+    Intern -> sadece kendi vizitleri; Hoca/Admin -> hepsi (isteğe bağlı author filtresi).
+    """
+    words = search.terms(q)
+    if not words:
+        return {"items": [], "next_offset": None}
+
+    qry = db.query(Visit)
+    if day_from:
+        qry = qry.filter(Visit.ts >= ist_day_range(day_from)[0])
+    if day_to:
+        qry = qry.filter(Visit.ts < ist_day_range(day_to)[1])
+    if department != "ALL":
+        qry = qry.filter(Visit.department == department.upper())
+    if current.role == "intern":
+        qry = qry.filter(Visit.author_id == current.id)
+    elif author:
+        aid = user_directory.resolve(db, author)
+        if aid is not None:
+            qry = qry.filter(Visit.author_id == aid)
+
+    rows = search.apply(db, qry, words).offset(offset).limit(limit + 1).all()
+    users = user_directory.names(db)
+    items = [
+        {**_feed_item(r), "author": users.get(r.author_id, "Bilinmiyor")}
+        for r in rows[:limit]
+    ]
+    return {"items": items, "next_offset": offset + limit if len(rows) > limit else None}
+
+
+class _AuthorCounts:
+    """Dashboard'da bellekte biriktirilen yazar satırı (rollups.daily_counts satırıyla aynı alanlar)."""
+
+    __slots__ = ("aid", "first_id", "visits", "critical", "drugs", "tests", "consults")
+
+    def __init__(self, aid: int, first_id: int):
+        self.aid = aid
+        self.first_id = first_id
+        self.visits = self.critical = self.drugs = self.tests = self.consults = 0
+
+
+@read_route("/dashboard")
+def dashboard(
+    request: Request,
+    response: Response,
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    department: str = "ALL",
+    day: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: int = 200,
+):
+    """
+    Tek istekte ekranın üç parçası: /reports/daily, /visits/by_department ve
+    /patients/list yanıtları (aynı parametrelerle ayrı çağrılarla birebir aynı).
+    Günün vizitleri tek sorguda (hasta etiketiyle birlikte) okunur, üç gövde
+    aynı geçişten bellekte kurulur.
+    """
+    nm = _not_modified(request, response, db, current, day, department)
+    if nm is not None:
+        return nm
+    start, end = ist_day_range(day)
+    V = archive.model_for_day(db, start.date())
+    q = (
+        db.query(V, Patient.label)
+        .outerjoin(Patient, Patient.patient_id == V.patient_id)
+        .filter(and_(V.ts >= start, V.ts < end))
+    )
+    if department != "ALL":
+        q = q.filter(V.department == department.upper())
+    if current.role == "intern":
+        q = q.filter(V.author_id == current.id)
+    rows = q.all()
+
+    # Hasta listesi author filtresini tanımaz; rapor ve akış tanır (bulunamazsa filtre yok).
+    aid = None
+    if current.role != "intern" and author:
+        aid = user_directory.resolve(db, author)
+
+    patients: Dict[str, list] = {}
+    per_author: Dict[int, _AuthorCounts] = {}
+    patient_sets: Dict[int, set] = {}
+    feed: List[Visit] = []
+    for v, label in rows:
+        p = patients.get(v.patient_id)
+        if p is None:
+            patients[v.patient_id] = [label, 1, v.ts]
+        else:
+            p[1] += 1
+            if v.ts > p[2]:
+                p[2] = v.ts
+
+        if aid is not None and v.author_id != aid:
+            continue
+        feed.append(v)
+        # Yazarsız vizitler özet tablolarda olduğu gibi 0 anahtarında toplanır.
+        key = v.author_id or 0
+        g = per_author.get(key)
+        if g is None:
+            g = per_author[key] = _AuthorCounts(key, v.id)
+        g.first_id = min(g.first_id, v.id)
+        g.visits += 1
+        g.critical += bool(v.ops_critical)
+        g.drugs += bool(v.ops_drug)
+        g.tests += bool(v.ops_test)
+        g.consults += bool(v.ops_consult)
+        patient_sets.setdefault(key, set()).add(v.patient_id)
+
+    users = user_directory.names(db)
+
+    groups = sorted(per_author.values(), key=lambda g: g.first_id)
+    seen = set().union(*patient_sets.values()) if patient_sets else set()
+    report = _build_report(
+        groups, {k: len(s) for k, s in patient_sets.items()}, len(seen), users,
+    )
+
+    feed.sort(key=lambda v: (v.ts, v.id), reverse=True)
+    page = feed[: max(limit, 0)]
+    by_author: Dict[str, List[Dict]] = {}
+    for v in page:
+        by_author.setdefault(users.get(v.author_id, "Bilinmiyor"), []).append(_feed_item(v))
+    next_cursor = _encode_cursor(page[-1]) if page and len(feed) > len(page) else None
+
+    items = sorted(patients.items(), key=lambda kv: kv[0])
+    items.sort(key=lambda kv: kv[1][2], reverse=True)
+
+    return {
+        "report": report,
+        "feed": {"by_author": by_author, "next_cursor": next_cursor},
+        "patients": {"items": [_patient_item(pid, *p) for pid, p in items]},
+    }
+
+
+# ================== Delta senkronizasyon ==================
+@read_route("/sync")
+def sync(
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=2000),
+):
+    """
+    since imlecinden sonra eklenen / düzenlenen / silinen vizitler ve eklenen hastalar.
+    since verilmezse sadece güncel imleç döner (istemci önce gün görünümünü yükler,
+    sonra bu imleçten devam eder). has_more=true ise dönen imleçle tekrar çağrılır.
+    Intern -> sadece kendi vizitleri ve eklediği hastalar; Hoca/Admin -> hepsi.
+    Dönen vizitlerin hastaları da (başkası eklemiş olsa bile) aynı sayfada gelir;
+    istemcide hastası olmayan vizit kalmaz.
+    """
+    if since is None:
+        return {"cursor": changes.current_cursor(db), "has_more": False,
+                "visits": [], "deleted_visit_ids": [], "patients": []}
+
+    aid = current.id if current.role == "intern" else None
+    rows, cursor, has_more = changes.read(db, since, aid, limit)
+
+    # Aynı kayda ait birden çok değişiklik: sadece sonuncusu önemli
+    last_op: Dict[int, str] = {}
+    pids = set()
+    for r in rows:
+        if r.visit_id is not None:
+            last_op[r.visit_id] = r.op
+        elif r.patient_id:
+            pids.add(r.patient_id)
+
+    live = [vid for vid, op in last_op.items() if op == "upsert"]
+    recs = db.query(Visit).filter(Visit.id.in_(live)).order_by(Visit.id).all() if live else []
+    found = {r.id for r in recs}
+    # Arşive taşınan vizitler silinmiş sayılmaz
+    missing = [vid for vid in live if vid not in found]
+    if missing:
+        old = db.query(VisitArchive).filter(VisitArchive.id.in_(missing)).all()
+        recs = sorted(recs + old, key=lambda r: r.id)
+        found.update(r.id for r in old)
+    # Bu sayfadan sonra silinmiş olanlar da tombstone olarak gider (silme idempotent)
+    deleted = sorted(vid for vid in last_op if vid not in found)
+
+    users = user_directory.names(db)
+    pids.update(r.patient_id for r in recs)
+    patients = db.query(Patient).filter(Patient.patient_id.in_(pids)).all() if pids else []
+    return {
+        "cursor": cursor,
+        "has_more": has_more,
+        "visits": [{**_feed_item(r), "author": users.get(r.author_id, "Bilinmiyor")} for r in recs],
+        "deleted_visit_ids": deleted,
+        "patients": [
+            {"patient_id": p.patient_id, "label": p.label or ""}
+            for p in sorted(patients, key=lambda p: p.patient_id)
+        ],
+    }
+
+
+# ================== Async okuma uçları (DB_ASYNC=1) ==================
+# Sorgu mantığı sync uçlarla ortaktır: AsyncSession.run_sync, sync fonksiyonu
+# async sürücü üzerinde çalıştırır; DB beklemeleri event loop'u bloklamaz.
+@read_route("/patients/list", is_async=True)
+async def list_patients_async(
+    request: Request,
+    response: Response,
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_db),
+    department: str = "ALL",
+    day: Optional[str] = None,
+):
+    return await adb.run_sync(
+        lambda db: list_patients(
+            request=request, response=response, current=current, db=db, department=department, day=day
+        )
+    )
+
+
+@read_route("/patients/{patient_id}/visits", is_async=True)
+async def patient_visits_async(
+    request: Request,
+    response: Response,
+    patient_id: str = Path(...),
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_db),
+    day: Optional[str] = None,
+):
+    return await adb.run_sync(
+        lambda db: patient_visits(
+            request=request, response=response, patient_id=patient_id, current=current, db=db, day=day
         )
-    return {"by_author": out}
+    )
+
+
+@read_route("/reports/daily", is_async=True, response_model=ReportDaily)
+async def report_daily_async(
+    request: Request,
+    response: Response,
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_read_db),
+    department: str = "ALL",
+    day: Optional[str] = None,
+    author: Optional[str] = None,
+):
+    return await adb.run_sync(
+        lambda db: report_daily(
+            request=request, response=response, current=current, db=db,
+            department=department, day=day, author=author,
+        )
+    )
+
+
+@read_route("/reports/range", is_async=True, response_model=ReportRange)
+async def report_range_async(
+    day_from: str = Query(..., alias="from"),
+    day_to: str = Query(..., alias="to"),
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_read_db),
+    department: str = "ALL",
+    author: Optional[str] = None,
+):
+    return await adb.run_sync(
+        lambda db: report_range(
+            day_from=day_from, day_to=day_to, current=current, db=db, department=department, author=author,
+        )
+    )
+
+
+@read_route("/visits/by_department", is_async=True)
+async def by_department_async(
+    request: Request,
+    response: Response,
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_read_db),
+    department: str = "ALL",
+    day: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: int = 200,
+    cursor: Optional[str] = None,
+):
+    return await adb.run_sync(
+        lambda db: by_department(
+            request=request, response=response,
+            current=current, db=db, department=department, day=day, author=author, limit=limit,
+            cursor=cursor,
+        )
+    )
+
+
+@read_route("/visits/search", is_async=True)
+async def search_visits_async(
+    q: str = Query(..., min_length=1),
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_db),
+    department: str = "ALL",
+    day_from: Optional[str] = None,
+    day_to: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    return await adb.run_sync(
+        lambda db: search_visits(
+            q=q, current=current, db=db, department=department, day_from=day_from,
+            day_to=day_to, author=author, limit=limit, offset=offset,
+        )
+    )
+
+
+@read_route("/dashboard", is_async=True)
+async def dashboard_async(
+    request: Request,
+    response: Response,
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_read_db),
+    department: str = "ALL",
+    day: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: int = 200,
+):
+    return await adb.run_sync(
+        lambda db: dashboard(
+            request=request, response=response,
+            current=current, db=db, department=department, day=day, author=author, limit=limit
+        )
+    )
+
+
+@read_route("/sync", is_async=True)
+async def sync_async(
+    current: User = Depends(get_current_user_async),
+    adb: AsyncSession = Depends(get_async_db),
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=2000),
+):
+    return await adb.run_sync(lambda db: sync(current=current, db=db, since=since, limit=limit))
+
+
+# ================== Canlı akış (SSE) ==================
+def get_current_user_sse(
+    token: Optional[str] = Depends(oauth2_optional),
+    access_token: Optional[str] = None,
+) -> User:
+    """
+    /events için kimlik: Authorization başlığı ya da ?access_token=.
+    Akış uzun sürdüğünden DB oturumu sadece doğrulama boyunca açık kalır.
+    """
+    tok = token or access_token
+    if not tok:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    db = SessionLocal()
+    try:
+        return get_current_user(db=db, token=tok)
+    finally:
+        db.close()
+
+
+@app.get("/events")
+async def events(
+    request: Request,
+    current: User = Depends(get_current_user_sse),
+    department: str = "ALL",
+    day: Optional[str] = None,
+):
+    """
+    Vizit değişiklik akışı (text/event-stream). Her olay:
+    {seq, kind: created|updated|deleted, visit_id, day, department, author_id, author}
+    Intern -> sadece kendi vizitleri; Hoca/Admin -> hepsi.
+    `event: resync` gelirse istemci verisini baştan çekmelidir (olay kaçırıldı).
+    """
+    last_id = request.headers.get("last-event-id")
+    sub = broadcaster.subscribe(
+        current.id,
+        current.role,
+        department=department.upper() if department != "ALL" else None,
+        day=day,
+        last_event_id=int(last_id) if last_id and last_id.isdigit() else None,
+    )
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                if sub.overflow:
+                    sub.overflow = False
+                    yield "event: resync\ndata: {}\n\n"
+                try:
+                    ev = await asyncio.wait_for(sub.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # proxy'ler bağlantıyı kapatmasın
+                    continue
+                yield f"id: {ev['seq']}\nevent: visit\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ================== Dışa aktarım (CSV / NDJSON) ==================
+def _export_parts(
+    db: Session,
+    current: User,
+    department: str,
+    author: Optional[str],
+    day_from: Optional[str],
+    day_to: Optional[str],
+) -> List[Tuple[type, List]]:
+    """(model, koşullar) listesi: arşive taşınmış günler önce arşivden okunur (zaman sırası korunur)."""
+    aid = None
+    if current.role == "intern":
+        aid = current.id
+    elif author:
+        aid = user_directory.resolve(db, author)
+    first = ist_day_range(day_from)[0] if day_from else None
+    last = ist_day_range(day_to)[1] if day_to else None
+
+    parts = []
+    for V, conds in archive.sources(db, first and first.date(), last and (last - timedelta(days=1)).date()):
+        conds = list(conds)
+        if first:
+            conds.append(V.ts >= first)
+        if last:
+            conds.append(V.ts < last)
+        if department != "ALL":
+            conds.append(V.department == department.upper())
+        if aid is not None:
+            conds.append(V.author_id == aid)
+        parts.append((V, conds))
+    return parts
+
+
+def _export_response(chunks, media_type: str, ext: str, day_from: Optional[str], day_to: Optional[str]):
+    name = "visits" + "".join(f"_{d}" for d in (day_from, day_to) if d) + f".{ext}"
+    return StreamingResponse(
+        chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
+@app.get("/exports/visits.csv")
+def export_visits_csv(
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    department: str = "ALL",
+    author: Optional[str] = None,
+    day_from: Optional[str] = Query(None, alias="from"),
+    day_to: Optional[str] = Query(None, alias="to"),
+):
+    """
+    Vizitleri (from..to dahil yerel günler, zaman sıralı) CSV olarak akıtır; bellek sabit.
+    Intern -> sadece kendi vizitleri; Hoca/Admin -> hepsi (isteğe bağlı author filtresi).
+    """
+    parts = _export_parts(db, current, department, author, day_from, day_to)
+    return _export_response(exports.csv_stream(parts), "text/csv; charset=utf-8", "csv", day_from, day_to)
+
+
+@app.get("/exports/visits.ndjson")
+def export_visits_ndjson(
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    department: str = "ALL",
+    author: Optional[str] = None,
+    day_from: Optional[str] = Query(None, alias="from"),
+    day_to: Optional[str] = Query(None, alias="to"),
+):
+    """Aynı dışa aktarım, satır başına bir JSON nesnesi (application/x-ndjson)."""
+    parts = _export_parts(db, current, department, author, day_from, day_to)
+    return _export_response(exports.ndjson_stream(parts), "application/x-ndjson", "ndjson", day_from, day_to)
 
 
 # ================== PDF Export ==================
-def _build_pdf_bytes(
-    title: str,
-    overview_lines: List[str],
-    perf_rows: List[tuple],
-    feed_rows: List[tuple],
-) -> BytesIO:
-    if not HAVE_REPORTLAB:
-        raise HTTPException(500, "PDF motoru yok: pip install reportlab")
+def _daily_pdf(db: Session, day: Optional[str], department: str, author: Optional[str]):
+    """
+    Gün sonu PDF'i için (önbellek anahtarı, yazar id, gün, make_args).
+    Anahtar veri sürümünü içerir; uç ve zamanlanmış ön üretim aynı anahtarı hesaplar.
+    make_args render girdilerini düz veri olarak döndürür; oturuma dokunmaz
+    (bağlantıyı bırakmak çağıranın işi, bkz. _pdf_args).
+    """
+    start, end = ist_day_range(day)
+    V = archive.model_for_day(db, start.date())
+    conds = [V.ts >= start, V.ts < end]
+    if department != "ALL":
+        conds.append(V.department == department.upper())
+    aid = None
+    if author:
+        aid = user_directory.resolve(db, author)
+        if aid is not None:
+            conds.append(V.author_id == aid)
+        else:
+            conds.append(V.id == -1)  # boş
+
+    day_text = (start.date().isoformat())
+    title = f"Gün Sonu Özeti — {day_text} — Bölüm: {department}" + (f" — {author}" if author else "")
 
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf, pagesize=A4,
-        leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36
+    # Veri sürümü: ekleme/silme sayıyı ve id toplamını, düzenleme edited_at'i değiştirir
+    fingerprint = tuple(
+        db.query(
+            func.count(V.id), func.max(V.id), func.sum(V.id), func.max(V.edited_at),
+        ).filter(and_(*conds)).one()
     )
+    key = pdf_cache_key(title, aid, fingerprint, user_directory.digest(db))
+
+    def make_args():
+        users = user_directory.names(db)
+
+        # sayılar günlük özet tablolarından
+        per_author, patients_by_author = [], {}
+        if not (author and aid is None):
+            per_author, patients_by_author, _ = rollups.daily_counts(
+                db, start.date(),
+                department=department.upper() if department != "ALL" else None,
+                author_id=aid,
+            )
 
-    styles = getSampleStyleSheet()
-    # Arial kullan (yoksa Helvetica)
-    styles["Normal"].fontName = "Arial" if _PDF_FONTS_OK else "Helvetica"
-    styles["Normal"].fontSize = 10
-    if "Title" in styles:
-        styles["Title"].fontName = "Arial-Bold" if _PDF_FONTS_OK else "Helvetica-Bold"
-        styles["Title"].fontSize = 16
-        styles["Title"].leading = 20
-    else:
-        styles.add(ParagraphStyle(
-            name="Title",
-            fontName="Arial-Bold" if _PDF_FONTS_OK else "Helvetica-Bold",
-            fontSize=16, leading=20, spaceAfter=8,
-        ))
-
-    story = []
-    story.append(Paragraph(title, styles["Title"]))
-    story.append(Spacer(1, 10))
-
-    story.append(Paragraph("Özet", styles["Normal"]))
-    if overview_lines:
-        for l in overview_lines:
-            story.append(Paragraph(f"• {l}", styles["Normal"]))
-    else:
-        story.append(Paragraph("Kayıt yok.", styles["Normal"]))
-    story.append(Spacer(1, 12))
-
-    if perf_rows:
-        story.append(Paragraph("Öğrenci Özeti (Bugün)", styles["Normal"]))
-        data = [("Öğrenci", "Hasta", "Vizit", "Kritik")] + perf_rows
-        tbl = Table(data, hAlign="LEFT")
-        tbl.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-            ("ALIGN", (1, 1), (-1, -1), "CENTER"),
-        ]))
-        story.append(tbl)
-        story.append(Spacer(1, 12))
-
-    if feed_rows:
-        story.append(Paragraph("Bölüm Akışı (kısa liste)", styles["Normal"]))
-        for ts, pid, who, txt in feed_rows[:50]:
-            # Inline font adı KULLANMA: Arial italik/bold eşleşmesi sorun çıkarabiliyor
-            story.append(Paragraph(
-                f"<b>{ts}</b> — {who} — <b>{pid}</b><br/>{txt}",
-                styles["Normal"]))
-            story.append(Spacer(1, 4))
-
-    doc.build(story)
-    buf.seek(0)
-    return buf
+        # sayılar ve kısa özet
+        totals = {k: sum(int(getattr(g, k) or 0) for g in per_author)
+                  for k in ("critical", "drugs", "tests", "consults")}
+        lines = []
+        if totals["critical"]:
+            lines.append(f"{totals['critical']} kritik kayıt")
+        if totals["tests"]:
+            lines.append(f"{totals['tests']} tetkik")
+        if totals["drugs"]:
+            lines.append(f"{totals['drugs']} ilaç")
+        if not lines:
+            lines.append("Önemli bulgu kaydı yok.")
+
+        # öğrenci özeti
+        perf_map: Dict[str, Dict] = {}
+        for g in per_author:
+            nm = users.get(g.aid, "Bilinmiyor")
+            d = perf_map.setdefault(nm, {"patients": 0, "visits": 0, "critical": 0})
+            d["patients"] += int(patients_by_author.get(g.aid, 0))
+            d["visits"] += int(g.visits)
+            d["critical"] += int(g.critical or 0)
+        perf_rows = [(n, v["patients"], v["visits"], v["critical"]) for n, v in sorted(perf_map.items())]
+
+        # PDF akışı ilk 50 kaydı gösterir; sadece onlar okunur
+        rows = (
+            db.query(V.ts, V.patient_id, V.author_id, V.text)
+            .filter(and_(*conds))
+            .order_by(V.ts.asc())
+            .limit(50)
+            .all()
+        )
+
+        # akış satırları (ts, pid, who, text)
+        feed_rows = []
+        for r in rows:
+            feed_rows.append((
+                (r.ts).strftime("%H:%M"),
+                r.patient_id,
+                users.get(r.author_id, "?"),
+                (r.text or "").replace("\n", " ")[:160],
+            ))
+
+        return title, lines, perf_rows, feed_rows
+
+    return key, aid, day_text, make_args
+
+
+def _pdf_args(db: Session, make_args):
+    """
+    make_args'ı çalıştırıp oturumun transaction'ını bitir: girdiler bellekte,
+    render sürerken bağlantı havuza döner. Oturum açık ve kullanılabilir kalır.
+    """
+    def args():
+        out = make_args()
+        db.rollback()  # sadece okuma yapıldı
+        return out
+    return args
 
 
 @app.get("/reports/daily_pdf")
 def report_daily_pdf(
     current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     department: str = "ALL",
     day: Optional[str] = None,
     author: Optional[str] = None,
@@ -554,91 +1456,125 @@ def report_daily_pdf(
     - intern: sadece kendi kayıtlarını indirebilir (author zorla kendi display_name)
     - supervisor/admin: herkes için indirebilir; author parametresi ile filtreleyebilir
       (author hem username hem display_name olarak denenir).
+    Zamanlanmış ön üretimden (prerender.py) güncel dosya varsa o verilir.
     """
     if not HAVE_REPORTLAB:
         raise HTTPException(500, "PDF motoru yok: pip install reportlab")
 
-    start, end = ist_day_range(day)
     if current.role == "intern":
         author = current.display_name
 
-    q = db.query(Visit).filter(and_(Visit.ts >= start, Visit.ts < end))
-    if department != "ALL":
-        q = q.filter(Visit.department == department.upper())
-    if author:
-        u = db.query(User).filter(User.username == author).first()
-        if not u:
-            u = db.query(User).filter(User.display_name == author).first()
-        if u:
-            q = q.filter(Visit.author_id == u.id)
-        else:
-            q = q.filter(Visit.id == -1)  # boş
-
-    rows = q.order_by(Visit.ts.asc()).all()
-    users = {u.id: u.display_name for u in db.query(User).all()}
-
-    # sayılar ve kısa özet
-    totals = {
-        "critical": sum(1 for r in rows if r.ops_critical),
-        "drugs":   sum(1 for r in rows if r.ops_drug),
-        "tests":   sum(1 for r in rows if r.ops_test),
-        "consults":sum(1 for r in rows if r.ops_consult),
-    }
-    lines = []
-    if totals["critical"]:
-        lines.append(f"{totals['critical']} kritik kayıt")
-    if totals["tests"]:
-        lines.append(f"{totals['tests']} tetkik")
-    if totals["drugs"]:
-        lines.append(f"{totals['drugs']} ilaç")
-    if not lines:
-        lines.append("Önemli bulgu kaydı yok.")
-
-    # öğrenci özeti
-    perf_map: Dict[str, Dict] = {}
-    for r in rows:
-        nm = users.get(r.author_id, "Bilinmiyor")
-        d = perf_map.setdefault(nm, {"patients": set(), "visits": 0, "critical": 0})
-        d["patients"].add(r.patient_id)
-        d["visits"] += 1
-        if r.ops_critical:
-            d["critical"] += 1
-    perf_rows = [(n, len(v["patients"]), v["visits"], v["critical"]) for n, v in sorted(perf_map.items())]
-
-    # akış satırları (ts, pid, who, text)
-    feed_rows = []
-    for r in rows:
-        feed_rows.append((
-            (r.ts).strftime("%H:%M"),
-            r.patient_id,
-            users.get(r.author_id, "?"),
-            (r.text or "").replace("\n", " ")[:160],
-        ))
-
-    # başlık ve PDF
-    day_text = (start.date().isoformat())
-    title = f"Gün Sonu Özeti — {day_text} — Bölüm: {department}" + (f" — {author}" if author else "")
-    pdf = _build_pdf_bytes(title, lines, perf_rows, feed_rows)
+    key, aid, day_text, make_args = _daily_pdf(db, day, department, author)
+    pdf = pdf_prerender.load(day_text, department, aid, key)
+    if pdf is None:
+        pdf = pdf_renderer.get_or_render(key, _pdf_args(db, make_args))
 
     safe_author = f"_{author.replace(' ', '_')}" if author else ""
     filename = f"gunsonu_{department}_{day_text}{safe_author}.pdf"
     return StreamingResponse(
-        pdf,
+        BytesIO(pdf),
         media_type="application/pdf",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+def _prerender_day(day: str, authors: bool = False) -> Dict:
+    """
+    Günün PDF'lerini üretip diske yaz: ALL ve vizit olan her bölüm; authors ise
+    bölüm + yazar (ve ALL + yazar) başına da. Diskte güncel olanlar atlanır.
+    """
+    db = ReadSessionLocal()
+    try:
+        keys = rollups.day_keys(db, date.fromisoformat(day))
+        users = user_directory.names(db)
+        targets = [("ALL", None)] + [(dep, None) for dep in sorted({dep for dep, _ in keys})]
+        if authors:
+            aids = sorted({aid for _, aid in keys})
+            targets += [("ALL", users[aid]) for aid in aids if aid in users]
+            targets += [(dep, users[aid]) for dep, aid in sorted(keys) if aid in users]
+
+        out = {"day": day, "rendered": 0, "current": 0}
+        for department, author in targets:
+            key, aid, day_text, make_args = _daily_pdf(db, day, department, author)
+            if pdf_prerender.has(day_text, department, aid, key):
+                out["current"] += 1
+                continue
+            pdf = pdf_renderer.get_or_render(key, _pdf_args(db, make_args))
+            pdf_prerender.save(day_text, department, aid, key, pdf)
+            out["rendered"] += 1
+        return out
+    finally:
+        db.close()
+
+
 @app.get("/ai/rollup.pdf")
 def rollup_pdf_alias(
     current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     department: str = "ALL",
     day: Optional[str] = None,
 ):
     return report_daily_pdf(current=current, db=db, department=department, day=day)
 
 
+@app.get("/metrics")
+def metrics(token: Optional[str] = Depends(oauth2_optional)):
+    """
+    Prometheus metin biçiminde süreç içi metrikler (route başına gecikme, durum, SQL; PDF; önbellekler).
+    METRICS_TOKEN yoksa kapalı (404); varsa Bearer olarak aynı token istenir.
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(404, "Not Found")
+    if not token or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(401, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    body = metrics_registry.render({
+        "pdf_cache": pdf_renderer.stats(),
+        "auth_cache": principal_cache.stats(),
+        "user_directory": user_directory.stats(),
+        "pdf_prerender": pdf_prerender.stats(),
+    })
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ================== Yönetim (admin) ==================
+def _require_admin(current: User) -> None:
+    if current.role != "admin":
+        raise HTTPException(403, "Sadece admin")
+
+
+@app.get("/admin/slow-queries")
+def admin_slow_queries(
+    current: User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    Yavaş sorgu halka tamponu (en yeni önce): uç, süre, ifade, parametre şekli ve plan.
+    Kayıt SLOW_QUERY_MS > 0 ile açılır.
+    """
+    _require_admin(current)
+    return {**slow_query_log.stats(), "items": slow_query_log.items(limit)}
+
+
+@app.delete("/admin/slow-queries")
+def admin_slow_queries_clear(current: User = Depends(get_current_user)):
+    _require_admin(current)
+    slow_query_log.clear()
+    return {"ok": True}
+
+
+@app.post("/admin/pdf-prerender")
+def admin_pdf_prerender(
+    current: User = Depends(get_current_user),
+    day: Optional[str] = None,
+    authors: bool = False,
+):
+    """Gün sonu PDF'lerini zamanlayıcıyı beklemeden şimdi üret (authors=true -> yazar başına da)."""
+    _require_admin(current)
+    if not HAVE_REPORTLAB:
+        raise HTTPException(500, "PDF motoru yok: pip install reportlab")
+    return _prerender_day(ist_day_range(day)[0].date().isoformat(), authors)
+
+
 @app.get("/")
 def health():
     return {"ok": True, "ts": datetime.utcnow().isoformat()}
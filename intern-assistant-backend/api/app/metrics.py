@@ -0,0 +1,258 @@
+﻿"""
+İstek başına performans ölçümleri ve Prometheus metin biçiminde /metrics.
+
+- MetricsMiddleware (saf ASGI): route şablonu + metot başına gecikme
+  histogramı, durum kodu sayaçları, istek başına SQL ifadesi sayısı ve SQL
+  süresi. Süre, yanıt gövdesinin son parçası gönderilene kadar ölçülür
+  (akış yanıtlarındaki sorgular da isteğe yazılır).
+- SQL ölçümü db.py'deki engine'lerin (okuma kopyası ve async engine'ler
+  dahil) cursor olaylarıyla yapılır; istek, ContextVar ile bulunur (threadpool
+  ve async sürücü yolları bağlamı taşır).
+- observe_pdf_render: _build_pdf_bytes süresi (pdf.py, süreç havuzundan
+  dönen ölçümle).
+- capture_sql(): testler/benchmark için aynı kanca; thread'den bağımsız olarak
+  bir blok içindeki tüm SQL ifadelerini toplar (N+1 kontrolü).
+
+Metrikler süreç içidir; birden çok worker ile her worker kendi değerlerini verir.
+/metrics dışarı açılmamalıdır: METRICS_TOKEN verilmezse kapalıdır (bkz. config.py).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from . import db as _db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+PDF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _RequestStats:
+    __slots__ = ("scope", "statements", "sql_seconds")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope  # yönlendirme sonrası route / endpoint buradan okunur
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+_current: ContextVar[Optional[_RequestStats]] = ContextVar("ia_request_stats", default=None)
+
+
+def current_endpoint() -> Optional[str]:
+    """Çalışan isteğin uç adı, ör. 'GET /patients/list (list_patients)'; istek dışında None."""
+    stats = _current.get()
+    if stats is None or stats.scope is None:
+        return None
+    scope = stats.scope
+    route = getattr(scope.get("route"), "path", None) or scope.get("path", "?")
+    fn = getattr(scope.get("endpoint"), "__name__", None)
+    return f"{scope.get('method', '?')} {route}" + (f" ({fn})" if fn else "")
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+        self.sum += v
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        sep = "," if labels else ""
+        out = [
+            f'{name}_bucket{{{labels}{sep}le="{_fmt(b)}"}} {c}'
+            for b, c in zip(self.buckets, self.counts)
+        ]
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lbl = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{lbl} {_fmt(self.sum)}")
+        out.append(f"{name}_count{lbl} {self.count}")
+        return out
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self._latency: Dict[Tuple[str, str], _Histogram] = {}
+        self._sql_count: Dict[Tuple[str, str], _Histogram] = {}
+        self._sql_seconds: Dict[Tuple[str, str], float] = {}
+        self._status: Dict[Tuple[str, str, int], int] = {}
+        self._pdf = _Histogram(PDF_BUCKETS)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: _RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            h = self._latency.get(key)
+            if h is None:
+                h = self._latency[key] = _Histogram(LATENCY_BUCKETS)
+                self._sql_count[key] = _Histogram(SQL_COUNT_BUCKETS)
+                self._sql_seconds[key] = 0.0
+            h.observe(seconds)
+            self._sql_count[key].observe(stats.statements)
+            self._sql_seconds[key] += stats.sql_seconds
+            skey = (method, route, status)
+            self._status[skey] = self._status.get(skey, 0) + 1
+
+    def observe_pdf_render(self, seconds: float) -> None:
+        with self._lock:
+            self._pdf.observe(seconds)
+
+    def render(self, extra: Dict[str, Dict[str, int]] = None) -> str:
+        """Prometheus metin biçimi (text/plain; version=0.0.4)."""
+        out: List[str] = []
+        with self._lock:
+            out += [
+                "# HELP ia_http_request_duration_seconds İstek süresi (yanıt gövdesi bitene kadar).",
+                "# TYPE ia_http_request_duration_seconds histogram",
+            ]
+            for (m, r), h in sorted(self._latency.items()):
+                out += h.lines("ia_http_request_duration_seconds", f'method="{m}",route="{_esc(r)}"')
+            out += [
+                "# HELP ia_http_requests_total Durum koduna göre istek sayısı.",
+                "# TYPE ia_http_requests_total counter",
+            ]
+            for (m, r, s), n in sorted(self._status.items()):
+                out.append(f'ia_http_requests_total{{method="{m}",route="{_esc(r)}",status="{s}"}} {n}')
+            out += [
+                "# HELP ia_http_request_sql_statements İstek başına SQL ifadesi sayısı.",
+                "# TYPE ia_http_request_sql_statements histogram",
+            ]
+            for (m, r), h in sorted(self._sql_count.items()):
+                out += h.lines("ia_http_request_sql_statements", f'method="{m}",route="{_esc(r)}"')
+            out += [
+                "# HELP ia_http_request_sql_seconds_total İsteklerde SQL'de geçen toplam süre.",
+                "# TYPE ia_http_request_sql_seconds_total counter",
+            ]
+            for (m, r), v in sorted(self._sql_seconds.items()):
+                out.append(f'ia_http_request_sql_seconds_total{{method="{m}",route="{_esc(r)}"}} {_fmt(v)}')
+            out += [
+                "# HELP ia_pdf_render_seconds _build_pdf_bytes süresi.",
+                "# TYPE ia_pdf_render_seconds histogram",
+            ]
+            out += self._pdf.lines("ia_pdf_render_seconds", "")
+        # önbellek sayaçları (kaynak modüllerin stats() çıktıları)
+        for cache, stats in sorted((extra or {}).items()):
+            for k, v in sorted(stats.items()):
+                name = f"ia_{cache}_{k}"
+                out.append(f"# TYPE {name} gauge")
+                out.append(f"{name} {v}")
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+def observe_pdf_render(seconds: float) -> None:
+    registry.observe_pdf_render(seconds)
+
+
+# ================== SQL olayları ==================
+_captures: List[List[str]] = []  # capture_sql blokları (thread'den bağımsız)
+_captures_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._ia_t0 = time.perf_counter()
+    if _captures:
+        with _captures_lock:
+            for c in _captures:
+                c.append(statement)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    t0 = getattr(context, "_ia_t0", None)
+    if t0 is not None:
+        stats.sql_seconds += time.perf_counter() - t0
+
+
+for _e in _db.all_engines():
+    event.listen(_e, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_e, "after_cursor_execute", _after_cursor_execute)
+
+
+class SqlCapture(list):
+    """capture_sql bloğunda çalışan SQL ifadeleri (liste); count kısayolu."""
+
+    @property
+    def count(self) -> int:
+        return len(self)
+
+
+@contextmanager
+def capture_sql() -> Iterator[SqlCapture]:
+    """
+    Blok içinde (hangi thread'de olursa olsun) uygulama engine'lerinde çalışan
+    SQL ifadelerini toplar. Örn:
+
+        with capture_sql() as q:
+            client.get("/patients/list", ...)
+        assert q.count <= 3, q
+    """
+    cap = SqlCapture()
+    with _captures_lock:
+        _captures.append(cap)
+    try:
+        yield cap
+    finally:
+        with _captures_lock:
+            _captures.remove(cap)
+
+
+# ================== Middleware ==================
+class MetricsMiddleware:
+    """Saf ASGI middleware: BaseHTTPMiddleware'in aksine akış yanıtlarını tamponlamaz."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = _RequestStats(scope)
+        token = _current.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            # route şablonu (ör. /patients/{patient_id}/visits); eşleşmeyen yollar tek etikette
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            registry.observe_request(scope["method"], route, status[0], elapsed, stats)
@@ -0,0 +1,152 @@
+﻿"""
+Sürümlü şema göçleri.
+
+Her göç (sürüm, ad, fonksiyon) üçlüsüdür ve tek bir transaction içinde çalışır.
+Uygulanan sürümler `schema_version` tablosunda tutulur; böylece mevcut
+app.db / ia.db / Postgres kurulumları yeniden oluşturulmadan güncellenir.
+
+Elle çalıştırmak için (api/ klasöründen):
+    python -m app.migrations
+"""
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import Column, Date, DateTime, Integer, MetaData, String, Table, cast, func, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from .db import Base, engine
+from .models import (
+    User, Patient, Visit, VisitArchive, ArchiveState, DailyRollup, DailyPatientRollup, DayVersion, ChangeLog,
+)
+from . import rollups, search
+
+# Göç kayıt tablosu modellerin metadata'sından ayrı tutulur
+_meta = MetaData()
+schema_version = Table(
+    "schema_version",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# ================== Yardımcılar ==================
+def _create_indexes(conn: Connection, table: Table, names: List[str]) -> None:
+    """Tablodaki (modelde tanımlı) indeksleri yoksa oluştur."""
+    for idx in table.indexes:
+        if idx.name in names:
+            idx.create(conn, checkfirst=True)
+
+
+# ================== Göçler ==================
+def _m001_base_tables(conn: Connection) -> None:
+    """users / patients / visits (eski create_all karşılığı)."""
+    Base.metadata.create_all(
+        conn,
+        tables=[User.__table__, Patient.__table__, Visit.__table__],
+        checkfirst=True,
+    )
+
+
+def _m002_visit_indexes(conn: Connection) -> None:
+    """visits: gün aralığı + bölüm / yazar / hasta bileşik indeksleri."""
+    _create_indexes(conn, Visit.__table__, [
+        "ix_visits_ts_department",
+        "ix_visits_department_ts",
+        "ix_visits_author_ts",
+        "ix_visits_patient_ts",
+    ])
+
+
+def _m003_daily_rollups(conn: Connection) -> None:
+    """Günlük özet tabloları + mevcut vizitlerden doldurma."""
+    Base.metadata.create_all(
+        conn, tables=[DailyRollup.__table__, DailyPatientRollup.__table__], checkfirst=True,
+    )
+    with Session(bind=conn) as db:
+        # arşiv tabloları henüz yok (göç 8): tek kaynak visits
+        rollups.rebuild(db, sources=[(Visit, [])])
+        db.flush()
+
+
+def _m004_day_versions(conn: Connection) -> None:
+    """(gün, bölüm) veri sürümleri (koşullu GET / ETag)."""
+    Base.metadata.create_all(conn, tables=[DayVersion.__table__], checkfirst=True)
+
+
+def _m005_visit_search(conn: Connection) -> None:
+    """Not araması: SQLite FTS5 tablosu / Postgres tsvector + GIN (mevcut vizitlerle)."""
+    search.create_index(conn)
+
+
+def _m006_change_log(conn: Connection) -> None:
+    """Delta senkronizasyon günlüğü (/sync); mevcut kayıtlar geriye dönük yazılmaz."""
+    Base.metadata.create_all(conn, tables=[ChangeLog.__table__], checkfirst=True)
+
+
+def _m007_visit_day(conn: Connection) -> None:
+    """visits.day (ts'nin yerel günü) kolonu + mevcut satırları doldurma + indeks."""
+    if "day" not in {c["name"] for c in inspect(conn).get_columns("visits")}:
+        conn.execute(text("ALTER TABLE visits ADD COLUMN day DATE"))
+    t = Visit.__table__
+    day = func.date(t.c.ts) if conn.dialect.name == "sqlite" else cast(t.c.ts, Date)
+    conn.execute(update(t).where(t.c.day.is_(None), t.c.ts.isnot(None)).values(day=day))
+    _create_indexes(conn, t, ["ix_visits_day_department_author"])
+
+
+def _m008_visit_archive(conn: Connection) -> None:
+    """Sıcak / soğuk ayrımı: visits_archive + archive_state (taşıma: python -m app.archive run)."""
+    Base.metadata.create_all(conn, tables=[VisitArchive.__table__, ArchiveState.__table__], checkfirst=True)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "base_tables", _m001_base_tables),
+    (2, "visit_indexes", _m002_visit_indexes),
+    (3, "daily_rollups", _m003_daily_rollups),
+    (4, "day_versions", _m004_day_versions),
+    (5, "visit_search", _m005_visit_search),
+    (6, "change_log", _m006_change_log),
+    (7, "visit_day", _m007_visit_day),
+    (8, "visit_archive", _m008_visit_archive),
+]
+
+
+# ================== Çalıştırıcı ==================
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    v = conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).first()
+    return int(v[0]) if v else 0
+
+
+def upgrade(bind: Optional[Engine] = None) -> List[int]:
+    """
+    Eksik göçleri sırayla uygula; uygulanan sürümleri döndür.
+    Her göç kendi transaction'ında çalışır, yarıda kalan göç kaydedilmez.
+    """
+    bind = bind or engine
+    applied: List[int] = []
+    with bind.begin() as conn:
+        _meta.create_all(conn, checkfirst=True)
+    for version, name, fn in MIGRATIONS:
+        with bind.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                # Birden çok worker aynı anda başlarsa göçler tek sırayla çalışsın
+                conn.execute(text("SELECT pg_advisory_xact_lock(7340001)"))
+            if current_version(conn) >= version:
+                continue
+            fn(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow(),
+            ))
+            applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    done = upgrade()
+    with engine.connect() as c:
+        ver = current_version(c)
+    print(f"Şema sürümü: {ver}" + (f" (uygulanan: {done})" if done else " (güncel)"))
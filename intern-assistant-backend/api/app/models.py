@@ -1,5 +1,6 @@
-﻿from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, func
+﻿from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
+from datetime import datetime, timedelta
 from .db import Base
 
 
@@ -27,8 +28,23 @@ class Patient(Base):
     visits = relationship("Visit", back_populates="patient")
 
 
+def _visit_local_day(ctx):
+    # ts zaten yerel (UTC+3) naive saat; verilmemişse (server_default) şimdiki yerel gün
+    ts = ctx.get_current_parameters().get("ts")
+    return (ts or datetime.utcnow() + timedelta(hours=3)).date()
+
+
 class Visit(Base):
     __tablename__ = "visits"
+    __table_args__ = (
+        # Okuma uçları hep gün aralığı (ts) + bölüm / yazar / hasta ile filtreler
+        Index("ix_visits_ts_department", "ts", "department"),
+        Index("ix_visits_department_ts", "department", "ts"),
+        Index("ix_visits_author_ts", "author_id", "ts"),
+        Index("ix_visits_patient_ts", "patient_id", "ts"),
+        # Çok günlü raporlar: yerel gün + bölüm + yazar üzerinden gruplama
+        Index("ix_visits_day_department_author", "day", "department", "author_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String, ForeignKey("patients.patient_id"))
@@ -43,7 +59,100 @@ class Visit(Base):
     ops_critical = Column(Boolean, default=False)
 
     ts = Column(DateTime(timezone=True), server_default=func.now())
+    day = Column(Date, default=_visit_local_day)  # ts'nin yerel günü (yazımda doldurulur)
     edited_at = Column(DateTime(timezone=True), nullable=True)
 
     author = relationship("User", back_populates="visits")
     patient = relationship("Patient", back_populates="visits")
+
+
+class VisitArchive(Base):
+    """
+    Soğuk vizitler: ufuktan (ARCHIVE_AFTER_DAYS) eski günler visits'ten buraya
+    taşınır (bkz. archive.py). Kolonlar Visit ile aynı, id korunur.
+    """
+    __tablename__ = "visits_archive"
+    __table_args__ = (
+        Index("ix_visits_archive_ts_department", "ts", "department"),
+        Index("ix_visits_archive_patient_ts", "patient_id", "ts"),
+        Index("ix_visits_archive_day_department_author", "day", "department", "author_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    patient_id = Column(String, ForeignKey("patients.patient_id"))
+    author_id = Column(Integer, ForeignKey("users.id"))
+
+    text = Column(String, default="")
+    department = Column(String, default="GENEL")
+
+    ops_drug = Column(Boolean, default=False)
+    ops_test = Column(Boolean, default=False)
+    ops_consult = Column(Boolean, default=False)
+    ops_critical = Column(Boolean, default=False)
+
+    ts = Column(DateTime(timezone=True))
+    day = Column(Date)
+    edited_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ArchiveState(Base):
+    """Tek satır: cutoff'tan eski günler visits_archive'dan, diğerleri visits'ten okunur."""
+    __tablename__ = "archive_state"
+
+    id = Column(Integer, primary_key=True)
+    cutoff = Column(Date, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class DailyRollup(Base):
+    """Gün (yerel) + bölüm + yazar bazında vizit sayaçları (yazımlarla güncellenir)."""
+    __tablename__ = "daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    department = Column(String, primary_key=True)
+    author_id = Column(Integer, primary_key=True)
+
+    visits = Column(Integer, nullable=False, default=0)
+    critical = Column(Integer, nullable=False, default=0)
+    drugs = Column(Integer, nullable=False, default=0)
+    tests = Column(Integer, nullable=False, default=0)
+    consults = Column(Integer, nullable=False, default=0)
+    first_visit_id = Column(Integer, nullable=True)  # by_author sırası için
+
+
+class DailyPatientRollup(Base):
+    """Aynı anahtar + hasta için vizit sayısı (ayrık hasta sayımı, silmede doğru kalsın diye)."""
+    __tablename__ = "daily_patient_rollups"
+
+    day = Column(Date, primary_key=True)
+    department = Column(String, primary_key=True)
+    author_id = Column(Integer, primary_key=True)
+    patient_id = Column(String, primary_key=True)
+
+    visits = Column(Integer, nullable=False, default=0)
+
+
+class DayVersion(Base):
+    """Gün (yerel) + bölüm için veri sürümü: her vizit yazımında bir artar (ETag kaynağı)."""
+    __tablename__ = "day_versions"
+
+    day = Column(Date, primary_key=True)
+    department = Column(String, primary_key=True)
+
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ChangeLog(Base):
+    """Delta senkronizasyon günlüğü: vizit / hasta değişiklikleri, silmeler için tombstone."""
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_author_seq", "author_id", "seq"),
+        {"sqlite_autoincrement": True},  # seq silinen satırlardan sonra da geri kullanılmasın
+    )
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    visit_id = Column(Integer, nullable=True)
+    patient_id = Column(String, nullable=True)
+    op = Column(String, nullable=False)  # upsert | delete
+    author_id = Column(Integer, nullable=True)  # rol kapsamı (vizit yazarı / hastayı ekleyen)
+    at = Column(DateTime, nullable=False)
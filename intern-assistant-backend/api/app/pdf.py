@@ -0,0 +1,235 @@
+﻿"""
+PDF üretimi (ReportLab) ve içerik adresli PDF önbelleği.
+
+Render CPU ağırlıklıdır; istek thread'inde değil bir süreç havuzunda
+(PDF_WORKERS, 0 -> aynı süreçte) çalışır. Sonuçlar, rapor parametreleri ve
+ilgili vizitlerin veri sürümünden türetilen anahtarla bellekte saklanır;
+değişmemiş rapor tekrar indirildiğinde yeniden render edilmez.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .metrics import observe_pdf_render
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# ---- PDF motoru (opsiyonel): reportlab
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib import colors
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    HAVE_REPORTLAB = True
+except Exception:
+    HAVE_REPORTLAB = False
+
+
+# ---- PDF font ayarı (Windows Arial) ----
+def _register_pdf_fonts() -> bool:
+    if not HAVE_REPORTLAB:
+        return False
+    try:
+        # Windows sistem fontları
+        arial_regular = r"C:\Windows\Fonts\arial.ttf"
+        arial_bold    = r"C:\Windows\Fonts\arialbd.ttf"
+        pdfmetrics.registerFont(TTFont("Arial", arial_regular))
+        pdfmetrics.registerFont(TTFont("Arial-Bold", arial_bold))
+        return True
+    except Exception as e:
+        print("PDF font kaydı yapılamadı, Helvetica'ya düşülecek:", e)
+        return False
+
+_PDF_FONTS_OK = _register_pdf_fonts()
+
+
+def _build_pdf_bytes(
+    title: str,
+    overview_lines: List[str],
+    perf_rows: List[tuple],
+    feed_rows: List[tuple],
+) -> BytesIO:
+    if not HAVE_REPORTLAB:
+        raise HTTPException(500, "PDF motoru yok: pip install reportlab")
+
+    buf = BytesIO()
+    doc = SimpleDocTemplate(
+        buf, pagesize=A4,
+        leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36
+    )
+
+    styles = getSampleStyleSheet()
+    # Arial kullan (yoksa Helvetica)
+    styles["Normal"].fontName = "Arial" if _PDF_FONTS_OK else "Helvetica"
+    styles["Normal"].fontSize = 10
+    if "Title" in styles:
+        styles["Title"].fontName = "Arial-Bold" if _PDF_FONTS_OK else "Helvetica-Bold"
+        styles["Title"].fontSize = 16
+        styles["Title"].leading = 20
+    else:
+        styles.add(ParagraphStyle(
+            name="Title",
+            fontName="Arial-Bold" if _PDF_FONTS_OK else "Helvetica-Bold",
+            fontSize=16, leading=20, spaceAfter=8,
+        ))
+
+    story = []
+    story.append(Paragraph(title, styles["Title"]))
+    story.append(Spacer(1, 10))
+
+    story.append(Paragraph("Özet", styles["Normal"]))
+    if overview_lines:
+        for l in overview_lines:
+            story.append(Paragraph(f"• {l}", styles["Normal"]))
+    else:
+        story.append(Paragraph("Kayıt yok.", styles["Normal"]))
+    story.append(Spacer(1, 12))
+
+    if perf_rows:
+        story.append(Paragraph("Öğrenci Özeti (Bugün)", styles["Normal"]))
+        data = [("Öğrenci", "Hasta", "Vizit", "Kritik")] + perf_rows
+        tbl = Table(data, hAlign="LEFT")
+        tbl.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+        ]))
+        story.append(tbl)
+        story.append(Spacer(1, 12))
+
+    if feed_rows:
+        story.append(Paragraph("Bölüm Akışı (kısa liste)", styles["Normal"]))
+        for ts, pid, who, txt in feed_rows[:50]:
+            # Inline font adı KULLANMA: Arial italik/bold eşleşmesi sorun çıkarabiliyor
+            story.append(Paragraph(
+                f"<b>{ts}</b> — {who} — <b>{pid}</b><br/>{txt}",
+                styles["Normal"]))
+            story.append(Spacer(1, 4))
+
+    doc.build(story)
+    buf.seek(0)
+    return buf
+
+
+def _render_pdf(
+    title: str,
+    overview_lines: List[str],
+    perf_rows: List[tuple],
+    feed_rows: List[tuple],
+) -> Tuple[bytes, float]:
+    """Süreç havuzunda çalışan giriş noktası (modül seviyesinde olmalı: pickle). Dönüş: (pdf, render sn)."""
+    t0 = time.perf_counter()
+    data = _build_pdf_bytes(title, overview_lines, perf_rows, feed_rows).getvalue()
+    return data, time.perf_counter() - t0
+
+
+def pdf_cache_key(*parts) -> str:
+    """Rapor parametreleri + veri sürümü -> önbellek anahtarı."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+# ================== Render + önbellek ==================
+class PdfRenderer:
+    def __init__(self, workers: int = PDF_WORKERS, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._inflight = {}  # key -> Future (aynı rapor aynı anda bir kez render edilir)
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _render(self, args: Tuple) -> bytes:
+        with self._lock:
+            self.renders += 1
+        if self.workers <= 0:
+            data, seconds = _render_pdf(*args)
+        else:
+            data, seconds = self._executor().submit(_render_pdf, *args).result()
+        observe_pdf_render(seconds)
+        return data
+
+    def _store(self, key: str, data: bytes) -> None:
+        with self._lock:
+            if len(data) > self.max_bytes:
+                return
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._cache[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, ev = self._cache.popitem(last=False)
+                self._size -= len(ev)
+
+    def get_or_render(self, key: str, make_args: Callable[[], Tuple]) -> bytes:
+        """
+        Önbellekte varsa döndür; yoksa make_args() ile render girdilerini
+        (title, lines, perf_rows, feed_rows) hazırla ve süreç havuzunda üret.
+        make_args sadece önbellek kaçırıldığında çağrılır.
+        """
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return data
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = Future()
+                self._inflight[key] = fut
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return fut.result()
+
+        try:
+            data = self._render(make_args())
+            self._store(key, data)
+            fut.set_result(data)
+            return data
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "renders": self.renders,
+                "entries": len(self._cache),
+                "bytes": self._size,
+            }
+
+
+pdf_renderer = PdfRenderer()
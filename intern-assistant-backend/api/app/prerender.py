@@ -0,0 +1,201 @@
+﻿"""
+Gün sonu PDF'lerinin zamanlanmış ön üretimi (opsiyonel): PDF_PRERENDER_AT="HH:MM".
+
+Vardiya sonunda hocalar /reports/daily_pdf'i aynı dakikada indirir; render
+maliyeti tek ana yığılmasın diye süreç içi zamanlayıcı (daemon thread) her gün
+ayarlanan yerel (UTC+3) saatte günün PDF'lerini önceden üretir: her bölüm ve
+ALL, PDF_PRERENDER_AUTHORS=1 ise bölüm + yazar başına da. İş main.py'de
+tanımlanır (start ile verilir); /admin/pdf-prerender ile elle de tetiklenir.
+
+Dosyalar diske veri sürümü damgasıyla yazılır:
+
+    PDF_PRERENDER_DIR/<gün>/<BÖLÜM>_<yazar id | ALL>.<anahtar>.pdf
+
+Anahtar, uçtaki PDF önbellek anahtarıdır (başlık, yazar, vizit parmak izi,
+kullanıcı adları özeti); süreçler ve yeniden başlatmalar arasında aynıdır.
+İndirme ucu güncel anahtarı hesaplar: aynı adlı dosya varsa onu verir, yoksa
+(veri sonradan değiştiyse anahtar da değişir) canlı render'a düşer.
+
+Birden çok worker'da her biri zamanlayıcı çalıştırır; gün dizinindeki işaret
+dosyası (O_EXCL) işi tek worker'a bırakır. PDF_PRERENDER_KEEP_DAYS'ten eski gün
+dizinleri silinir.
+"""
+import logging
+import os
+import re
+import shutil
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional
+
+PDF_PRERENDER_AT = os.getenv("PDF_PRERENDER_AT", "")  # "" -> zamanlayıcı kapalı
+PDF_PRERENDER_AUTHORS = os.getenv("PDF_PRERENDER_AUTHORS", "0").lower() in ("1", "true", "yes")
+PDF_PRERENDER_DIR = os.getenv("PDF_PRERENDER_DIR", "./pdf_prerender")
+PDF_PRERENDER_KEEP_DAYS = int(os.getenv("PDF_PRERENDER_KEEP_DAYS", "7"))
+
+log = logging.getLogger("ia.pdf_prerender")
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]")
+_CLAIM = ".claimed"
+
+
+def _local_now() -> datetime:
+    return datetime.utcnow() + timedelta(hours=3)
+
+
+def parse_at(value: str) -> Optional[tuple]:
+    """'HH:MM' -> (saat, dakika); boş -> None."""
+    if not value:
+        return None
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})", value.strip())
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+        raise ValueError(f"PDF_PRERENDER_AT 'HH:MM' olmalı: {value!r}")
+    return int(m.group(1)), int(m.group(2))
+
+
+class PrerenderStore:
+    def __init__(self, root: str = PDF_PRERENDER_DIR, keep_days: int = PDF_PRERENDER_KEEP_DAYS):
+        self.root = root
+        self.keep_days = keep_days
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.written = 0
+
+    # ---------- dosyalar ----------
+    def _name(self, department: str, aid: Optional[int]) -> str:
+        return f"{_UNSAFE.sub('_', department.upper())}_{aid if aid is not None else 'ALL'}"
+
+    def _day_dir(self, day: str) -> str:
+        return os.path.join(self.root, _UNSAFE.sub("_", day))
+
+    def load(self, day: str, department: str, aid: Optional[int], key: str) -> Optional[bytes]:
+        """Güncel (anahtarı eşleşen) ön üretilmiş PDF; yoksa None."""
+        d = self._day_dir(day)
+        name = self._name(department, aid)
+        try:
+            with open(os.path.join(d, f"{name}.{key}.pdf"), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            stale = os.path.isdir(d) and any(
+                fn.startswith(name + ".") and fn.endswith(".pdf") for fn in os.listdir(d)
+            )
+            with self._lock:
+                if stale:
+                    self.stale += 1
+                else:
+                    self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def has(self, day: str, department: str, aid: Optional[int], key: str) -> bool:
+        return os.path.exists(os.path.join(self._day_dir(day), f"{self._name(department, aid)}.{key}.pdf"))
+
+    def save(self, day: str, department: str, aid: Optional[int], key: str, data: bytes) -> None:
+        """Atomik yaz (geçici dosya + rename); aynı raporun eski sürümlerini sil."""
+        d = self._day_dir(day)
+        os.makedirs(d, exist_ok=True)
+        name = self._name(department, aid)
+        final = os.path.join(d, f"{name}.{key}.pdf")
+        tmp = f"{final}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, final)
+        for fn in os.listdir(d):
+            if fn.startswith(name + ".") and fn.endswith(".pdf") and fn != os.path.basename(final):
+                try:
+                    os.remove(os.path.join(d, fn))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self.written += 1
+
+    def claim(self, day: str) -> bool:
+        """Günün zamanlanmış işini bu süreç mi yapacak (worker'lar arası tek sefer)?"""
+        d = self._day_dir(day)
+        os.makedirs(d, exist_ok=True)
+        try:
+            os.close(os.open(os.path.join(d, _CLAIM), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def prune(self, today: date) -> int:
+        """keep_days'ten eski gün dizinlerini sil."""
+        if not os.path.isdir(self.root):
+            return 0
+        oldest = today - timedelta(days=self.keep_days)
+        n = 0
+        for fn in os.listdir(self.root):
+            try:
+                d = date.fromisoformat(fn)
+            except ValueError:
+                continue
+            if d < oldest:
+                shutil.rmtree(os.path.join(self.root, fn), ignore_errors=True)
+                n += 1
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "stale": self.stale, "misses": self.misses, "written": self.written}
+
+
+# ================== Zamanlayıcı ==================
+class PrerenderScheduler:
+    """Her gün `at` yerel saatinde job(gün, yazarlar) çağırır (daemon thread)."""
+
+    def __init__(self, store: PrerenderStore, at: str = PDF_PRERENDER_AT, authors: bool = PDF_PRERENDER_AUTHORS):
+        self.store = store
+        self.at = parse_at(at)
+        self.authors = authors
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.at is not None
+
+    def next_run(self, now: Optional[datetime] = None) -> datetime:
+        now = now or _local_now()
+        h, m = self.at
+        t = now.replace(hour=h, minute=m, second=0, microsecond=0)
+        return t if t > now else t + timedelta(days=1)
+
+    def start(self, job: Callable[[str, bool], Dict]) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(job,), name="pdf-prerender", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self, job: Callable[[str, bool], Dict]) -> None:
+        while True:
+            wait = (self.next_run() - _local_now()).total_seconds()
+            if self._stop.wait(max(wait, 0)):
+                return
+            today = _local_now().date()
+            if not self.store.claim(today.isoformat()):
+                log.info("PDF ön üretimi %s: başka bir worker üstlendi", today)
+                continue
+            try:
+                summary = job(today.isoformat(), self.authors)
+                self.runs += 1
+                log.info("PDF ön üretimi %s: %s", today, summary)
+            except Exception:
+                log.exception("PDF ön üretimi %s başarısız", today)
+            self.store.prune(today)
+
+
+pdf_prerender = PrerenderStore()
+prerender_scheduler = PrerenderScheduler(pdf_prerender)
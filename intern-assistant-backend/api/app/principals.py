@@ -0,0 +1,98 @@
+﻿"""
+Doğrulanmış JWT -> kullanıcı (principal) önbelleği.
+
+UI her yenilemede birkaç paralel istek atar; her biri için token çözüp
+users tablosunu sorgulamamak adına doğrulanmış kullanıcı alanları token'a
+göre kısa süre saklanır:
+- boyut sınırlı (LRU), süre sınırlı (TTL; hiçbir kayıt token'ın exp'inden
+  sonra yaşamaz),
+- kullanıcılar değişince (user_directory geçersiz kılınınca) tamamen boşaltılır,
+- FastAPI'nin sync uç thread havuzunda güvenli (tek kilit).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from .config import AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS
+from .directory import user_directory
+
+
+class Principal(NamedTuple):
+    id: int
+    username: str
+    display_name: str
+    role: str
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int = AUTH_CACHE_MAX_ENTRIES, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, Principal)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Bearer token'ın kendisi bellekte anahtar olarak tutulmasın
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, principal = item
+            if expires_at <= now:
+                del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, exp: Optional[float], generation: int) -> None:
+        """
+        exp: token'ın son geçerlilik zamanı (epoch saniye).
+        generation: kullanıcı sorgusu öncesi okunan `generation`; arada
+        kullanıcılar değiştiyse eski veri önbelleğe yazılmaz.
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = self._key(token)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._items[key] = (expires_at, principal)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+principal_cache = PrincipalCache()
+
+# Kullanıcı eklendi / değişti / silindi -> önbellekteki tüm oturumlar yeniden doğrulansın
+user_directory.add_listener(principal_cache.clear)
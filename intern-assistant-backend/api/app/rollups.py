@@ -0,0 +1,355 @@
+﻿"""
+Günlük özet (rollup) tabloları.
+
+daily_rollups         (gün, bölüm, yazar) -> vizit / kritik / ilaç / tetkik / konsültasyon
+daily_patient_rollups (gün, bölüm, yazar, hasta) -> vizit sayısı
+day_versions          (gün, bölüm) -> veri sürümü (her yazımda +1; okuma uçlarının ETag'i)
+
+Vizit yazımları (create / update / delete) aynı transaction içinde bu
+tabloları günceller; rapor uçları vizitleri taramak yerine buradan okur
+(maliyet vizit sayısıyla değil yazar/hasta sayısıyla büyür).
+
+Komut satırı (api/ klasöründen):
+    python -m app.rollups verify    # ham vizitlerden yeniden hesapla, farkları raporla
+    python -m app.rollups rebuild   # tabloları ham vizitlerden yeniden oluştur
+"""
+import sys
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, and_, case, cast, delete, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import archive
+from .models import Visit, DailyRollup, DailyPatientRollup, DayVersion
+
+# rollup kolonu -> Visit kolonu
+FLAGS = (
+    ("critical", "ops_critical"),
+    ("drugs", "ops_drug"),
+    ("tests", "ops_test"),
+    ("consults", "ops_consult"),
+)
+
+_R = DailyRollup.__table__
+_P = DailyPatientRollup.__table__
+_V = DayVersion.__table__
+
+
+# ================== Yardımcılar ==================
+def _key(v: Visit) -> Dict:
+    # Anahtar kolonları NOT NULL (birincil anahtar): eksik yazar/bölüm 0 / "" olur
+    return {"day": v.ts.date(), "department": v.department or "", "author_id": v.author_id or 0}
+
+
+def visit_flags(v: Visit) -> Dict[str, int]:
+    return {col: 1 if getattr(v, attr) else 0 for col, attr in FLAGS}
+
+
+def _upsert_fn(db: Session):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        return postgresql.insert
+    if name == "sqlite":
+        return sqlite.insert
+    return None
+
+
+def _increment(db: Session, table, pk: Dict, incs: Dict[str, int], first_visit_id: Optional[int] = None) -> None:
+    """pk satırına incs kadar ekle; satır yoksa oluştur (eşzamanlı yazımlara dayanıklı upsert)."""
+    values = {**pk, **incs}
+    if first_visit_id is not None:
+        values["first_visit_id"] = first_visit_id
+    ins = _upsert_fn(db)
+    if ins is None:
+        # ON CONFLICT desteklemeyen DB'ler: önce UPDATE, satır yoksa INSERT
+        cond = and_(*[table.c[k] == v for k, v in pk.items()])
+        set_ = {k: table.c[k] + v for k, v in incs.items()}
+        if db.execute(update(table).where(cond).values(set_)).rowcount == 0:
+            db.execute(table.insert().values(values))
+        return
+
+    stmt = ins(table).values(values)
+    set_ = {k: table.c[k] + stmt.excluded[k] for k in incs}
+    if first_visit_id is not None:
+        cur = table.c.first_visit_id
+        set_["first_visit_id"] = case(
+            (cur.is_(None), stmt.excluded.first_visit_id),
+            (cur < stmt.excluded.first_visit_id, cur),
+            else_=stmt.excluded.first_visit_id,
+        )
+    db.execute(stmt.on_conflict_do_update(index_elements=list(pk), set_=set_))
+
+
+def _increment_many(db: Session, table, rows: List[Dict], inc_cols: Tuple[str, ...]) -> None:
+    """_increment'in toplu hali (first_visit_id olmadan): tek upsert, executemany ile."""
+    ins = _upsert_fn(db)
+    if ins is None:
+        for r in rows:
+            _increment(db, table, {k: v for k, v in r.items() if k not in inc_cols}, {k: r[k] for k in inc_cols})
+        return
+    stmt = ins(table)
+    set_ = {k: table.c[k] + stmt.excluded[k] for k in inc_cols}
+    pk = [c.name for c in table.primary_key.columns]
+    db.execute(stmt.on_conflict_do_update(index_elements=pk, set_=set_), rows)
+
+
+def _decrement(db: Session, table, pk: Dict, decs: Dict[str, int]) -> None:
+    """pk satırından decs kadar düş; vizit sayısı sıfırlanan satırı sil."""
+    cond = and_(*[table.c[k] == v for k, v in pk.items()])
+    db.execute(update(table).where(cond).values({k: table.c[k] - v for k, v in decs.items()}))
+    if "visits" in decs:
+        db.execute(delete(table).where(cond, table.c.visits <= 0))
+
+
+def bump_version(db: Session, day: date, department: str) -> None:
+    _increment(db, _V, {"day": day, "department": department}, {"version": 1})
+
+
+# ================== Yazım kancaları ==================
+# Her kanca vizitin (gün, bölüm) sürümünü de artırır; metin düzenlemesi dahil.
+def visit_added(db: Session, v: Visit) -> None:
+    """Yeni vizit (flush edilmiş, id'si belli) -> sayaçları artır."""
+    visits_added(db, [v])
+
+
+def visits_added(db: Session, visits: List[Visit]) -> None:
+    """Toplu ekleme: aynı anahtardaki vizitler tek upsert'te birleşir."""
+    rows: Dict[tuple, Dict[str, int]] = {}
+    firsts: Dict[tuple, int] = {}
+    patients: Dict[tuple, int] = {}
+    for v in visits:
+        pk = _key(v)
+        key = tuple(pk.values())
+        incs = rows.setdefault(key, {"visits": 0, **{col: 0 for col, _ in FLAGS}})
+        incs["visits"] += 1
+        for col, n in visit_flags(v).items():
+            incs[col] += n
+        firsts[key] = min(firsts.get(key, v.id), v.id)
+        pkey = key + (v.patient_id or "",)
+        patients[pkey] = patients.get(pkey, 0) + 1
+
+    for d, dep in {k[:2] for k in rows}:
+        bump_version(db, d, dep)
+    for key, incs in rows.items():
+        _increment(db, _R, dict(zip(("day", "department", "author_id"), key)), incs, first_visit_id=firsts[key])
+    if patients:
+        _increment_many(db, _P, [
+            dict(zip(("day", "department", "author_id", "patient_id", "visits"), key + (n,)))
+            for key, n in patients.items()
+        ], ("visits",))
+
+
+def visit_flags_changed(db: Session, v: Visit, old_flags: Dict[str, int]) -> None:
+    """Düzenlemede işaret değişimi: sadece fark kadar güncelle."""
+    pk = _key(v)
+    bump_version(db, pk["day"], pk["department"])
+    new_flags = visit_flags(v)
+    diff = {k: new_flags[k] - old_flags[k] for k in new_flags if new_flags[k] != old_flags[k]}
+    if diff:
+        _increment(db, _R, pk, diff)
+
+
+def visit_removed(db: Session, v: Visit) -> None:
+    """Silinen vizit (silme flush edilmiş) -> sayaçları düş, gerekirse ilk vizit id'sini yenile."""
+    pk = _key(v)
+    bump_version(db, pk["day"], pk["department"])
+    _decrement(db, _R, pk, {"visits": 1, **visit_flags(v)})
+    _decrement(db, _P, {**pk, "patient_id": v.patient_id or ""}, {"visits": 1})
+
+    cond = and_(*[_R.c[k] == val for k, val in pk.items()])
+    first = db.execute(_R.select().with_only_columns(_R.c.first_visit_id).where(cond)).scalar()
+    if first == v.id:
+        start = pk["day"]
+        new_first = (
+            db.query(func.min(Visit.id))
+            .filter(
+                Visit.ts >= start, Visit.ts < start + timedelta(days=1),
+                Visit.department == pk["department"], Visit.author_id == pk["author_id"],
+            )
+            .scalar()
+        )
+        db.execute(update(_R).where(cond).values(first_visit_id=new_first))
+
+
+# ================== Okuma ==================
+def _filters(table, day: date, department: Optional[str], author_id: Optional[int]) -> List:
+    conds = [table.c.day == day]
+    if department is not None:
+        conds.append(table.c.department == department)
+    if author_id is not None:
+        conds.append(table.c.author_id == author_id)
+    return conds
+
+
+def daily_counts(
+    db: Session,
+    day: date,
+    department: Optional[str] = None,
+    author_id: Optional[int] = None,
+) -> Tuple[List, Dict[int, int], int]:
+    """
+    (yazar satırları, yazar -> ayrık hasta sayısı, toplam ayrık hasta).
+    Yazar satırları: aid, first_id, visits, critical, drugs, tests, consults (first_id sıralı).
+    """
+    per_author = db.execute(
+        _R.select()
+        .with_only_columns(
+            _R.c.author_id.label("aid"),
+            func.min(_R.c.first_visit_id).label("first_id"),
+            *[func.sum(_R.c[k]).label(k) for k in ("visits", "critical", "drugs", "tests", "consults")],
+        )
+        .where(*_filters(_R, day, department, author_id))
+        .group_by(_R.c.author_id)
+        .order_by(func.min(_R.c.first_visit_id))
+    ).all()
+
+    pconds = _filters(_P, day, department, author_id)
+    patients = dict(db.execute(
+        _P.select()
+        .with_only_columns(_P.c.author_id, func.count(func.distinct(_P.c.patient_id)))
+        .where(*pconds)
+        .group_by(_P.c.author_id)
+    ).all())
+    patients_seen = 0
+    if len(patients) > 1:
+        patients_seen = db.execute(
+            _P.select().with_only_columns(func.count(func.distinct(_P.c.patient_id))).where(*pconds)
+        ).scalar() or 0
+    elif patients:
+        patients_seen = next(iter(patients.values()))
+    return per_author, patients, patients_seen
+
+
+def day_keys(db: Session, day: date) -> List[Tuple[str, int]]:
+    """Günde vizit olan (bölüm, yazar) çiftleri (bölümsüz / yazarsız anahtarlar hariç)."""
+    return [tuple(r) for r in db.execute(
+        _R.select()
+        .with_only_columns(_R.c.department, _R.c.author_id)
+        .where(_R.c.day == day, _R.c.department != "", _R.c.author_id != 0)
+        .distinct()
+    ).all()]
+
+
+def data_version(db: Session, day: date, department: Optional[str] = None) -> int:
+    """
+    Günün veri sürümü; bölüm verilmezse tüm bölümlerin toplamı.
+    Sürümler yalnızca artar, toplam da her yazımda değişir.
+    """
+    return int(db.execute(
+        _V.select()
+        .with_only_columns(func.coalesce(func.sum(_V.c.version), 0))
+        .where(*_filters(_V, day, department, None))
+    ).scalar())
+
+
+# ================== Yeniden hesaplama / doğrulama ==================
+def _day_expr(db: Session, V=Visit):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(V.ts)
+    return cast(V.ts, Date)
+
+
+def _as_date(v) -> date:
+    return date.fromisoformat(v) if isinstance(v, str) else v
+
+
+def _expected(db: Session, sources: Optional[List] = None) -> Tuple[Dict[tuple, tuple], Dict[tuple, int]]:
+    """Ham vizitlerden (sıcak + arşiv, bkz. archive.all_sources) beklenen rollup satırları."""
+    rollups = {}
+    patients: Dict[tuple, int] = {}
+    for V, conds in sources if sources is not None else archive.all_sources(db):
+        day = _day_expr(db, V)
+        cols = [func.count(V.id)] + [
+            func.sum(case((getattr(V, attr) == True, 1), else_=0)) for _, attr in FLAGS  # noqa: E712
+        ]
+        for d, dep, aid, first_id, *nums in (
+            db.query(day, V.department, V.author_id, func.min(V.id), *cols)
+            .filter(*conds)
+            .group_by(day, V.department, V.author_id)
+        ):
+            key = (_as_date(d), dep or "", aid or 0)
+            prev = rollups.get(key)
+            vals = tuple(int(n or 0) for n in nums)
+            if prev:  # NULL ve "" / 0 anahtarları birleşir
+                vals = tuple(a + b for a, b in zip(prev[:-1], vals))
+                first_id = min(prev[-1], first_id)
+            rollups[key] = vals + (first_id,)
+
+        for d, dep, aid, pid, n in (
+            db.query(day, V.department, V.author_id, V.patient_id, func.count(V.id))
+            .filter(*conds)
+            .group_by(day, V.department, V.author_id, V.patient_id)
+        ):
+            key = (_as_date(d), dep or "", aid or 0, pid or "")
+            patients[key] = patients.get(key, 0) + int(n)
+    return rollups, patients
+
+
+def _stored(db: Session) -> Tuple[Dict[tuple, tuple], Dict[tuple, int]]:
+    rollups = {
+        (_as_date(r.day), r.department, r.author_id):
+            (r.visits, r.critical, r.drugs, r.tests, r.consults, r.first_visit_id)
+        for r in db.execute(_R.select())
+    }
+    patients = {
+        (_as_date(r.day), r.department, r.author_id, r.patient_id): r.visits
+        for r in db.execute(_P.select())
+    }
+    return rollups, patients
+
+
+def verify(db: Session) -> List[str]:
+    """Saklanan rollup'ları ham vizitlerle karşılaştır; farkları satır satır döndür."""
+    drift = []
+    for name, exp, got in zip(("daily_rollups", "daily_patient_rollups"), _expected(db), _stored(db)):
+        for key in sorted(set(exp) | set(got), key=repr):
+            if exp.get(key) != got.get(key):
+                drift.append(f"{name} {key}: beklenen={exp.get(key)} kayıtlı={got.get(key)}")
+    return drift
+
+
+def rebuild(db: Session, sources: Optional[List] = None) -> Tuple[int, int]:
+    """Rollup tablolarını ham vizitlerden yeniden oluştur (commit çağırana ait)."""
+    rollups, patients = _expected(db, sources)
+    db.execute(delete(_R))
+    db.execute(delete(_P))
+    if rollups:
+        db.execute(_R.insert(), [
+            dict(zip(("day", "department", "author_id"), k),
+                 **dict(zip(("visits", "critical", "drugs", "tests", "consults", "first_visit_id"), v)))
+            for k, v in rollups.items()
+        ])
+    if patients:
+        db.execute(_P.insert(), [
+            dict(zip(("day", "department", "author_id", "patient_id"), k), visits=v)
+            for k, v in patients.items()
+        ])
+    return len(rollups), len(patients)
+
+
+if __name__ == "__main__":
+    from .db import SessionLocal
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    db = SessionLocal()
+    try:
+        if cmd == "rebuild":
+            before = set(_stored(db)[0])
+            n, p = rebuild(db)
+            # Düzeltilen günlerin önbelleklenmiş yanıtları (ETag) geçersiz olsun
+            for d, dep in {k[:2] for k in before | set(_stored(db)[0])}:
+                bump_version(db, d, dep)
+            db.commit()
+            print(f"Yeniden oluşturuldu: {n} özet satırı, {p} hasta satırı")
+        elif cmd == "verify":
+            drift = verify(db)
+            for line in drift:
+                print(line)
+            print("Fark yok." if not drift else f"{len(drift)} fark bulundu.")
+            sys.exit(1 if drift else 0)
+        else:
+            sys.exit("Kullanım: python -m app.rollups [verify|rebuild]")
+    finally:
+        db.close()
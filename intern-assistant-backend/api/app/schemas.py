@@ -47,6 +47,27 @@ class PatientOut(BaseModel):
         orm_mode = True
 
 
+class PatientAdmit(DeriveRequest):
+    """Toplu kabul öğesi: TC yalnızca türetmede kullanılır, saklanmaz."""
+    label: Optional[str] = ""
+
+
+class PatientBulkCreate(BaseModel):
+    items: List[PatientAdmit] = Field(..., min_length=1, max_length=1000)
+
+
+class PatientBulkItem(BaseModel):
+    index: int  # items içindeki sıra
+    patient_id: str
+    label: str = ""
+    created: bool  # False -> zaten kayıtlıydı (etiket değişmez)
+
+
+class PatientBulkOut(BaseModel):
+    created: int
+    results: List[PatientBulkItem]
+
+
 # ========== Visits ==========
 class VisitCreate(BaseModel):
     patient_id: str
@@ -60,6 +81,22 @@ class VisitCreate(BaseModel):
     department: Optional[str] = "GENEL"
 
 
+class VisitBulkCreate(BaseModel):
+    items: List[VisitCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class VisitBulkItem(BaseModel):
+    index: int  # items içindeki sıra
+    ok: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class VisitBulkOut(BaseModel):
+    created: int
+    results: List[VisitBulkItem]
+
+
 class VisitOut(BaseModel):
     id: int
     patient_id: str
@@ -88,6 +125,16 @@ class ReportDaily(BaseModel):
     lines: List[str]
 
 
+
+class ReportRange(BaseModel):
+    day_from: str
+    day_to: str
+    totals: Dict[str, int]  # {"visits", "critical", "drugs", "tests", "consults"}
+    by_day: Dict[str, Dict[str, int]]  # {"2025-03-10": {...}, ...}  (aralıktaki her gün, boşlar 0)
+    by_department: Dict[str, Dict[str, int]]
+    by_author: Dict[str, Dict[str, int]]
+
+
 # ========== Authors (Supervisor için) ==========
 class AuthorOut(BaseModel):
     username: str
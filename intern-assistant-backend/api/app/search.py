@@ -0,0 +1,146 @@
+﻿"""
+Vizit notlarında tam metin arama.
+
+SQLite   : FTS5 sanal tablosu `visits_fts` (rowid = visits.id, gövde = katlanmış not).
+           Vizit yazımları aynı transaction içinde index_visit / unindex_visit çağırır.
+Postgres : visits.search_tsv (GENERATED ... STORED tsvector) + GIN indeksi;
+           veritabanı kendisi güncel tutar, kancalar bir şey yapmaz.
+Diğer    : indeks yok, katlanmış not üzerinde LIKE ile tarama (yalnızca yedek;
+           terim önek değil alt dizgi olarak eşleşir).
+
+İndeks sadece sıcak tabloyu (visits) kapsar; arşive taşınan vizitler aramada çıkmaz.
+
+Türkçe: hem not hem sorgu aynı şekilde katlanır (ç->c, ğ->g, ı/İ/I->i, ö->o, ş->s, ü->u,
+küçük harf); "İLAÇ", "ilac" ve "ilaç" aynı terimdir. Her sorgu terimi önek olarak
+eşleşir ("ilac" -> "ilaclar") ve terimler VE ile bağlanır.
+"""
+import re
+from typing import Iterable, List
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, delete, func, literal_column, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query, Session
+
+from .models import Visit
+
+_TR_FROM = "ÇĞİIÖŞÜÂÎÛçğıöşüâîû"
+_TR_TO = "cgiiosuaiucgiosuaiu"
+_FOLD = str.maketrans(_TR_FROM, _TR_TO)
+
+MAX_TERMS = 8
+
+# FTS5 tablosu modellerin metadata'sından ayrı (create_all ile oluşturulmaz)
+_meta = MetaData()
+_F = Table(
+    "visits_fts",
+    _meta,
+    Column("rowid", Integer, primary_key=True),
+    Column("body", Text),
+)
+
+
+def fold(s: str) -> str:
+    return (s or "").translate(_FOLD).lower()
+
+
+def fold_sql(expr):
+    """fold()'un SQL karşılığı: iç içe REPLACE + lower (translate her veritabanında yok)."""
+    for a, b in zip(_TR_FROM, _TR_TO):
+        expr = func.replace(expr, a, b)
+    return func.lower(expr)
+
+
+def terms(q: str) -> List[str]:
+    return re.findall(r"\w+", fold(q))[:MAX_TERMS]
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+# ================== Şema (göç 5) ==================
+def create_index(conn: Connection) -> None:
+    """Dile göre arama indeksini oluştur ve mevcut vizitlerden doldur."""
+    name = conn.dialect.name
+    if name == "sqlite":
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS visits_fts "
+            "USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(delete(_F))
+        last = 0
+        while True:
+            part = conn.execute(
+                text("SELECT id, text FROM visits WHERE id > :last ORDER BY id LIMIT 5000"), {"last": last},
+            ).all()
+            if not part:
+                break
+            conn.execute(_F.insert(), [{"rowid": vid, "body": fold(t)} for vid, t in part])
+            last = part[-1][0]
+    elif name == "postgresql":
+        conn.execute(text(
+            "ALTER TABLE visits ADD COLUMN IF NOT EXISTS search_tsv tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, "
+            f"lower(translate(coalesce(text, ''), '{_TR_FROM}', '{_TR_TO}')))) STORED"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_visits_search_tsv ON visits USING GIN (search_tsv)"
+        ))
+
+
+# ================== Yazım kancaları ==================
+def index_visits(db: Session, visits: Iterable[Visit]) -> None:
+    """Yeni / metni değişen vizitleri (flush edilmiş) indekse yaz."""
+    if _dialect(db) != "sqlite":
+        return
+    visits = list(visits)
+    if not visits:
+        return
+    db.execute(delete(_F).where(_F.c.rowid.in_([v.id for v in visits])))
+    db.execute(_F.insert(), [{"rowid": v.id, "body": fold(v.text)} for v in visits])
+
+
+def index_visit(db: Session, v: Visit) -> None:
+    index_visits(db, [v])
+
+
+def unindex_visit(db: Session, v: Visit) -> None:
+    unindex_ids(db, [v.id])
+
+
+def unindex_ids(db: Session, ids: List[int]) -> None:
+    """Silinen / arşive taşınan vizitleri indeksten çıkar."""
+    if _dialect(db) == "sqlite" and ids:
+        db.execute(delete(_F).where(_F.c.rowid.in_(ids)))
+
+
+# ================== Okuma ==================
+def apply(db: Session, q: Query, words: List[str]) -> Query:
+    """
+    Filtrelenmiş bir Visit sorgusuna arama koşulunu ve sıralamayı ekle
+    (önce ilgililik, sonra en yeni vizit).
+    """
+    name = _dialect(db)
+    if name == "sqlite":
+        match = " ".join(f'"{w}"*' for w in words)
+        return (
+            q.join(_F, _F.c.rowid == Visit.id)
+            .filter(_F.c.body.match(match))
+            .order_by(literal_column("visits_fts.rank"), Visit.ts.desc(), Visit.id.desc())
+        )
+    if name == "postgresql":
+        tsq = func.to_tsquery("simple", " & ".join(f"{w}:*" for w in words))
+        tsv = literal_column("visits.search_tsv")
+        return (
+            q.filter(tsv.op("@@")(tsq))
+            .order_by(func.ts_rank(tsv, tsq).desc(), Visit.ts.desc(), Visit.id.desc())
+        )
+    return scan(q, words)
+
+
+def scan(q: Query, words: List[str]) -> Query:
+    """İndekssiz yedek: not sorguyla aynı şekilde katlanıp her terim LIKE ile aranır."""
+    folded = fold_sql(func.coalesce(Visit.text, ""))
+    for w in words:
+        q = q.filter(folded.contains(w, autoescape=True))
+    return q.order_by(Visit.ts.desc(), Visit.id.desc())
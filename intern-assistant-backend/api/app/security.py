@@ -29,3 +29,8 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALG)
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    """JWT'yi doğrula ve payload'ı döndür (geçersizse jose.JWTError)."""
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
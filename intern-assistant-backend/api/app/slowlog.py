@@ -0,0 +1,237 @@
+﻿"""
+Yavaş sorgu kaydı (opsiyonel): SLOW_QUERY_MS > 0 iken açılır.
+
+Eşiği aşan her SQL ifadesi db.py'deki engine'lerin cursor olaylarıyla
+yakalanır; uç adı (metrics.current_endpoint), süre, ifade ve bağlı
+parametrelerin *şekli* (tipler / uzunluklar; hasta verisi olduğu için
+değerler asla saklanmaz) ile birlikte loglanır ve bir halka tampona yazılır.
+Sorgu planı istek thread'inde değil, arka planda tek bir işçi thread'inde ve
+havuzdan alınan *ayrı* bir bağlantıda alınır; probe transaction'ı her zaman
+geri alınır. İsteğin transaction'ı hiç etkilenmez (Postgres'te başarısız bir
+EXPLAIN onu "aborted" durumuna sokamaz) ve isteğin süresi uzamaz. Plan kayda
+hazır olunca yazılır (o zamana kadar plan=None).
+- SQLite: EXPLAIN QUERY PLAN (okunabilir plan; ham EXPLAIN bytecode'dur)
+- Postgres: EXPLAIN; salt okunur düz SELECT'lerde SLOW_QUERY_ANALYZE_SAMPLE
+  oranında EXPLAIN (ANALYZE, BUFFERS) (sorgu ikinci kez çalışır). FOR
+  UPDATE/SHARE, SELECT INTO, kilit / sequence fonksiyonları içeren ifadeler
+  ve yazma ifadeleri asla ANALYZE edilmez. Probe SLOW_QUERY_EXPLAIN_TIMEOUT_MS
+  ile sınırlıdır.
+- Async sürücülerde (DB_ASYNC=1) plan alınmaz.
+Bekleyen probe sayısı SLOW_QUERY_EXPLAIN_QUEUE'yu aşarsa plan atlanır.
+
+Tampon /admin/slow-queries ucundan (sadece admin) okunur. Süreç içidir.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set
+
+from sqlalchemy import event
+
+from . import db as _db
+from .metrics import current_endpoint
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))  # 0 -> kapalı
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "200"))
+SLOW_QUERY_ANALYZE_SAMPLE = float(os.getenv("SLOW_QUERY_ANALYZE_SAMPLE", "0.1"))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000"))
+SLOW_QUERY_EXPLAIN_QUEUE = int(os.getenv("SLOW_QUERY_EXPLAIN_QUEUE", "32"))
+SLOW_QUERY_MAX_SQL_CHARS = 4000
+
+log = logging.getLogger("ia.slow_query")
+
+_EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+# ANALYZE ifadeyi gerçekten çalıştırır: satır kilidi alan, tablo oluşturan ya da
+# yan etkili fonksiyon çağıran SELECT'ler ikinci kez çalıştırılmaz.
+_NOT_READ_ONLY = re.compile(
+    r"\bfor\s+(?:no\s+key\s+)?(?:update|share|key\s+share)\b"
+    r"|\binto\b"
+    r"|\b(?:pg_(?:try_)?advisory\w*|nextval|setval|currval|lastval|pg_notify|set_config"
+    r"|txid_current\w*|pg_current_xact_id\w*|lo_\w+|dblink\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def analyzable(statement: str) -> bool:
+    """EXPLAIN ANALYZE ile yeniden çalıştırılması güvenli mi: salt okunur düz SELECT."""
+    return statement.lstrip().lower().startswith("select") and not _NOT_READ_ONLY.search(statement)
+
+
+def param_shape(parameters, executemany: bool = False):
+    """Bağlı parametrelerin şekli: değer yerine tip adı (dizilerde uzunluk)."""
+    if executemany:
+        rows = list(parameters or [])
+        return {"rows": len(rows), "first": param_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {k: _type_name(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_type_name(v) for v in parameters]
+    return _type_name(parameters)
+
+
+def _type_name(v) -> str:
+    if v is None:
+        return "null"
+    if isinstance(v, (list, tuple, set, frozenset)):
+        return f"{type(v).__name__}[{len(v)}]"
+    if isinstance(v, (str, bytes)):
+        return f"{type(v).__name__}({len(v)})"
+    return type(v).__name__
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_BUFFER,
+                 analyze_sample: float = SLOW_QUERY_ANALYZE_SAMPLE,
+                 explain_timeout_ms: int = SLOW_QUERY_EXPLAIN_TIMEOUT_MS,
+                 explain_queue: int = SLOW_QUERY_EXPLAIN_QUEUE):
+        self.threshold_ms = threshold_ms
+        self.analyze_sample = analyze_sample
+        self.explain_timeout_ms = explain_timeout_ms
+        self.explain_queue = explain_queue
+        self._lock = threading.Lock()
+        self._items: Deque[Dict] = deque(maxlen=size)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending: Set[Future] = set()
+        self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def install(self, engines: List) -> None:
+        for e in engines:
+            event.listen(e, "before_cursor_execute", self._before)
+            event.listen(e, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and context is not None:
+            context._ia_slow_t0 = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        t0 = getattr(context, "_ia_slow_t0", None)
+        if t0 is None:
+            return
+        ms = (time.perf_counter() - t0) * 1000
+        if ms < self.threshold_ms:
+            return
+        dialect = conn.dialect.name
+        kind = self._plan_kind(conn, dialect, statement, executemany)
+        entry = {
+            "at": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+            "ms": round(ms, 2),
+            "endpoint": current_endpoint(),
+            "dialect": dialect,
+            "statement": statement[:SLOW_QUERY_MAX_SQL_CHARS],
+            "params": param_shape(parameters, executemany),
+            "plan_kind": kind,
+            "plan": None,
+        }
+        with self._lock:
+            self._items.append(entry)
+            self.recorded += 1
+        log.warning("yavaş sorgu %.1f ms [%s] %s", ms, entry["endpoint"] or "-", " ".join(statement.split())[:300])
+        if kind is not None:
+            if isinstance(parameters, dict):
+                parameters = dict(parameters)
+            elif isinstance(parameters, (list, tuple)):
+                parameters = tuple(parameters)
+            self._submit(entry, conn.engine, kind, statement, parameters)
+
+    def _plan_kind(self, conn, dialect: str, statement: str, executemany: bool) -> Optional[str]:
+        if executemany or conn.dialect.is_async or not statement.lstrip().lower().startswith(_EXPLAINABLE):
+            return None
+        if dialect == "sqlite":
+            return "EXPLAIN QUERY PLAN"
+        if dialect == "postgresql":
+            if analyzable(statement) and random.random() < self.analyze_sample:
+                return "EXPLAIN (ANALYZE, BUFFERS)"
+            return "EXPLAIN"
+        return None
+
+    # ================== Arka plan planı ==================
+    def _submit(self, entry: Dict, engine, kind: str, statement: str, parameters) -> None:
+        with self._lock:
+            if len(self._pending) >= self.explain_queue:
+                entry["plan"] = ["plan atlandı: bekleyen plan kuyruğu dolu"]
+                return
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+            fut = self._pool.submit(self._explain, entry, engine, kind, statement, parameters)
+            self._pending.add(fut)
+        fut.add_done_callback(self._done)
+
+    def _done(self, fut: Future) -> None:
+        with self._lock:
+            self._pending.discard(fut)
+
+    def _explain(self, entry: Dict, engine, kind: str, statement: str, parameters) -> None:
+        """
+        Planı havuzdan alınan ayrı bir DBAPI bağlantısında al (SQLAlchemy olaylarını
+        tetiklemez). Probe transaction'ı her durumda geri alınır.
+        """
+        try:
+            raw = engine.raw_connection()
+            try:
+                cur = raw.cursor()
+                try:
+                    if engine.dialect.name == "postgresql":
+                        cur.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                    cur.execute(f"{kind} {statement}", parameters)
+                    rows = cur.fetchall()
+                finally:
+                    cur.close()
+            finally:
+                try:
+                    raw.rollback()
+                finally:
+                    raw.close()
+        except Exception as e:
+            plan = [f"plan alınamadı: {type(e).__name__}: {e}"]
+        else:
+            if engine.dialect.name == "sqlite":
+                # (id, parent, notused, detail)
+                plan = [f"{r[0]}|{r[1]} {r[-1]}" for r in rows]
+            else:
+                plan = [r[0] for r in rows]
+        with self._lock:
+            entry["plan"] = plan
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Bekleyen planların bitmesini bekle; hepsi bittiyse True."""
+        with self._lock:
+            pending = list(self._pending)
+        if not pending:
+            return True
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def items(self, limit: Optional[int] = None) -> List[Dict]:
+        """En yeniden eskiye."""
+        with self._lock:
+            out = [dict(e) for e in reversed(self._items)]  # plan arka planda yazılabilir
+        return out[:limit] if limit else out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_ms": self.threshold_ms,
+                "buffered": len(self._items),
+                "recorded": self.recorded,
+            }
+
+
+slow_query_log = SlowQueryLog()
+if slow_query_log.enabled:
+    slow_query_log.install(_db.all_engines())
@@ -0,0 +1,104 @@
+﻿"""
+POST /visits/bulk ile N adet POST /visits çağrısının karşılaştırması.
+
+Geçici bir SQLite dosyası üzerinde, istekler ağ olmadan ASGI üzerinden
+(httpx.ASGITransport) gönderilir. Her turda aynı N not önce tek tek,
+sonra tek bir toplu istekle yazılır.
+
+Kullanım (api/ klasöründen):
+    python -m bench.bulk --items 100 500 1000 --rounds 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def _seed() -> None:
+    from app.db import SessionLocal
+    from app.models import User, Patient
+
+    db = SessionLocal()
+    db.add(User(username="intern0", display_name="İntörn 0", password_hash="-", role="intern"))
+    db.add_all([Patient(patient_id=f"PX-{i:06d}", label="") for i in range(500)])
+    db.commit()
+    db.close()
+
+
+def _items(n: int, rnd: random.Random) -> list:
+    return [
+        {
+            "patient_id": f"PX-{rnd.randrange(500):06d}",
+            "text": "Vizit turu: genel durum iyi, vital bulgular stabil.",
+            "department": rnd.choice(["DAHILIYE", "GENEL", "KARDIYOLOJI"]),
+            "ops_drug": rnd.random() < 0.3,
+            "ops_critical": rnd.random() < 0.05,
+        }
+        for _ in range(n)
+    ]
+
+
+async def _round(client, headers: dict, items: list) -> dict:
+    t0 = time.perf_counter()
+    for it in items:
+        r = await client.post("/visits", json=it, headers=headers)
+        r.raise_for_status()
+    single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    r = await client.post("/visits/bulk", json={"items": items}, headers=headers)
+    r.raise_for_status()
+    bulk = time.perf_counter() - t0
+    assert r.json()["created"] == len(items)
+    return {"single_s": single, "bulk_s": bulk}
+
+
+async def _run(args) -> list:
+    import httpx
+    from app.main import app
+    from app.db import engine
+    from app.migrations import upgrade
+    from app.security import create_access_token
+
+    upgrade(engine)
+    _seed()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'intern0'})}"}
+    rnd = random.Random(3)
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for n in args.items:
+            rounds = [await _round(client, headers, _items(n, rnd)) for _ in range(args.rounds)]
+            single = statistics.median(r["single_s"] for r in rounds)
+            bulk = statistics.median(r["bulk_s"] for r in rounds)
+            results.append({
+                "items": n,
+                "single_visits_per_s": round(n / single, 1),
+                "bulk_visits_per_s": round(n / bulk, 1),
+                "speedup": round(single / bulk, 1),
+            })
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--items", type=int, nargs="+", default=[100, 500, 1000])
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        results = asyncio.run(_run(args))
+
+    print(f"{'öğe':>6} {'tekli vizit/s':>14} {'toplu vizit/s':>14} {'kat':>6}")
+    for r in results:
+        print(f"{r['items']:>6} {r['single_visits_per_s']:>14} {r['bulk_visits_per_s']:>14} {r['speedup']:>6}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
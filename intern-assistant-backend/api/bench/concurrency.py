@@ -0,0 +1,150 @@
+﻿"""
+Okuma uçları için sync (varsayılan) ve async (DB_ASYNC=1) mod karşılaştırması.
+
+Her mod ayrı bir alt süreçte, geçici bir SQLite dosyası üzerinde çalışır;
+istekler ağ olmadan ASGI üzerinden (httpx.ASGITransport) gönderilir.
+
+Kullanım (api/ klasöründen):
+    python -m bench.concurrency --clients 50 100 200 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DAY = "2025-03-10"
+ENDPOINTS = [
+    ("/reports/daily", {"day": DAY}),
+    ("/visits/by_department", {"day": DAY, "department": "DAHILIYE", "limit": 200}),
+    ("/patients/list", {"day": DAY, "department": "DAHILIYE"}),
+]
+
+
+def _seed(n_visits: int) -> None:
+    from app import rollups
+    from app.db import SessionLocal
+    from app.models import User, Patient, Visit
+
+    rnd = random.Random(7)
+    db = SessionLocal()
+    users = [User(username=f"intern{i}", display_name=f"İntörn {i}", password_hash="-", role="intern") for i in range(20)]
+    users.append(User(username="hoca", display_name="Hoca", password_hash="-", role="supervisor"))
+    db.add_all(users)
+    db.flush()
+    pids = [f"PX-{i:06d}" for i in range(500)]
+    db.add_all([Patient(patient_id=p, label=f"Yatak {i}") for i, p in enumerate(pids)])
+    db.flush()
+    start = datetime.fromisoformat(DAY)
+    db.add_all([
+        Visit(
+            patient_id=rnd.choice(pids),
+            author_id=users[rnd.randrange(20)].id,
+            text="Genel durum iyi, vital bulgular stabil.",
+            department=rnd.choice(["DAHILIYE", "GENEL", "KARDIYOLOJI"]),
+            ops_drug=rnd.random() < 0.3,
+            ops_test=rnd.random() < 0.4,
+            ops_critical=rnd.random() < 0.05,
+            ts=start + timedelta(seconds=rnd.randrange(86400)),
+        )
+        for _ in range(n_visits)
+    ])
+    db.flush()
+    rollups.rebuild(db)
+    db.commit()
+    db.close()
+
+
+async def _drive(app, token: str, clients: int, total: int) -> dict:
+    import httpx
+
+    lat = []
+    errors = [0]
+    left = [total]
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker(i: int):
+            while left[0] > 0:
+                left[0] -= 1
+                path, params = ENDPOINTS[left[0] % len(ENDPOINTS)]
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(path, params=params, headers=headers)
+                    ok = r.status_code == 200
+                except Exception:
+                    # ör. bağlantı havuzu zaman aşımı
+                    ok = False
+                lat.append(time.perf_counter() - t0)
+                if not ok:
+                    errors[0] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        wall = time.perf_counter() - t0
+
+    q = statistics.quantiles(lat, n=100)
+    return {
+        "clients": clients,
+        "requests": len(lat),
+        "errors": errors[0],
+        "rps": round(len(lat) / wall, 1),
+        "p50_ms": round(q[49] * 1000, 2),
+        "p95_ms": round(q[94] * 1000, 2),
+    }
+
+
+def _child(args) -> None:
+    """Alt süreç: ortam değişkenleri ayarlanmış halde uygulamayı yükle ve ölç."""
+    from app.main import app
+    from app.db import engine
+    from app.migrations import upgrade
+    from app.security import create_access_token
+
+    upgrade(engine)
+    _seed(args.visits)
+    token = create_access_token({"sub": "hoca"})
+    results = [asyncio.run(_drive(app, token, c, args.requests)) for c in args.clients]
+    print(json.dumps(results))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, nargs="+", default=[50, 100, 200])
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--visits", type=int, default=5000)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return _child(args)
+
+    report = {}
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            env["DB_ASYNC"] = "1" if mode == "async" else "0"
+            cmd = [sys.executable, "-W", "ignore", "-m", "bench.concurrency", "--child",
+                   "--requests", str(args.requests), "--visits", str(args.visits),
+                   "--clients", *map(str, args.clients)]
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                sys.exit(f"{mode} modu başarısız:\n{proc.stderr}")
+            report[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{'mod':<6} {'istemci':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'hata':>6}")
+    for mode, rows in report.items():
+        for r in rows:
+            print(f"{mode:<6} {r['clients']:>8} {r['rps']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['errors']:>6}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+﻿"""
+Sentetik hastane verisi üreteci (deterministik: aynı ölçek + seed -> aynı veri).
+
+İntörnler ve hocalar, bölümler, bölümlere dağılmış yatan hastalar ve
+günlere yayılmış vizit notları yazılır. Notlar Türkçe şablonlardan kurulur;
+işlem işaretleri (ilaç / tetkik / konsültasyon / kritik) metinle tutarlıdır.
+Vizitler sabah ve akşam vizit saatlerinde yoğunlaşır.
+
+Satırlar Core ile toplu yazılır (uç kancaları çalışmaz); ardından yazma
+uçlarının tuttuğu yan yapılar baştan kurulur: günlük özetler, arama indeksi
+ve değişiklik günlüğü.
+
+Kullanım (api/ klasöründen):
+    python -m bench.data --db /tmp/hastane.db --interns 40 --days 30 --visits-per-day 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple
+
+BENCH_PASSWORD = "bench"
+
+DEPARTMENTS = [
+    "DAHILIYE", "GENEL", "KARDIYOLOJI", "NOROLOJI", "GOGUS", "NEFROLOJI",
+    "ENDOKRIN", "ENFEKSIYON", "KBB", "UROLOJI", "ONKOLOJI", "GASTRO",
+]
+FIRST_NAMES = [
+    "Ayşe", "Mehmet", "Zeynep", "Mustafa", "Elif", "Ahmet", "Büşra", "Emre", "Şeyma", "Oğuz",
+    "Gökçe", "Çağrı", "İrem", "Uğur", "Özge", "Barış", "Dilek", "Kağan", "Sıla", "Tuğba",
+]
+LAST_NAMES = [
+    "Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Öztürk", "Aydın", "Özdemir", "Arslan",
+    "Doğan", "Kılıç", "Aslan", "Çetin", "Koç", "Kurt", "Özkan", "Şimşek", "Polat", "Güneş",
+]
+
+# Not parçaları
+COMPLAINTS = [
+    "Genel durum iyi, bilinç açık, koopere.", "Genel durum orta, halsizlik tarifliyor.",
+    "Gece ateşi olmamış, iştahı artmış.", "Nefes darlığı azalmış, oda havasında satürasyon iyi.",
+    "Karın ağrısı geriledi, gaz-gaita çıkışı var.", "Göğüs ağrısı tekrarlamadı.",
+    "Baş dönmesi şikayeti sürüyor.", "Öksürük ve balgam devam ediyor.",
+    "Bulantı-kusma yok, oral alımı iyi.", "İdrar çıkışı yeterli, ödem geriliyor.",
+]
+FINDINGS = [
+    "TA 120/80 mmHg, nabız 78/dk, ateş 36.6 °C.", "TA 145/90 mmHg, nabız 96/dk, ateş 37.4 °C.",
+    "Akciğer seslerinde bazallerde ral mevcut.", "Batın rahat, defans-rebound yok.",
+    "Alt ekstremitede +1 ödem.", "Nörolojik muayene doğal.", "Kalp sesleri ritmik, üfürüm yok.",
+    "Sarılık yok, cilt turgoru normal.", "Satürasyon %94 (2 L/dk nazal kanül).",
+]
+DRUGS = [
+    "Seftriakson 1x2 gr IV başlandı.", "Parasetamol 3x1 gr IV devam.", "İnsülin dozu artırıldı.",
+    "Furosemid 2x20 mg IV eklendi.", "Enoksaparin 1x0.6 ml SC başlandı.", "Antihipertansif doz azaltıldı.",
+]
+TESTS = [
+    "Hemogram ve biyokimya istendi.", "Kan kültürü alındı.", "PA akciğer grafisi istendi.",
+    "Troponin ve D-dimer takibi planlandı.", "Batın USG istendi.", "İdrar tetkiki gönderildi.",
+]
+CONSULTS = [
+    "Kardiyoloji konsültasyonu istendi.", "Nöroloji konsültasyonu planlandı.",
+    "Genel cerrahi konsültasyonu önerildi.", "Enfeksiyon hastalıkları ile görüşüldü.",
+]
+CRITICALS = [
+    "KRİTİK: Potasyum 6.4 mmol/L, hoca bilgilendirildi.", "KRİTİK: Hipotansiyon (80/50), sıvı verildi.",
+    "KRİTİK: Satürasyon %86, oksijen artırıldı.", "KRİTİK: Bilinç bulanıklığı, acil tetkik planlandı.",
+]
+PLANS = ["Takip.", "Mevcut tedaviye devam.", "Yarın kontrol tetkik.", "Taburculuk planlanıyor.", "Yoğun takip."]
+
+FLAG_RATES = {"ops_drug": 0.35, "ops_test": 0.45, "ops_consult": 0.12, "ops_critical": 0.04}
+# Saat ağırlıkları (yerel saat): sabah vizit turu ve akşam kontrolü yoğun
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 6, 14, 16, 12, 8, 5, 4, 6, 7, 6, 5, 4, 3, 2, 2, 1, 1]
+
+
+class Scale(NamedTuple):
+    interns: int = 40
+    supervisors: int = 4
+    departments: int = 6
+    patients: int = 2000
+    days: int = 14
+    visits_per_day: int = 1500
+    start: str = "2025-03-01"
+    seed: int = 42
+
+    @property
+    def visits(self) -> int:
+        return self.days * self.visits_per_day
+
+    def day(self, i: int) -> date:
+        return date.fromisoformat(self.start) + timedelta(days=i)
+
+
+def note(rnd: random.Random, flags: Dict[str, bool]) -> str:
+    parts = [rnd.choice(COMPLAINTS), rnd.choice(FINDINGS)]
+    if flags["ops_critical"]:
+        parts.insert(0, rnd.choice(CRITICALS))
+    if flags["ops_drug"]:
+        parts.append(rnd.choice(DRUGS))
+    if flags["ops_test"]:
+        parts.append(rnd.choice(TESTS))
+    if flags["ops_consult"]:
+        parts.append(rnd.choice(CONSULTS))
+    parts.append(rnd.choice(PLANS))
+    return " ".join(parts)
+
+
+def tc_number(i: int) -> str:
+    """Sentetik 11 haneli T.C. no (geçerlilik algoritması aranmaz; sadece türetme girdisi)."""
+    return f"{10000000000 + i * 7919:011d}"
+
+
+def _name(rnd: random.Random) -> str:
+    return f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+
+
+def generate(engine, scale: Scale, batch: int = 20000, log=None) -> float:
+    """Boş (göçleri uygulanmış) veritabanını ölçeğe göre doldurur; süreyi (sn) döndürür."""
+    from sqlalchemy import select
+    from app import rollups, search
+    from app.main import _derive_patient_id
+    from app.models import ChangeLog, Patient, User, Visit
+    from app.security import hash_password
+
+    rnd = random.Random(scale.seed)
+    deps = DEPARTMENTS[: scale.departments]
+    pw = hash_password(BENCH_PASSWORD)  # bcrypt yavaş: herkes aynı özeti paylaşır
+    t0 = time.perf_counter()
+
+    interns = [f"intern{i:03d}" for i in range(scale.interns)]
+    supervisors = [f"hoca{i:02d}" for i in range(scale.supervisors)]
+    intern_dep = {u: deps[i % len(deps)] for i, u in enumerate(interns)}
+    patient_ids = [_derive_patient_id(tc_number(i)) for i in range(scale.patients)]
+    patient_dep = {p: deps[rnd.randrange(len(deps))] for p in patient_ids}
+
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"username": u, "display_name": f"Dr. {_name(rnd)}", "password_hash": pw, "role": "intern"}
+            for u in interns
+        ] + [
+            {"username": u, "display_name": f"Doç. Dr. {_name(rnd)}", "password_hash": pw, "role": "supervisor"}
+            for u in supervisors
+        ])
+        uid = dict(conn.execute(select(User.username, User.id)).all())
+        admitter = uid[supervisors[0]] if supervisors else None
+        conn.execute(Patient.__table__.insert(), [
+            {"patient_id": p, "label": f"{patient_dep[p].title()} Yatak {i % 40 + 1}", "created_by": admitter}
+            for i, p in enumerate(patient_ids)
+        ])
+
+    by_dep_interns: Dict[str, List[int]] = {d: [] for d in deps}
+    for u, d in intern_dep.items():
+        by_dep_interns[d].append(uid[u])
+    by_dep_patients: Dict[str, List[str]] = {d: [] for d in deps}
+    for p, d in patient_dep.items():
+        by_dep_patients[d].append(p)
+    # Boş kalan bölüm olmasın (az intörn / hasta ölçeklerinde)
+    live_deps = [d for d in deps if by_dep_interns[d] and by_dep_patients[d]] or deps[:1]
+    hours = list(range(24))
+
+    rows: List[Dict] = []
+    written = 0
+
+    def flush():
+        nonlocal rows, written
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(Visit.__table__.insert(), rows)
+            written += len(rows)
+            rows = []
+            if log:
+                log(f"  {written}/{scale.visits} vizit")
+
+    for d in range(scale.days):
+        base = datetime.combine(scale.day(d), datetime.min.time())
+        for _ in range(scale.visits_per_day):
+            dep = rnd.choice(live_deps)
+            flags = {k: rnd.random() < p for k, p in FLAG_RATES.items()}
+            hour = rnd.choices(hours, weights=HOUR_WEIGHTS)[0]
+            rows.append({
+                "patient_id": rnd.choice(by_dep_patients[dep] or patient_ids),
+                "author_id": rnd.choice(by_dep_interns[dep] or [uid[interns[0]]]),
+                "text": note(rnd, flags),
+                "department": dep,
+                "ts": base + timedelta(hours=hour, seconds=rnd.randrange(3600)),
+                **flags,
+            })
+            if len(rows) >= batch:
+                flush()
+    flush()
+
+    # Yan yapılar: yazma uçlarının kendi tuttuğu tablolar baştan kurulur
+    from app.db import SessionLocal
+
+    db = SessionLocal()
+    rollups.rebuild(db)
+    db.commit()
+    db.close()
+    with engine.begin() as conn:
+        search.create_index(conn)
+        now = datetime.utcnow()
+        last = 0
+        while True:
+            part = conn.execute(
+                select(Visit.id, Visit.patient_id, Visit.author_id)
+                .where(Visit.id > last).order_by(Visit.id).limit(batch)
+            ).all()
+            if not part:
+                break
+            conn.execute(ChangeLog.__table__.insert(), [
+                {"visit_id": vid, "patient_id": pid, "op": "upsert", "author_id": aid, "at": now}
+                for vid, pid, aid in part
+            ])
+            last = part[-1][0]
+
+    return time.perf_counter() - t0
+
+
+def describe(engine) -> Dict:
+    """Sürücünün istek üretirken kullandığı özet: kullanıcılar, bölümler, hastalar, günler, örnek vizitler."""
+    from sqlalchemy import distinct, func, select
+    from app.models import Patient, User, Visit
+
+    with engine.connect() as conn:
+        users = conn.execute(select(User.id, User.username, User.role).order_by(User.id)).all()
+        deps = conn.execute(
+            select(Visit.department, func.count()).group_by(Visit.department).order_by(func.count().desc())
+        ).all()
+        days = conn.execute(select(distinct(Visit.day)).order_by(Visit.day)).scalars().all()
+        patients = conn.execute(select(Patient.patient_id).order_by(Patient.id)).scalars().all()
+        # yazma senaryoları için son vizitler (düzenleme/silme yazarı tarafından yapılır)
+        names = {u.id: u.username for u in users}
+        recent = conn.execute(
+            select(Visit.id, Visit.author_id).where(Visit.author_id.isnot(None))
+            .order_by(Visit.id.desc()).limit(20000)
+        ).all()
+    return {
+        "interns": [u.username for u in users if u.role == "intern"],
+        "supervisors": [u.username for u in users if u.role != "intern"],
+        "departments": [d for d, _ in deps],
+        "days": [str(d) for d in days],
+        "patients": patients,
+        "recent_visits": [(vid, names[aid]) for vid, aid in recent if aid in names],
+    }
+
+
+def add_scale_args(ap: argparse.ArgumentParser) -> None:
+    d = Scale()
+    ap.add_argument("--interns", type=int, default=d.interns)
+    ap.add_argument("--supervisors", type=int, default=d.supervisors)
+    ap.add_argument("--departments", type=int, default=d.departments, help=f"en fazla {len(DEPARTMENTS)}")
+    ap.add_argument("--patients", type=int, default=d.patients)
+    ap.add_argument("--days", type=int, default=d.days)
+    ap.add_argument("--visits-per-day", type=int, default=d.visits_per_day)
+    ap.add_argument("--start", default=d.start, help="ilk gün (YYYY-MM-DD)")
+    ap.add_argument("--seed", type=int, default=d.seed)
+
+
+def scale_from_args(args) -> Scale:
+    return Scale(
+        interns=args.interns, supervisors=args.supervisors,
+        departments=min(args.departments, len(DEPARTMENTS)), patients=args.patients,
+        days=args.days, visits_per_day=args.visits_per_day, start=args.start, seed=args.seed,
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", required=True, help="oluşturulacak SQLite dosyası (var olmamalı)")
+    add_scale_args(ap)
+    args = ap.parse_args()
+    if os.path.exists(args.db):
+        sys.exit(f"{args.db} zaten var")
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    from app.db import engine
+    from app.migrations import upgrade
+
+    upgrade(engine)
+    scale = scale_from_args(args)
+    seconds = generate(engine, scale, log=lambda m: print(m, file=sys.stderr, end="\r"))
+    print(file=sys.stderr)
+    info = describe(engine)
+    print(json.dumps({
+        "scale": scale._asdict(), "seconds": round(seconds, 1), "departments": info["departments"],
+        "users": len(info["interns"]) + len(info["supervisors"]), "patients": len(info["patients"]),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
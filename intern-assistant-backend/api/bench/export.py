@@ -0,0 +1,166 @@
+﻿"""
+/exports/visits.csv ve .ndjson için sabit bellek denetimi.
+
+Geçici bir SQLite dosyasına N vizit (varsayılan 1M) yazılır; her biçim ayrı
+bir alt süreçte doğrudan ASGI çağrısıyla baştan sona akıtılır.
+Alt sürecin tepe RSS'i --max-rss-mb sınırını aşarsa komut hata koduyla biter.
+
+Kullanım (api/ klasöründen):
+    python -m bench.export --visits 1000000 --max-rss-mb 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+START = datetime(2025, 1, 1)
+DAYS = 180
+
+
+def seed(n_visits: int, engine=None) -> None:
+    """Boş bir veritabanına kullanıcılar, hastalar ve n_visits vizit yaz (varsayılan: app engine'i)."""
+    from app.migrations import upgrade
+    from app.models import User, Patient, Visit
+
+    if engine is None:
+        from app.db import engine
+    upgrade(engine)
+    rnd = random.Random(9)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"username": f"intern{i}", "display_name": f"İntörn {i}", "password_hash": "-", "role": "intern"}
+            for i in range(50)
+        ] + [{"username": "hoca", "display_name": "Hoca", "password_hash": "-", "role": "supervisor"}])
+        conn.execute(Patient.__table__.insert(), [{"patient_id": f"PX-{i:06d}", "label": ""} for i in range(5000)])
+    done = 0
+    while done < n_visits:
+        n = min(20000, n_visits - done)
+        with engine.begin() as conn:
+            conn.execute(Visit.__table__.insert(), [
+                {
+                    "patient_id": f"PX-{rnd.randrange(5000):06d}",
+                    "author_id": 1 + rnd.randrange(50),
+                    "text": "Genel durum iyi, vital bulgular stabil; \"ateş\" yok, takip.",
+                    "department": rnd.choice(["DAHILIYE", "GENEL", "KARDIYOLOJI"]),
+                    "ops_drug": rnd.random() < 0.3, "ops_test": False, "ops_consult": False,
+                    "ops_critical": rnd.random() < 0.05,
+                    "ts": START + timedelta(seconds=rnd.randrange(DAYS * 86400)),
+                }
+                for _ in range(n)
+            ])
+        done += n
+
+
+def _rss_mb() -> float:
+    # Linux: KB, macOS: bayt
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024
+
+
+async def _export(path: str) -> dict:
+    # httpx.ASGITransport yanıt gövdesini bellekte biriktirir; ölçüm bozulmasın
+    # diye uygulama doğrudan ASGI ile çağrılır ve gövde parçaları sayılıp atılır.
+    from urllib.parse import urlencode
+    from app.main import app
+    from app.security import create_access_token
+
+    token = create_access_token({"sub": "hoca"})
+    params = {"from": START.date().isoformat(), "to": (START + timedelta(days=DAYS)).date().isoformat()}
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": urlencode(params).encode(),
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    out = {"status": None, "size": 0, "lines": 0}
+
+    finished = asyncio.Event()
+    received = []
+
+    async def receive():
+        # İlk çağrı istek gövdesi; sonrakiler (Starlette'in kopma dinleyicisi) yanıt bitene kadar bekler
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            out["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            out["size"] += len(body)
+            out["lines"] += body.count(b"\n")
+
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    await app(scope, receive, send)
+    finished.set()
+    if out["status"] != 200:
+        raise SystemExit(f"{path}: HTTP {out['status']}")
+    return {
+        "path": path,
+        "lines": out["lines"],
+        "mb": round(out["size"] / 1e6, 1),
+        "seconds": round(time.perf_counter() - t0, 1),
+        "rss_before_mb": round(rss_before, 1),
+        "rss_peak_mb": round(_rss_mb(), 1),
+    }
+
+
+def measure(path: str, database_url: str) -> dict:
+    """Bir biçimi ayrı bir alt süreçte baştan sona akıt; satır sayısı ve RSS (önce / tepe) döner."""
+    env = dict(os.environ, DATABASE_URL=database_url, PDF_WORKERS="0")
+    for k in ("READ_DATABASE_URL", "DB_ASYNC", "SLOW_QUERY_MS"):
+        env.pop(k, None)
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", "-m", "bench.export", "--child", path],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{path} başarısız:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--visits", type=int, default=1_000_000)
+    ap.add_argument("--max-rss-mb", type=float, default=200)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(_export(args.child))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.update(DATABASE_URL=url, PDF_WORKERS="0")
+        seed(args.visits)
+        try:
+            results = [measure(path, url) for path in ("/exports/visits.csv", "/exports/visits.ndjson")]
+        except RuntimeError as e:
+            sys.exit(str(e))
+
+    print(f"{'uç':<24} {'satır':>9} {'MB':>7} {'sn':>6} {'RSS önce':>9} {'RSS tepe':>9}")
+    for r in results:
+        print(f"{r['path']:<24} {r['lines']:>9} {r['mb']:>7} {r['seconds']:>6} "
+              f"{r['rss_before_mb']:>9} {r['rss_peak_mb']:>9}")
+    print(json.dumps(results, indent=2))
+
+    bad = [r for r in results if r["rss_peak_mb"] > args.max_rss_mb or r["lines"] < args.visits]
+    if bad:
+        sys.exit(f"Sınır aşıldı / eksik satır (RSS <= {args.max_rss_mb} MB, satır >= {args.visits}): {bad}")
+    print(f"OK: tepe RSS <= {args.max_rss_mb} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+﻿"""
+Akış / vizit listesi serileştirmesi için satır başına maliyet (mikro benchmark).
+
+/visits/by-department ve /patients/{id}/visits satırları iki yoldan üretilir:
+- önce: db.query(Visit) (ORM nesnesi) -> dict (isoformat) -> jsonable_encoder -> JSONResponse
+- sonra: sadece gereken kolonlar (düz satır) -> dict -> FastJSONResponse (orjson varsa)
+Sorgu + dict kurma + JSON gövdesi birlikte ölçülür; iki yolun gövdeleri bayt
+bayt karşılaştırılır. Sonuç satır başına µs (tekrarların en iyisi).
+
+Kullanım (api/ klasöründen):
+    python -m bench.feed --visits-per-day 20000 --repeat 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+
+def _old_feed(db, Visit, start, end) -> List[Dict]:
+    # önceki _feed_item: ORM satırı, tarih alanları burada stringe çevrilir
+    rows = db.query(Visit).filter(Visit.ts >= start, Visit.ts < end).order_by(Visit.ts.desc(), Visit.id.desc()).all()
+    return [
+        {
+            "id": r.id,
+            "patient_id": r.patient_id,
+            "ts": r.ts.isoformat(),
+            "text": r.text,
+            "department": r.department,
+            "edited_at": r.edited_at.isoformat() if r.edited_at else None,
+            "ops": {
+                "drug": bool(r.ops_drug),
+                "test": bool(r.ops_test),
+                "consult": bool(r.ops_consult),
+                "critical": bool(r.ops_critical),
+            },
+        }
+        for r in rows
+    ]
+
+
+def _old_visits(db, Visit, start, end, users) -> List[Dict]:
+    rows = db.query(Visit).filter(Visit.ts >= start, Visit.ts < end).order_by(Visit.ts.asc()).all()
+    return [
+        {
+            "id": r.id,
+            "ts": r.ts.isoformat(),
+            "author": users.get(r.author_id, "?"),
+            "text": r.text,
+            "department": r.department,
+            "edited_at": r.edited_at.isoformat() if r.edited_at else None,
+            "ops": {
+                "drug": bool(r.ops_drug),
+                "test": bool(r.ops_test),
+                "consult": bool(r.ops_consult),
+                "critical": bool(r.ops_critical),
+            },
+        }
+        for r in rows
+    ]
+
+
+def _new_visits(db, Visit, start, end, users) -> List[Dict]:
+    # patient_visits ile aynı projeksiyon
+    rows = db.query(
+        Visit.id, Visit.ts, Visit.author_id, Visit.text, Visit.department, Visit.edited_at,
+        Visit.ops_drug, Visit.ops_test, Visit.ops_consult, Visit.ops_critical,
+    ).filter(Visit.ts >= start, Visit.ts < end).order_by(Visit.ts.asc()).all()
+    return [
+        {
+            "id": r.id,
+            "ts": r.ts,
+            "author": users.get(r.author_id, "?"),
+            "text": r.text,
+            "department": r.department,
+            "edited_at": r.edited_at,
+            "ops": {
+                "drug": bool(r.ops_drug),
+                "test": bool(r.ops_test),
+                "consult": bool(r.ops_consult),
+                "critical": bool(r.ops_critical),
+            },
+        }
+        for r in rows
+    ]
+
+
+def _best(fn: Callable[[], bytes], repeat: int):
+    best, body = None, b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, body
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--visits-per-day", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ.pop("READ_DATABASE_URL", None)
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse
+        from app.db import SessionLocal, engine
+        from app.directory import user_directory
+        from app.main import HAVE_ORJSON, FastJSONResponse, _feed_columns, _feed_item, ist_day_range
+        from app.migrations import upgrade
+        from app.models import Visit
+        from bench.data import Scale, generate
+
+        upgrade(engine)
+        scale = Scale(days=1, visits_per_day=args.visits_per_day)
+        generate(engine, scale)
+        start, end = ist_day_range(scale.start)
+
+        db = SessionLocal()
+        try:
+            users = user_directory.names(db)
+
+            def old_feed() -> bytes:
+                db.expire_all()
+                return JSONResponse(jsonable_encoder({"items": _old_feed(db, Visit, start, end)})).body
+
+            def new_feed() -> bytes:
+                rows = (
+                    db.query(*_feed_columns()).filter(Visit.ts >= start, Visit.ts < end)
+                    .order_by(Visit.ts.desc(), Visit.id.desc()).all()
+                )
+                return FastJSONResponse({"items": [_feed_item(r) for r in rows]}).body
+
+            def old_visits() -> bytes:
+                db.expire_all()
+                return JSONResponse(jsonable_encoder({"visits": _old_visits(db, Visit, start, end, users)})).body
+
+            def new_visits() -> bytes:
+                return FastJSONResponse({"visits": _new_visits(db, Visit, start, end, users)}).body
+
+            results = []
+            for name, old, new in (("by-department", old_feed, new_feed), ("patient-visits", old_visits, new_visits)):
+                t_old, b_old = _best(old, args.repeat)
+                t_new, b_new = _best(new, args.repeat)
+                if b_old != b_new:
+                    raise SystemExit(f"{name}: gövdeler farklı")
+                n = args.visits_per_day
+                results.append({
+                    "path": name,
+                    "rows": n,
+                    "before_us_per_row": round(t_old / n * 1e6, 2),
+                    "after_us_per_row": round(t_new / n * 1e6, 2),
+                    "speedup": round(t_old / t_new, 2),
+                })
+        finally:
+            db.close()
+            engine.dispose()
+
+    print(f"orjson: {'var' if HAVE_ORJSON else 'yok (json)'}")
+    print(f"{'yol':<16} {'satır':>7} {'önce µs':>9} {'sonra µs':>9} {'hız':>6}")
+    for r in results:
+        print(f"{r['path']:<16} {r['rows']:>7} {r['before_us_per_row']:>9} {r['after_us_per_row']:>9} {r['speedup']:>5}x")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+﻿"""
+Tüm uçlar için tekrarlanabilir benchmark (bench.data üreteciyle doldurulan veri üzerinde).
+
+Her senaryo, her eşzamanlılık düzeyinde ağ olmadan ASGI üzerinden
+(httpx.ASGITransport) çalıştırılır; p50/p95/p99 gecikme, istek/sn, hata sayısı ve
+istek başına SQL ifadesi sayısı (app.metrics.capture_sql) ölçülür. Önce okuma
+senaryoları, sonra yazma senaryoları çalışır. /events (SSE) uzun ömürlü
+bağlantı olduğundan ölçülmez.
+
+Sonuçlar JSON olarak saklanır (varsayılan bench/results/); --compare ile
+önceki bir koşuya göre p95 oranları yazdırılır. Sync/async karşılaştırması için
+aynı komut DB_ASYNC=1 ile tekrar çalıştırılır.
+
+Kullanım (api/ klasöründen):
+    python -m bench.suite --days 14 --visits-per-day 1500 --concurrency 1 8 32 --requests 200
+    python -m bench.suite --only reports dashboard --compare bench/results/onceki.json
+    python -m bench.suite --db /tmp/hastane.db   # bench.data ile üretilmiş dosyanın kopyası üzerinde
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from bench.data import BENCH_PASSWORD, add_scale_args, scale_from_args, tc_number
+
+SEARCH_QUERIES = ["ilaç", "kültür", "troponin", "kardiyoloji konsültasyonu", "ödem", "KRİTİK potasyum", "satürasyon"]
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # i (senaryo içi sıra no) -> (path, httpx istek argümanları)
+    request: Callable[[int], Tuple[str, Dict]]
+    write: bool = False
+
+
+def _scenarios(info: Dict, tokens: Dict[str, str], cursor: int) -> List[Scenario]:
+    days, deps, pids = info["days"], info["departments"], info["patients"]
+    interns, hoca = info["interns"], info["supervisors"][0]
+    recent = info["recent_visits"]
+    half = len(recent) // 2
+
+    def auth(user: str) -> Dict:
+        return {"Authorization": f"Bearer {tokens[user]}"}
+
+    def day(i):
+        return days[i % len(days)]
+
+    def dep(i):
+        return deps[i % len(deps)]
+
+    def intern(i):
+        return interns[i % len(interns)]
+
+    def visit_body(i):
+        return {
+            "patient_id": pids[i % len(pids)],
+            "text": "Benchmark vizit notu: genel durum iyi, takip.",
+            "department": dep(i),
+            "ops_drug": i % 3 == 0,
+            "ops_test": i % 2 == 0,
+        }
+
+    def week(i):
+        start = date.fromisoformat(day(i))
+        return {"from": start.isoformat(), "to": (start + timedelta(days=6)).isoformat()}
+
+    reads = [
+        Scenario("health", "GET", lambda i: ("/", {})),
+        Scenario("auth.login", "POST", lambda i: ("/auth/login", {
+            "data": {"username": intern(i), "password": BENCH_PASSWORD},
+        })),
+        Scenario("patients.derive", "POST", lambda i: ("/patients/derive", {
+            "json": {"tc": tc_number(i)}, "headers": auth(intern(i)),
+        })),
+        Scenario("patients.list", "GET", lambda i: ("/patients/list", {
+            "params": {"day": day(i), "department": dep(i)}, "headers": auth(intern(i)),
+        })),
+        Scenario("patients.visits", "GET", lambda i: (f"/patients/{pids[i % len(pids)]}/visits", {
+            "headers": auth(hoca),
+        })),
+        Scenario("reports.daily", "GET", lambda i: ("/reports/daily", {
+            "params": {"day": day(i), "department": ["ALL", dep(i)][i % 2]}, "headers": auth(hoca),
+        })),
+        Scenario("reports.range", "GET", lambda i: ("/reports/range", {
+            "params": {**week(i), "department": ["ALL", dep(i)][i % 2]}, "headers": auth(hoca),
+        })),
+        Scenario("visits.by_department", "GET", lambda i: ("/visits/by_department", {
+            "params": {"day": day(i), "department": dep(i), "limit": 100}, "headers": auth(hoca),
+        })),
+        Scenario("visits.search", "GET", lambda i: ("/visits/search", {
+            "params": {"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)], "limit": 50}, "headers": auth(hoca),
+        })),
+        Scenario("dashboard", "GET", lambda i: ("/dashboard", {
+            "params": {"day": day(i), "department": dep(i)}, "headers": auth(hoca),
+        })),
+        Scenario("sync", "GET", lambda i: ("/sync", {
+            "params": {"since": max(0, cursor - 500), "limit": 500}, "headers": auth(intern(i)),
+        })),
+        Scenario("exports.csv", "GET", lambda i: ("/exports/visits.csv", {
+            "params": {"from": day(i), "to": day(i), "department": dep(i)}, "headers": auth(hoca),
+        })),
+        Scenario("exports.ndjson", "GET", lambda i: ("/exports/visits.ndjson", {
+            "params": {"from": day(i), "to": day(i), "department": dep(i)}, "headers": auth(hoca),
+        })),
+        Scenario("reports.daily_pdf", "GET", lambda i: ("/reports/daily_pdf", {
+            "params": {"day": day(i), "department": dep(i)}, "headers": auth(hoca),
+        })),
+        Scenario("ai.rollup_pdf", "GET", lambda i: ("/ai/rollup.pdf", {
+            "params": {"day": day(i), "department": "ALL"}, "headers": auth(hoca),
+        })),
+    ]
+    writes = [
+        Scenario("patients.create", "POST", lambda i: ("/patients", {
+            "json": {"patient_id": f"PX-bench{i:06d}", "label": "Benchmark"}, "headers": auth(intern(i)),
+        }), write=True),
+        Scenario("patients.bulk", "POST", lambda i: ("/patients/bulk", {
+            "json": {"items": [{"tc": tc_number(10_000_000 + i * 10 + k), "label": "Toplu"} for k in range(10)]},
+            "headers": auth(intern(i)),
+        }), write=True),
+        Scenario("visits.create", "POST", lambda i: ("/visits", {
+            "json": visit_body(i), "headers": auth(intern(i)),
+        }), write=True),
+        Scenario("visits.bulk", "POST", lambda i: ("/visits/bulk", {
+            "json": {"items": [visit_body(i * 20 + k) for k in range(20)]}, "headers": auth(intern(i)),
+        }), write=True),
+        # Düzenleme / silme: son vizitlerin iki ayrı yarısı, her biri kendi yazarıyla
+        Scenario("visits.update", "PUT", lambda i: (f"/visits/{recent[i % half][0]}", {
+            "json": {"text": f"Düzenlendi ({i}).", "ops_critical": i % 7 == 0},
+            "headers": auth(recent[i % half][1]),
+        }), write=True),
+        Scenario("visits.delete", "DELETE", lambda i: (f"/visits/{recent[half + i % half][0]}", {
+            "headers": auth(recent[half + i % half][1]),
+        }), write=True),
+    ]
+    return reads + writes
+
+
+async def _drive(client, sc: Scenario, concurrency: int, requests: int, offset: int) -> Dict:
+    from app.metrics import capture_sql
+
+    lat: List[float] = []
+    errors: List[str] = []
+    nxt = [0]
+
+    async def worker():
+        while nxt[0] < requests:
+            i = nxt[0]
+            nxt[0] += 1
+            path, kw = sc.request(offset + i)
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(sc.method, path, **kw)
+                if r.status_code >= 400:
+                    errors.append(f"{r.status_code} {r.text[:120]}")
+            except Exception as e:
+                errors.append(repr(e)[:120])
+            lat.append(time.perf_counter() - t0)
+
+    with capture_sql() as sql:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+    q = statistics.quantiles(lat, n=100) if len(lat) > 1 else lat * 99
+    return {
+        "scenario": sc.name,
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "rps": round(len(lat) / wall, 1),
+        "p50_ms": round(q[49] * 1000, 2),
+        "p95_ms": round(q[94] * 1000, 2),
+        "p99_ms": round(q[98] * 1000, 2),
+        "sql_per_request": round(sql.count / max(len(lat), 1), 2),
+    }
+
+
+async def _run(args, info: Dict) -> List[Dict]:
+    import httpx
+    from app import changes
+    from app.db import SessionLocal
+    from app.main import app
+    from app.security import create_access_token
+
+    db = SessionLocal()
+    cursor = changes.current_cursor(db)
+    db.close()
+    users = info["interns"] + info["supervisors"]
+    tokens = {u: create_access_token({"sub": u}) for u in users}
+    scenarios = [
+        s for s in _scenarios(info, tokens, cursor)
+        if not args.only or any(s.name.startswith(p) for p in args.only)
+    ]
+    if args.skip_writes:
+        scenarios = [s for s in scenarios if not s.write]
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for sc in scenarios:
+            offset = 0  # yazma senaryoları düzeyler arasında aynı kaydı tekrar kullanmasın
+            for c in args.concurrency:
+                r = await _drive(client, sc, c, args.requests, offset)
+                offset += args.requests
+                results.append(r)
+                print(f"  {sc.name:<22} c={c:<4} p95 {r['p95_ms']:>9} ms  hata {r['errors']}", file=sys.stderr)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _compare(results: List[Dict], old_path: str) -> None:
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\n{old_path} ile karşılaştırma (oran = yeni / eski; <1 daha hızlı)")
+    print(f"{'senaryo':<22} {'c':>4} {'p95 eski':>10} {'p95 yeni':>10} {'oran':>6} {'sql eski':>9} {'sql yeni':>9}")
+    for r in results:
+        o = old.get((r["scenario"], r["concurrency"]))
+        if not o:
+            continue
+        ratio = round(r["p95_ms"] / o["p95_ms"], 2) if o["p95_ms"] else None
+        print(f"{r['scenario']:<22} {r['concurrency']:>4} {o['p95_ms']:>10} {r['p95_ms']:>10} {ratio!s:>6} "
+              f"{o['sql_per_request']:>9} {r['sql_per_request']:>9}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_args(ap)
+    ap.add_argument("--db", help="bench.data ile üretilmiş SQLite dosyası (kopyası kullanılır; verilmezse üretilir)")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--requests", type=int, default=200, help="senaryo ve düzey başına istek")
+    ap.add_argument("--only", nargs="+", help="sadece bu önekle başlayan senaryolar (ör. reports visits.)")
+    ap.add_argument("--skip-writes", action="store_true")
+    ap.add_argument("--out", help="sonuç JSON dosyası (varsayılan bench/results/suite-<zaman>.json)")
+    ap.add_argument("--compare", help="karşılaştırılacak önceki sonuç JSON dosyası")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        if args.db:
+            shutil.copyfile(args.db, path)
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        os.environ.pop("READ_DATABASE_URL", None)
+        from app.db import DB_ASYNC, engine
+        from app.migrations import upgrade
+        from bench.data import describe, generate
+
+        upgrade(engine)
+        scale = scale_from_args(args)
+        seed_s = None
+        if not args.db:
+            seed_s = round(generate(engine, scale), 1)
+        info = describe(engine)
+        results = asyncio.run(_run(args, info))
+
+    report = {
+        "meta": {
+            "at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db_async": DB_ASYNC,
+            "db": args.db or "generated",
+            "scale": None if args.db else scale._asdict(),
+            "seed_s": seed_s,
+            "visits_days": len(info["days"]),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        f"suite-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}{'-async' if DB_ASYNC else ''}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{'senaryo':<22} {'c':>4} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql/istek':>9} {'hata':>5}")
+    for r in results:
+        print(f"{r['scenario']:<22} {r['concurrency']:>4} {r['rps']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+              f"{r['p99_ms']:>9} {r['sql_per_request']:>9} {r['errors']:>5}")
+    if args.compare:
+        _compare(results, args.compare)
+    print(f"\nsonuçlar: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+﻿"""
+Test ortamı: geçici bir SQLite dosyası, bench.data ile üretilmiş küçük ölçekli
+deterministik veri ve uygulama üzerinde TestClient.
+
+Ayarlar modül yüklenirken okunduğundan ortam değişkenleri app import
+edilmeden önce burada verilir. Veri oturum başına bir kez üretilir; yazan
+testler sadece bugüne (üretilen günlerden bağımsız) yazar.
+
+Çalıştırma (api/ klasöründen):
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+
+Postgres'e özgü testler (eşzamanlı yazıcılar) sadece boş bir test veritabanı
+verilirse çalışır: TEST_POSTGRES_URL=postgresql://... python -m pytest -q
+"""
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+_TMP = tempfile.mkdtemp(prefix="ia-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["DB_ASYNC"] = "0"
+os.environ["PDF_WORKERS"] = "0"
+os.environ["PDF_PRERENDER_DIR"] = os.path.join(_TMP, "pdf_prerender")
+for _k in ("READ_DATABASE_URL", "PDF_PRERENDER_AT", "SLOW_QUERY_MS", "ARCHIVE_AFTER_DAYS"):
+    os.environ.pop(_k, None)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.db import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrations import upgrade  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+from bench.data import Scale, describe, generate  # noqa: E402
+
+SCALE = Scale(interns=8, supervisors=2, departments=3, patients=120, days=3, visits_per_day=300, start="2025-03-01")
+
+
+def local_today() -> str:
+    """Vizitlerin yazıldığı yerel (UTC+3) gün."""
+    return (datetime.utcnow() + timedelta(hours=3)).date().isoformat()
+
+
+@pytest.fixture(scope="session")
+def info():
+    upgrade(engine)
+    generate(engine, SCALE)
+    yield describe(engine)
+    engine.dispose()
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client(info):
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def auth():
+    # kullanıcı başına tek token: kimlik önbelleği (principal_cache) ısınmış kalır
+    tokens = {}
+
+    def headers(username: str):
+        if username not in tokens:
+            tokens[username] = create_access_token({"sub": username})
+        return {"Authorization": f"Bearer {tokens[username]}"}
+    return headers
+
+
+@pytest.fixture
+def db(info):
+    s = SessionLocal()
+    try:
+        yield s
+    finally:
+        s.close()
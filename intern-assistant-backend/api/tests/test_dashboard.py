@@ -0,0 +1,67 @@
+﻿"""
+/dashboard: her bölüm, aynı parametrelerle ayrı uçların yanıtıyla birebir aynı
+olmalı (report = /reports/daily, feed = /visits/by_department,
+patients = /patients/list).
+"""
+import pytest
+
+from conftest import SCALE
+
+SECTIONS = {
+    "report": "/reports/daily",
+    "feed": "/visits/by_department",
+    "patients": "/patients/list",
+}
+
+
+def _get(client, headers, path, params):
+    r = client.get(path, params=params, headers=headers)
+    assert r.status_code == 200, (path, r.text)
+    return r.json()
+
+
+def _cases(info):
+    hoca, interns = info["supervisors"][0], info["interns"][:2]
+    days = [SCALE.day(i).isoformat() for i in range(SCALE.days)] + ["2025-02-01"]
+    for day in days:
+        for dep in ("ALL", info["departments"][0]):
+            for user in (hoca, *interns):
+                yield user, {"day": day, "department": dep}
+            # author: rapor ve akış süzülür, hasta listesi süzülmez
+            yield hoca, {"day": day, "department": dep, "author": interns[0]}
+            yield interns[0], {"day": day, "department": dep, "author": interns[1]}  # intern'de yok sayılır
+
+
+@pytest.mark.parametrize("limit", [7, 2000])
+def test_dashboard_sections_match_standalone_endpoints(client, auth, info, limit):
+    checked = 0
+    for user, params in _cases(info):
+        h = auth(user)
+        dash = _get(client, h, "/dashboard", {**params, "limit": limit})
+        assert set(dash) == set(SECTIONS)
+        for section, path in SECTIONS.items():
+            p = dict(params)
+            if path == "/visits/by_department":
+                p["limit"] = limit
+            if path == "/patients/list":
+                p.pop("author", None)
+            assert dash[section] == _get(client, h, path, p), (user, params, section)
+        checked += 1
+    assert checked >= 30
+
+
+def test_dashboard_feed_cursor_continues_on_standalone_feed(client, auth, info):
+    """Dashboard'un next_cursor'ı /visits/by_department'ta kaldığı yerden devam eder."""
+    hoca = info["supervisors"][0]
+    params = {"day": SCALE.day(0).isoformat(), "department": "ALL"}
+    dash = _get(client, auth(hoca), "/dashboard", {**params, "limit": 10})
+    cursor = dash["feed"]["next_cursor"]
+    assert cursor
+    rest = _get(client, auth(hoca), "/visits/by_department", {**params, "limit": 10, "cursor": cursor})
+    full = _get(client, auth(hoca), "/visits/by_department", {**params, "limit": 20})
+
+    def ids(feed):
+        return sorted((it["id"] for items in feed["by_author"].values() for it in items), reverse=True)
+
+    assert sorted(ids(dash["feed"]) + ids(rest), reverse=True) == sorted(ids(full), reverse=True)
+    assert not set(ids(dash["feed"])) & set(ids(rest))
@@ -0,0 +1,136 @@
+﻿"""
+Koşullu GET (ETag / If-None-Match): yazımdan sonra eski ETag'e 304 verilmemeli;
+veri değişmedikçe ETag süreçten bağımsız aynı kalmalı.
+"""
+import pytest
+
+from app.directory import user_directory
+from app.models import User
+
+from conftest import local_today
+
+DEP = "TEST_ETAG"
+PID = "PX-etagtest"
+
+
+@pytest.fixture
+def urls(client, auth, info):
+    intern = info["interns"][2]
+    r = client.post("/patients", json={"patient_id": PID, "label": "ETag Yatak 1"}, headers=auth(intern))
+    assert r.status_code == 200, r.text
+    day = local_today()
+    return intern, info["supervisors"][0], [
+        ("/reports/daily", {"day": day, "department": DEP}),
+        ("/patients/list", {"day": day, "department": DEP}),
+        ("/visits/by_department", {"day": day, "department": DEP}),
+        ("/dashboard", {"day": day, "department": DEP}),
+        (f"/patients/{PID}/visits", {"day": day}),
+    ]
+
+
+def _get(client, headers, path, params, etag=None):
+    h = dict(headers)
+    if etag:
+        h["If-None-Match"] = etag
+    r = client.get(path, params=params, headers=h)
+    assert r.status_code in (200, 304), (path, r.text)
+    return r
+
+
+def _snapshot(client, headers, urls):
+    out = {}
+    for path, params in urls:
+        r = _get(client, headers, path, params)
+        assert r.status_code == 200 and r.headers["etag"]
+        assert _get(client, headers, path, params, r.headers["etag"]).status_code == 304
+        out[path] = (r.headers["etag"], r.json())
+    return out
+
+
+def _assert_all_stale(client, headers, urls, before):
+    """Eski ETag ile her uç 200 + yeni ETag dönmeli; yeni ETag ile 304."""
+    after = {}
+    for path, params in urls:
+        old_etag = before[path][0]
+        r = _get(client, headers, path, params, old_etag)
+        assert r.status_code == 200, path
+        assert r.headers["etag"] != old_etag, path
+        assert _get(client, headers, path, params, r.headers["etag"]).status_code == 304, path
+        after[path] = (r.headers["etag"], r.json())
+    return after
+
+
+def test_create_edit_delete_invalidate(client, auth, urls):
+    intern, hoca, endpoints = urls
+    snap = {u: _snapshot(client, auth(u), endpoints) for u in (hoca, intern)}
+
+    # ekleme
+    r = client.post("/visits", json={"patient_id": PID, "text": "İlk not.", "department": DEP}, headers=auth(intern))
+    assert r.status_code == 200, r.text
+    vid = r.json()["id"]
+    for u in (hoca, intern):
+        snap[u] = _assert_all_stale(client, auth(u), endpoints, snap[u])
+    assert [v["id"] for v in snap[hoca][f"/patients/{PID}/visits"][1]["visits"]] == [vid]
+
+    # sadece işaret düzenlemesi (metin aynı)
+    critical = snap[hoca]["/reports/daily"][1]["totals"]["critical"]
+    r = client.put(f"/visits/{vid}", json={"ops_critical": True}, headers=auth(intern))
+    assert r.status_code == 200, r.text
+    for u in (hoca, intern):
+        snap[u] = _assert_all_stale(client, auth(u), endpoints, snap[u])
+    assert snap[hoca]["/reports/daily"][1]["totals"]["critical"] == critical + 1
+    assert snap[hoca][f"/patients/{PID}/visits"][1]["visits"][0]["ops"]["critical"] is True
+
+    # sadece metin düzenlemesi
+    r = client.put(f"/visits/{vid}", json={"text": "Düzeltilmiş not."}, headers=auth(intern))
+    assert r.status_code == 200, r.text
+    snap[hoca] = _assert_all_stale(client, auth(hoca), endpoints, snap[hoca])
+    assert snap[hoca][f"/patients/{PID}/visits"][1]["visits"][0]["text"] == "Düzeltilmiş not."
+
+    # silme
+    r = client.delete(f"/visits/{vid}", headers=auth(intern))
+    assert r.status_code == 200, r.text
+    for u in (hoca, intern):
+        snap[u] = _assert_all_stale(client, auth(u), endpoints, snap[u])
+    assert snap[hoca][f"/patients/{PID}/visits"][1]["visits"] == []
+
+
+def test_user_directory_change_invalidates(client, auth, urls, db):
+    intern, hoca, endpoints = urls
+    r = client.post("/visits", json={"patient_id": PID, "text": "Ad testi.", "department": DEP}, headers=auth(intern))
+    assert r.status_code == 200, r.text
+    before = _snapshot(client, auth(hoca), endpoints)
+
+    user = db.query(User).filter(User.username == intern).one()
+    old_name = user.display_name
+    user.display_name = "Dr. Yeni Ad"
+    db.commit()  # sadece users tablosu değişir; vizit / gün sürümü aynı
+    try:
+        after = _assert_all_stale(client, auth(hoca), endpoints, before)
+        visits = after[f"/patients/{PID}/visits"][1]["visits"]
+        assert {v["author"] for v in visits} == {"Dr. Yeni Ad"}
+        assert "Dr. Yeni Ad" in after["/reports/daily"][1]["by_author"]
+    finally:
+        user.display_name = old_name
+        db.commit()
+
+
+def test_etag_is_stable_across_workers(client, auth, urls):
+    """Yeni bir worker (boş kullanıcı dizini) aynı veri için aynı ETag'i üretmeli."""
+    intern, hoca, endpoints = urls
+    before = _snapshot(client, auth(hoca), endpoints)
+    user_directory.invalidate()
+    for path, params in endpoints:
+        r = _get(client, auth(hoca), path, params, before[path][0])
+        assert r.status_code == 304, path
+        assert r.headers["etag"] == before[path][0]
+
+
+def test_etag_is_scoped_per_role(client, auth, urls):
+    intern, hoca, endpoints = urls
+    path, params = endpoints[0]
+    h = _get(client, auth(hoca), path, params)
+    i = _get(client, auth(intern), path, params)
+    assert h.headers["etag"] != i.headers["etag"]
+    # intern, hocanın önbellekteki yanıtını 304 ile kullanamaz
+    assert _get(client, auth(intern), path, params, h.headers["etag"]).status_code == 200
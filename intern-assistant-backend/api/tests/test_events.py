@@ -0,0 +1,201 @@
+﻿"""
+SSE yayıncısı: birden çok abonede rol / bölüm / gün kapsamı, Last-Event-ID
+ile tekrar, yavaş ve kopmuş abonelerin diğerlerini bekletmemesi.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from app import events
+from app.events import Broadcaster, visit_event
+from app.models import Visit
+
+from conftest import local_today
+
+DAYS = ["2025-03-01", "2025-03-02"]
+DEPS = ["KARDIYOLOJI", "GENEL", "DAHILIYE"]
+AUTHORS = [1, 2, 3]
+
+
+def _events():
+    out, vid = [], 0
+    for day in DAYS:
+        for dep in DEPS:
+            for aid in AUTHORS:
+                vid += 1
+                v = Visit(id=vid, ts=datetime.fromisoformat(f"{day}T09:30:00"), department=dep, author_id=aid)
+                out.append(visit_event("created", v, f"Dr. {aid}"))
+    return out
+
+
+def _drain(sub):
+    got = []
+    while not sub.queue.empty():
+        got.append(sub.queue.get_nowait())
+    return got
+
+
+async def _settle():
+    # call_soon_threadsafe ile kuyruğa konan teslimler çalışsın
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_each_subscriber_gets_only_its_scope():
+    b = Broadcaster()
+    specs = {
+        "intern1": (1, "intern", None, None),
+        "intern2_genel": (2, "intern", "GENEL", None),
+        "hoca": (10, "supervisor", None, None),
+        "hoca_kardiyo": (10, "supervisor", "KARDIYOLOJI", None),
+        "admin_gun2": (11, "admin", None, "2025-03-02"),
+        "hoca_dahiliye_gun1": (12, "supervisor", "DAHILIYE", "2025-03-01"),
+    }
+
+    def wanted(name, ev):
+        uid, role, dep, day = specs[name]
+        return (
+            (role != "intern" or ev["author_id"] == uid)
+            and (dep is None or ev["department"] == dep)
+            and (day is None or ev["day"] == day)
+        )
+
+    async def main():
+        subs = {name: b.subscribe(*spec) for name, spec in specs.items()}
+        # yazma uçları gibi başka bir thread'den yayınla
+        published = await asyncio.to_thread(lambda: [b.publish(ev) for ev in _events()])
+        await _settle()
+        return published, {name: _drain(s) for name, s in subs.items()}
+
+    published, got = asyncio.run(main())
+    assert len(published) == len(DAYS) * len(DEPS) * len(AUTHORS)
+    for name in specs:
+        assert got[name] == [ev for ev in published if wanted(name, ev)], name
+    assert len(got["hoca"]) == len(published)
+    assert {ev["author_id"] for ev in got["intern1"]} == {1}
+    assert got["intern2_genel"] and all(ev["department"] == "GENEL" for ev in got["intern2_genel"])
+
+
+def test_replay_after_last_event_id_is_scoped():
+    b = Broadcaster()
+    published = [b.publish(ev) for ev in _events()]
+    cut = published[5]["seq"]
+
+    async def main():
+        intern = b.subscribe(2, "intern", last_event_id=cut)
+        hoca = b.subscribe(10, "supervisor", department="GENEL", last_event_id=cut)
+        fresh = b.subscribe(10, "supervisor")  # Last-Event-ID yok: tekrar yok
+        return _drain(intern), _drain(hoca), _drain(fresh)
+
+    intern, hoca, fresh = asyncio.run(main())
+    assert intern == [ev for ev in published if ev["seq"] > cut and ev["author_id"] == 2]
+    assert hoca == [ev for ev in published if ev["seq"] > cut and ev["department"] == "GENEL"]
+    assert fresh == []
+
+
+def test_slow_subscriber_does_not_block_others(monkeypatch):
+    b = Broadcaster()
+    evs = _events()
+
+    async def main():
+        fast = b.subscribe(11, "admin")
+        monkeypatch.setattr(events, "QUEUE_MAX", 3)
+        slow = b.subscribe(10, "supervisor")  # hiç okumuyor, kuyruğu 3
+        received = []
+
+        async def consume():
+            while len(received) < len(evs):
+                received.append(await fast.queue.get())
+
+        task = asyncio.create_task(consume())
+
+        def publish_all():
+            t0 = time.perf_counter()
+            for ev in evs:
+                b.publish(ev)
+            return time.perf_counter() - t0
+
+        elapsed = await asyncio.to_thread(publish_all)
+        await asyncio.wait_for(task, timeout=5)
+        return slow, received, elapsed
+
+    slow, received, elapsed = asyncio.run(main())
+    assert [ev["visit_id"] for ev in received] == [ev["visit_id"] for ev in evs]
+    assert slow.overflow  # akış bir sonraki turda `event: resync` gönderir
+    assert slow.queue.qsize() == 3  # fazlası bu abone için düşürüldü
+    assert b.subscriber_count() == 2  # taşan abone bağlı kalır, sadece tam yenileme ister
+    assert elapsed < 1
+
+
+def test_disconnected_subscriber_is_dropped():
+    b = Broadcaster()
+
+    # bağlantısı kopmuş abone: event loop'u kapanmış
+    gone_loop = asyncio.new_event_loop()
+
+    async def _sub():
+        return b.subscribe(10, "supervisor")
+
+    gone = gone_loop.run_until_complete(_sub())
+    gone_loop.close()
+
+    async def main():
+        live = b.subscribe(11, "admin")
+        assert b.subscriber_count() == 2
+        ev = await asyncio.to_thread(b.publish, _events()[0])
+        await _settle()
+        return live, ev
+
+    live, ev = asyncio.run(main())
+    assert b.subscriber_count() == 1
+    assert _drain(live) == [ev]
+    assert gone.queue.empty()
+
+
+def test_write_endpoints_publish_to_scoped_subscribers(client, auth, info, db):
+    """Uçtan uca: POST /visits commit'ten sonra yayınlar; abone kendi event loop'unda alır."""
+    from app.events import broadcaster
+    from app.models import User
+
+    intern, other, hoca = info["interns"][0], info["interns"][1], info["supervisors"][0]
+    ids = dict(db.query(User.username, User.id).filter(User.username.in_([intern, other, hoca])).all())
+    pid = info["patients"][0]
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def _sub(*args, **kw):
+        return broadcaster.subscribe(*args, **kw)
+
+    def sub(*args, **kw):
+        return asyncio.run_coroutine_threadsafe(_sub(*args, **kw), loop).result()
+
+    async def _collect(s):
+        await _settle()
+        return _drain(s)
+
+    subs = {
+        "own": sub(ids[intern], "intern"),
+        "other": sub(ids[other], "intern"),
+        "dep": sub(ids[hoca], "supervisor", department="TEST_SSE", day=local_today()),
+        "other_dep": sub(ids[hoca], "supervisor", department="GENEL"),
+    }
+    try:
+        r = client.post(
+            "/visits", json={"patient_id": pid, "text": "SSE denemesi.", "department": "TEST_SSE"},
+            headers=auth(intern),
+        )
+        assert r.status_code == 200, r.text
+        vid = r.json()["id"]
+        r = client.put(f"/visits/{vid}", json={"ops_test": True}, headers=auth(intern))
+        assert r.status_code == 200, r.text
+        got = {k: asyncio.run_coroutine_threadsafe(_collect(s), loop).result() for k, s in subs.items()}
+    finally:
+        for s in subs.values():
+            broadcaster.unsubscribe(s)
+        loop.call_soon_threadsafe(loop.stop)
+
+    assert [(ev["kind"], ev["visit_id"]) for ev in got["own"]] == [("created", vid), ("updated", vid)]
+    assert got["dep"] == got["own"]
+    assert got["other"] == [] and got["other_dep"] == []
@@ -0,0 +1,40 @@
+﻿"""
+/exports/visits.csv ve .ndjson sabit bellekle akmalı: her biçim ayrı bir alt
+süreçte baştan sona akıtılır (bench.export.measure), tepe RSS artışı satır
+sayısından bağımsız bir sınırın altında kalmalı.
+
+Yavaştır (200k satırlık tohum dahil ~30 sn): python -m pytest -q -m "not slow"
+ile atlanabilir.
+"""
+import pytest
+
+from app.db import make_engine
+from bench.export import measure, seed
+
+# Alt süreçte SQLite sayfa önbelleği küçük tutulur (varsayılanı 20 MB); sınır
+# satır başına birikmeyi yakalasın, önbelleğin dolmasını değil.
+SQLITE_CACHE_KB = 2000
+MAX_RSS_DELTA_MB = 25
+
+
+@pytest.fixture(scope="module", params=[20_000, 200_000], ids=lambda n: f"{n}rows")
+def export_db(request, tmp_path_factory):
+    n = request.param
+    url = f"sqlite:///{tmp_path_factory.mktemp('export') / 'export.db'}"
+    eng = make_engine(url)
+    try:
+        seed(n, eng)
+    finally:
+        eng.dispose()
+    return n, url
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("path, header_lines", [("/exports/visits.csv", 1), ("/exports/visits.ndjson", 0)])
+def test_export_streams_with_constant_memory(export_db, path, header_lines, monkeypatch):
+    n, url = export_db
+    monkeypatch.setenv("SQLITE_CACHE_KB", str(SQLITE_CACHE_KB))
+    r = measure(path, url)
+    assert r["lines"] == n + header_lines, r
+    delta = r["rss_peak_mb"] - r["rss_before_mb"]
+    assert delta <= MAX_RSS_DELTA_MB, r
@@ -0,0 +1,93 @@
+﻿"""
+/visits/by_department keyset sayfalama: (ts, id) imleci aynı ts'li satırlarda
+sayfa sınırında tekrar / atlama yapmamalı; sayfalar arasında eklenen vizitler
+de sırayı bozmamalı.
+"""
+from datetime import date, datetime, timedelta
+from typing import List
+
+from app.models import User, Visit
+
+DEP = "TEST_KEYSET"
+DAY = date(2025, 4, 10)
+TS = datetime(2025, 4, 10, 10, 0, 0)
+
+
+def _insert(db, author_id: int, patient_id: str, stamps: List[datetime]) -> List[int]:
+    rows = [
+        Visit(patient_id=patient_id, author_id=author_id, department=DEP, text="Keyset.", ts=ts, day=DAY)
+        for ts in stamps
+    ]
+    db.add_all(rows)
+    db.commit()
+    return [v.id for v in rows]
+
+
+def _page(client, headers, cursor, limit, day=DAY.isoformat(), department=DEP):
+    params = {"day": day, "department": department, "limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    r = client.get("/visits/by_department", params=params, headers=headers)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    items = sorted(
+        (it for items in body["by_author"].values() for it in items),
+        key=lambda it: (it["ts"], it["id"]), reverse=True,
+    )
+    return items, body["next_cursor"]
+
+
+def test_cursor_pages_are_unique_and_complete_with_inserts(client, auth, info, db):
+    hoca = info["supervisors"][0]
+    aid = db.query(User.id).filter(User.username == info["interns"][5]).scalar()
+    pid = info["patients"][1]
+
+    # 23 vizit aynı ts'de (her sayfa sınırı bu grubun içine düşer), birkaçı önce / sonra
+    expected = set(_insert(db, aid, pid, [TS] * 23))
+    expected |= set(_insert(db, aid, pid, [TS + timedelta(minutes=5)] * 3 + [TS - timedelta(minutes=5)] * 3))
+
+    seen: List[int] = []
+    cursor, pages, last_key = None, 0, None
+    while True:
+        items, cursor = _page(client, auth(hoca), cursor, limit=4)
+        pages += 1
+        for it in items:
+            key = (it["ts"], it["id"])
+            assert last_key is None or key < last_key  # azalan (ts, id) sırası korunur
+            last_key = key
+        seen += [it["id"] for it in items]
+        if not cursor:
+            break
+        # Sayfalar arasında yeni vizitler:
+        # - imlecin önünde kalanlar (aynı ts, daha büyük id / daha yeni ts) bu gezintide gelmez
+        _insert(db, aid, pid, [TS, TS + timedelta(minutes=10)])
+        # - imlecin gerisindekiler (daha eski ts) sonraki sayfalarda gelir
+        expected |= set(_insert(db, aid, pid, [TS - timedelta(minutes=30 + pages)]))
+        assert pages < 50
+
+    assert len(seen) == len(set(seen)), "tekrarlanan vizit"
+    assert set(seen) == expected, "atlanan vizit"
+    assert pages > 5
+
+
+def test_cursor_boundary_inside_equal_timestamps(client, auth, info, db):
+    """Sınır satırıyla aynı ts'li ama daha küçük id'li satırlar sonraki sayfada."""
+    hoca = info["supervisors"][0]
+    aid = db.query(User.id).filter(User.username == info["interns"][6]).scalar()
+    day_ts = datetime(2025, 4, 11, 9, 0, 0)
+    rows = [
+        Visit(patient_id=info["patients"][2], author_id=aid, department="TEST_KEYSET_EQ", text="Eş.",
+              ts=day_ts, day=day_ts.date())
+        for _ in range(10)
+    ]
+    db.add_all(rows)
+    db.commit()
+    ids = sorted((v.id for v in rows), reverse=True)
+
+    got, cursor = [], None
+    while True:
+        items, cursor = _page(client, auth(hoca), cursor, limit=3, day="2025-04-11", department="TEST_KEYSET_EQ")
+        got += [it["id"] for it in items]
+        if not cursor:
+            break
+    assert got == ids
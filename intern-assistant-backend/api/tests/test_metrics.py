@@ -0,0 +1,23 @@
+﻿"""
+/metrics: METRICS_TOKEN yoksa kapalı, varsa sadece Bearer token ile okunur.
+"""
+from app import main
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer x"}).status_code == 404
+
+
+def test_metrics_requires_token(client, auth, info, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "gizli-metrik")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer yanlis"}).status_code == 401
+    # kullanıcı JWT'si yetmez
+    assert client.get("/metrics", headers=auth(info["supervisors"][0])).status_code == 401
+
+    r = client.get("/metrics", headers={"Authorization": "Bearer gizli-metrik"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "route" in r.text
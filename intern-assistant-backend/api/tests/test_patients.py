@@ -0,0 +1,45 @@
+﻿"""
+/patients/list: hasta etiketleri gruplu sorguda gelir; SQL ifadesi sayısı
+hasta sayısıyla artmamalı (N+1 yok).
+"""
+from app.metrics import capture_sql
+
+from conftest import local_today
+
+
+def _admit(client, auth, intern: str, department: str, n: int, tc_base: int):
+    """n yeni hasta kabul et ve her birine bugün bir vizit yaz; hasta kodlarını döndür."""
+    items = [{"tc": str(tc_base + i), "label": f"{department} Yatak {i + 1}"} for i in range(n)]
+    r = client.post("/patients/bulk", json={"items": items}, headers=auth(intern))
+    assert r.status_code == 200, r.text
+    pids = [it["patient_id"] for it in r.json()["results"]]
+    visits = [{"patient_id": pid, "text": "Kontrol vizit.", "department": department} for pid in pids]
+    r = client.post("/visits/bulk", json={"items": visits}, headers=auth(intern))
+    assert r.status_code == 200 and r.json()["created"] == n, r.text
+    return pids
+
+
+def _list(client, auth, user: str, department: str):
+    with capture_sql() as q:
+        r = client.get("/patients/list", params={"day": local_today(), "department": department}, headers=auth(user))
+    assert r.status_code == 200, r.text
+    return r.json()["items"], q
+
+
+def test_list_patients_statement_count_is_constant(client, auth, info):
+    intern, hoca = info["interns"][0], info["supervisors"][0]
+    small = _admit(client, auth, intern, "TEST_AZ", 5, 20000000000)
+    large = _admit(client, auth, intern, "TEST_COK", 50, 20000001000)
+    _list(client, auth, hoca, "TEST_AZ")  # kimlik ve kullanıcı dizini önbelleklerini ısıt
+
+    items5, q5 = _list(client, auth, hoca, "TEST_AZ")
+    items50, q50 = _list(client, auth, hoca, "TEST_COK")
+    assert {it["patient_id"] for it in items5} == set(small)
+    assert {it["patient_id"] for it in items50} == set(large)
+    assert all(it["label"].startswith("TEST_COK Yatak") for it in items50)
+    assert q5.count == q50.count, (q5, q50)
+    assert q50.count <= 2, q50  # sürüm + gruplu liste (kimlik önbellekte)
+
+    # intern kapsamı da aynı sayıda ifadeyle
+    _, qi = _list(client, auth, intern, "TEST_COK")
+    assert qi.count == q50.count, qi
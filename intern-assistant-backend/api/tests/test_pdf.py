@@ -0,0 +1,45 @@
+﻿"""
+Gün sonu PDF'i: render girdileri hazırlanırken istek oturumu kapatılmaz; bağlantı
+sadece transaction bitirilerek bırakılır, oturum sonraki işler için kullanılabilir.
+"""
+import pytest
+
+from app import main
+from app.models import User
+from app.pdf import HAVE_REPORTLAB, pdf_renderer
+
+from conftest import SCALE
+
+pytestmark = pytest.mark.skipif(not HAVE_REPORTLAB, reason="reportlab yok")
+
+DAY = SCALE.day(2).isoformat()
+
+
+def test_make_args_leaves_session_open(info, db):
+    user = db.query(User).filter(User.username == info["supervisors"][0]).one()
+    _, _, _, make_args = main._daily_pdf(db, DAY, "ALL", None)
+    title, lines, perf_rows, feed_rows = make_args()
+    assert DAY in title and lines and perf_rows and len(feed_rows) == 50
+    assert user in db  # close() kimlik haritasını boşaltırdı
+
+    args = main._pdf_args(db, make_args)()
+    assert args == (title, lines, perf_rows, feed_rows)
+    assert user in db and not db.in_transaction()  # bağlantı havuza döndü
+    assert db.query(User).filter(User.id == user.id).one() is user
+
+
+def test_daily_pdf_endpoint(client, auth, info):
+    pdf_renderer.clear()
+    r = client.get("/reports/daily_pdf", params={"day": DAY, "author": info["interns"][0]},
+                   headers=auth(info["supervisors"][0]))
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/pdf"
+    assert r.content.startswith(b"%PDF")
+
+
+def test_prerender_renders_every_target_on_one_session(info):
+    pdf_renderer.clear()
+    out = main._prerender_day(DAY, authors=True)
+    assert out["rendered"] > SCALE.departments + 1  # ALL + bölümler + yazar başına
+    again = main._prerender_day(DAY, authors=True)
+    assert again["rendered"] == 0 and again["current"] == out["rendered"] + out["current"]
@@ -0,0 +1,123 @@
+﻿"""
+/reports/daily: SQL (günlük özet tablosu) toplamları, eski vizit başına
+Python toplamıyla aynı raporu vermeli.
+"""
+from typing import Dict, Optional
+
+import pytest
+from sqlalchemy import and_
+
+from app.main import ist_day_range
+from app.models import User, Visit
+
+from conftest import SCALE
+
+
+def _old_report(db, user: User, day: str, department: str, author: Optional[str]) -> Dict:
+    """Önceki report_daily: günün vizitleri yüklenip Python'da sayılır."""
+    start, end = ist_day_range(day)
+    q = db.query(Visit).filter(and_(Visit.ts >= start, Visit.ts < end))
+    if department != "ALL":
+        q = q.filter(Visit.department == department.upper())
+    if user.role == "intern":
+        q = q.filter(Visit.author_id == user.id)
+    elif author:
+        u = db.query(User).filter(User.username == author).first()
+        if not u:
+            u = db.query(User).filter(User.display_name == author).first()
+        if u:
+            q = q.filter(Visit.author_id == u.id)
+
+    # ORDER BY'sız sorgu o zaman (ts indeksi yokken) rowid sırasıyla dönüyordu
+    rows = q.order_by(Visit.id).all()
+    users = {u.id: u.display_name for u in db.query(User).all()}
+    totals = {"critical": 0, "drugs": 0, "tests": 0, "consults": 0}
+    by_author: Dict[str, int] = {}
+    for r in rows:
+        totals["critical"] += bool(r.ops_critical)
+        totals["drugs"] += bool(r.ops_drug)
+        totals["tests"] += bool(r.ops_test)
+        totals["consults"] += bool(r.ops_consult)
+        nm = users.get(r.author_id, "Bilinmiyor")
+        by_author[nm] = by_author.get(nm, 0) + 1
+
+    by_author_detail: Dict[str, Dict[str, int]] = {}
+    for aid in set(r.author_id for r in rows):
+        arr = [r for r in rows if r.author_id == aid]
+        by_author_detail[users.get(aid, "Bilinmiyor")] = {
+            "patients": len(set(x.patient_id for x in arr)),
+            "visits": len(arr),
+            "critical": sum(1 for x in arr if x.ops_critical),
+        }
+
+    lines = []
+    if totals["critical"]:
+        lines.append(f"{totals['critical']} kritik vaka")
+    if totals["tests"]:
+        lines.append(f"{totals['tests']} tetkik")
+    if totals["drugs"]:
+        lines.append(f"{totals['drugs']} ilaç")
+    if not lines:
+        lines.append("Önemli bulgu yok.")
+    return {
+        "patients_seen": len(set(r.patient_id for r in rows)),
+        "totals": totals,
+        "by_author": by_author,
+        "by_author_detail": by_author_detail,
+        "lines": lines,
+    }
+
+
+def _cases(info):
+    days = [SCALE.day(i).isoformat() for i in range(SCALE.days)] + ["2025-02-01"]  # son gün: boş
+    deps = ["ALL"] + info["departments"]
+    hoca = info["supervisors"][0]
+    for day in days:
+        for dep in deps:
+            yield hoca, day, dep, None
+            for intern in info["interns"][:3]:
+                yield intern, day, dep, None
+                yield hoca, day, dep, intern
+        yield hoca, day, "ALL", "yok.boyle.biri"  # bilinmeyen yazar: filtre uygulanmaz
+
+
+def test_daily_report_matches_per_visit_aggregation(client, auth, info, db):
+    names = {u.username: u for u in db.query(User).all()}
+    checked = 0
+    for username, day, dep, author in _cases(info):
+        params = {"day": day, "department": dep}
+        if author:
+            params["author"] = author
+        r = client.get("/reports/daily", params=params, headers=auth(username))
+        assert r.status_code == 200, r.text
+        got = r.json()
+        want = _old_report(db, names[username], day, dep, author)
+        assert got == want, (username, day, dep, author)
+        assert list(got["by_author"]) == list(want["by_author"])  # ilk vizit sırası
+        checked += 1
+    assert checked > 50
+
+
+def test_author_by_display_name(client, auth, info, db):
+    hoca = info["supervisors"][0]
+    intern = db.query(User).filter(User.username == info["interns"][0]).one()
+    day = SCALE.day(0).isoformat()
+    by_username = client.get("/reports/daily", params={"day": day, "author": intern.username}, headers=auth(hoca))
+    by_display = client.get("/reports/daily", params={"day": day, "author": intern.display_name}, headers=auth(hoca))
+    assert by_username.json() == by_display.json()
+    assert list(by_display.json()["by_author"]) == [intern.display_name]
+
+
+@pytest.mark.parametrize("day_index", range(SCALE.days))
+def test_totals_add_up(client, auth, info, day_index):
+    """Bölüm raporlarının toplamı ALL raporuna eşit."""
+    hoca = info["supervisors"][0]
+    day = SCALE.day(day_index).isoformat()
+    every = client.get("/reports/daily", params={"day": day}, headers=auth(hoca)).json()
+    per_dep = [
+        client.get("/reports/daily", params={"day": day, "department": d}, headers=auth(hoca)).json()
+        for d in info["departments"]
+    ]
+    for k in every["totals"]:
+        assert every["totals"][k] == sum(p["totals"][k] for p in per_dep)
+    assert sum(every["by_author"].values()) == SCALE.visits_per_day
@@ -0,0 +1,69 @@
+﻿"""
+Not araması: Türkçe katlama (İ/ı, Ş/ş, Ç/ç ...) her yolda aynı sonuç vermeli;
+indekssiz yedek tarama (search.scan) FTS5 ile aynı vizitleri bulur.
+"""
+import pytest
+
+from app import search
+from app.models import Visit
+
+DEP = "TEST_ARAMA"
+TEXTS = [
+    "İlaç başlandı, kontrol yarın.",
+    "ILAÇ dozu artırıldı.",
+    "ilaçlar kesildi",
+    "Şişli'den sevk edildi.",
+    "ŞİŞLİ hastanesinde tetkik",
+    "ıslak pansuman yapıldı",
+    "ISLAK PANSUMAN",
+    "Genel durum iyi; öksürük yok.",
+    "ÖKSÜRÜK ve ateş",
+    "axb kodlu kayıt",
+]
+
+
+@pytest.fixture(scope="module")
+def visit_ids(client, auth, info):
+    intern = info["interns"][7]
+    pid = info["patients"][3]
+    ids = []
+    for t in TEXTS:
+        r = client.post("/visits", json={"patient_id": pid, "text": t, "department": DEP}, headers=auth(intern))
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+    return ids
+
+
+def _ids(db, words, fn):
+    q = fn(db, db.query(Visit).filter(Visit.department == DEP), words)
+    return {v.id for v in q.all()}
+
+
+@pytest.mark.parametrize("q, want", [
+    ("İLAÇ", [0, 1, 2]),
+    ("ilac", [0, 1, 2]),
+    ("ilaç kontrol", [0]),
+    ("şişli", [3, 4]),
+    ("SISLI", [3, 4]),
+    ("ıslak", [5, 6]),
+    ("Islak pansuman", [5, 6]),
+    ("öksürük", [7, 8]),
+    ("OKSURUK ATES", [8]),
+])
+def test_fallback_scan_matches_index(db, visit_ids, q, want):
+    words = search.terms(q)
+    expected = {visit_ids[i] for i in want}
+    assert _ids(db, words, search.apply) == expected  # SQLite: FTS5
+    assert _ids(db, words, lambda db, qry, w: search.scan(qry, w)) == expected
+
+
+def test_fallback_scan_escapes_like_wildcards(db, visit_ids):
+    assert _ids(db, ["a_b"], lambda db, qry, w: search.scan(qry, w)) == set()
+    assert _ids(db, ["axb"], lambda db, qry, w: search.scan(qry, w)) == {visit_ids[-1]}
+
+
+def test_search_endpoint_folds_turkish(client, auth, info, visit_ids):
+    hoca = info["supervisors"][0]
+    r = client.get("/visits/search", params={"q": "İLAÇ", "department": DEP}, headers=auth(hoca))
+    assert r.status_code == 200, r.text
+    assert {it["id"] for it in r.json()["items"]} == set(visit_ids[:3])
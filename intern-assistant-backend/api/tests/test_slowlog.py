@@ -0,0 +1,99 @@
+﻿"""
+Yavaş sorgu kaydı: plan istek bağlantısında / transaction'ında değil, ayrı bir
+bağlantıda arka planda alınır; ANALYZE sadece salt okunur düz SELECT'lerde.
+"""
+import os
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from app.db import engine as app_engine
+from app.db import make_engine
+from app.slowlog import SlowQueryLog, analyzable
+
+from conftest import SCALE
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL", "")
+
+
+@pytest.mark.parametrize("statement, ok", [
+    ("SELECT visits.id FROM visits WHERE visits.day = ?", True),
+    ("  select count(*) from visits", True),
+    ("SELECT * FROM visits WHERE id = 1 FOR UPDATE", False),
+    ("SELECT * FROM visits FOR NO KEY UPDATE SKIP LOCKED", False),
+    ("select * from patients for share", False),
+    ("SELECT pg_advisory_xact_lock(7340002)", False),
+    ("SELECT pg_try_advisory_lock(1)", False),
+    ("SELECT nextval('change_log_seq_seq')", False),
+    ("SELECT * INTO visits_copy FROM visits", False),
+    ("WITH d AS (DELETE FROM visits RETURNING id) SELECT count(*) FROM d", False),
+    ("UPDATE visits SET text = 'x'", False),
+])
+def test_analyzable(statement, ok):
+    assert analyzable(statement) is ok
+
+
+def _engine(url):
+    log = SlowQueryLog(threshold_ms=1e-6, analyze_sample=1.0, explain_timeout_ms=50)
+    eng = make_engine(url)
+    log.install([eng])
+    return log, eng
+
+
+def test_plan_is_taken_off_the_request_connection(info):
+    log, eng = _engine(str(app_engine.url))
+    probe_threads = []
+    orig = log._explain
+    log._explain = lambda *a: (probe_threads.append(threading.current_thread().name), orig(*a))[1]
+    try:
+        with eng.connect() as conn:
+            n = conn.execute(text("SELECT count(*) FROM visits WHERE day = :d"), {"d": SCALE.day(0)}).scalar()
+            own = [e for e in log.items() if e["statement"].startswith("SELECT count(*)")]
+            assert own and own[0]["plan_kind"] == "EXPLAIN QUERY PLAN"
+            # istek bağlantısında sadece kendi ifadesi çalıştı; transaction kullanılabilir
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert n == SCALE.visits_per_day
+        assert log.flush(timeout=5)
+        plan = [e for e in log.items() if e["statement"].startswith("SELECT count(*)")][0]["plan"]
+        assert plan and any("ix_" in line or "INDEX" in line.upper() for line in plan), plan
+        assert probe_threads and all(t.startswith("slow-query-explain") for t in probe_threads)
+        assert threading.current_thread().name not in probe_threads
+    finally:
+        eng.dispose()
+
+
+def test_full_explain_queue_skips_plans(info):
+    log, eng = _engine(str(app_engine.url))
+    log.explain_queue = 0
+    try:
+        with eng.connect() as conn:
+            conn.execute(text("SELECT count(*) FROM visits"))
+        assert log.items()[0]["plan"] == ["plan atlandı: bekleyen plan kuyruğu dolu"]
+    finally:
+        eng.dispose()
+
+
+@pytest.fixture
+def pg():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL verilmedi")
+    log, eng = _engine(TEST_POSTGRES_URL)
+    yield log, eng
+    eng.dispose()
+
+
+def test_postgres_failed_probe_does_not_abort_request_transaction(pg):
+    log, eng = pg
+    with eng.begin() as conn:
+        conn.execute(text("SELECT pg_sleep(0.2)"))  # ANALYZE probe'u 50 ms'de zaman aşımına uğrar
+        conn.execute(text("SELECT pg_advisory_xact_lock(7349999)"))
+        assert log.flush(timeout=10)
+        # istek transaction'ı sağlam: sonraki ifadeler çalışır
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    by_stmt = {e["statement"]: e for e in log.items()}
+    sleep = by_stmt["SELECT pg_sleep(0.2)"]
+    assert sleep["plan_kind"] == "EXPLAIN (ANALYZE, BUFFERS)"
+    assert "plan alınamadı" in sleep["plan"][0] and "timeout" in sleep["plan"][0]
+    lock = by_stmt["SELECT pg_advisory_xact_lock(7349999)"]
+    assert lock["plan_kind"] == "EXPLAIN" and lock["plan"] and "plan alınamadı" not in lock["plan"][0]
@@ -0,0 +1,79 @@
+﻿"""
+Sıcak okuma uçlarında N+1 kontrolü (metrics.capture_sql): istek başına SQL
+ifadesi sayısı satır sayısından bağımsız olmalı. Dolu bir gün ile boş bir
+gün aynı sayıda ifade çalıştırır; üst sınırlar bugünkü sayılardır.
+"""
+import pytest
+from sqlalchemy import func
+
+from app.db import SessionLocal
+from app.metrics import capture_sql
+from app.models import Visit
+
+from conftest import SCALE
+
+FULL_DAY = SCALE.day(1).isoformat()
+EMPTY_DAY = "2025-02-01"
+
+# uç -> en fazla ifade sayısı (kimlik ve kullanıcı dizini önbellekte)
+BUDGET = {
+    "/patients/list": 2,
+    "/patients/{pid}/visits": 3,
+    "/visits/by_department": 2,
+    "/dashboard": 2,
+}
+
+
+@pytest.fixture(scope="module")
+def busy_patient(info):
+    """FULL_DAY'de en çok vizitli hasta."""
+    db = SessionLocal()
+    try:
+        return db.query(Visit.patient_id).filter(Visit.day == SCALE.day(1)).group_by(Visit.patient_id) \
+            .order_by(func.count().desc()).limit(1).scalar()
+    finally:
+        db.close()
+
+
+def _count(client, headers, path, params):
+    client.get(path, params=params, headers=headers)  # önbellekleri ısıt
+    with capture_sql() as q:
+        r = client.get(path, params=params, headers=headers)
+    assert r.status_code == 200, r.text
+    return q, r.json()
+
+
+def _cases(info, busy_patient):
+    hoca, intern = info["supervisors"][0], info["interns"][0]
+    for user in (hoca, intern):
+        for dep in ("ALL", info["departments"][0]):
+            yield user, "/patients/list", "/patients/list", {"department": dep}
+            yield user, "/visits/by_department", "/visits/by_department", {"department": dep}
+            yield user, "/dashboard", "/dashboard", {"department": dep}
+        yield user, "/patients/{pid}/visits", f"/patients/{busy_patient}/visits", {}
+
+
+def test_hot_endpoints_have_constant_statement_counts(client, auth, info, busy_patient):
+    for user, name, path, params in _cases(info, busy_patient):
+        full, body = _count(client, auth(user), path, {**params, "day": FULL_DAY})
+        empty, _ = _count(client, auth(user), path, {**params, "day": EMPTY_DAY})
+        assert body, (user, path)
+        assert full.count == empty.count, (user, path, params, list(full), list(empty))
+        assert full.count <= BUDGET[name], (user, path, params, list(full))
+
+
+def test_statement_count_ignores_page_size(client, auth, info):
+    hoca = info["supervisors"][0]
+    for path in ("/visits/by_department", "/dashboard"):
+        small, _ = _count(client, auth(hoca), path, {"day": FULL_DAY, "limit": 5})
+        large, body = _count(client, auth(hoca), path, {"day": FULL_DAY, "limit": 2000})
+        assert small.count == large.count, (path, list(small), list(large))
+
+
+def test_full_day_returns_rows(client, auth, info, busy_patient):
+    """Sayılar anlamlı olsun: dolu gün gerçekten satır döndürüyor."""
+    hoca = info["supervisors"][0]
+    _, visits = _count(client, auth(hoca), f"/patients/{busy_patient}/visits", {"day": FULL_DAY})
+    assert len(visits["visits"]) > 1
+    _, feed = _count(client, auth(hoca), "/visits/by_department", {"day": FULL_DAY, "limit": 2000})
+    assert sum(len(v) for v in feed["by_author"].values()) == SCALE.visits_per_day
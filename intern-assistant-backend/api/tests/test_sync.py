@@ -0,0 +1,136 @@
+﻿"""
+/sync delta senkronizasyonu: intern kapsamı, sayfalardaki vizitlerin hastaları
+ve (TEST_POSTGRES_URL verilirse) Postgres'te commit sırası / imleç sınırı.
+"""
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, delete, text
+from sqlalchemy.orm import sessionmaker
+
+from app import changes
+from app.migrations import upgrade
+from app.models import ChangeLog, Visit
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL", "")
+
+
+def _sync(client, headers, since, limit=500):
+    r = client.get("/sync", params={"since": since, "limit": limit}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _cursor(client, headers):
+    return client.get("/sync", headers=headers).json()["cursor"]
+
+
+def test_intern_receives_patients_of_own_visits(client, auth, info):
+    """Başka intern'in eklediği hastaya yazılan vizit, hastasıyla birlikte gelir."""
+    me, other = info["interns"][3], info["interns"][4]
+    pids = [f"PX-sync-{uuid.uuid4().hex[:8]}" for _ in range(3)]
+    for pid in pids:
+        r = client.post("/patients", json={"patient_id": pid, "label": f"Sync {pid}"}, headers=auth(other))
+        assert r.status_code == 200, r.text
+    since = _cursor(client, auth(me))
+
+    vids = []
+    for pid in pids:
+        r = client.post("/visits", json={"patient_id": pid, "text": "Devir.", "department": "TEST_SYNC"},
+                        headers=auth(me))
+        assert r.status_code == 200, r.text
+        vids.append(r.json()["id"])
+
+    # sayfa başına bir vizit: her sayfa kendi hastasını taşımalı
+    got_visits, cursor, pages = [], since, 0
+    while True:
+        page = _sync(client, auth(me), cursor, limit=1)
+        pages += 1
+        page_pids = {p["patient_id"] for p in page["patients"]}
+        for v in page["visits"]:
+            assert v["patient_id"] in page_pids, page
+        got_visits += [v["id"] for v in page["visits"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert got_visits == vids and pages >= len(vids)
+
+    # tek sayfada da aynı; hastayı ekleyen intern'in kapsamı değişmez
+    page = _sync(client, auth(me), since)
+    assert {p["patient_id"]: p["label"] for p in page["patients"]} == {pid: f"Sync {pid}" for pid in pids}
+    assert _sync(client, auth(other), since)["visits"] == []
+
+
+def test_deleted_visit_sends_no_patient(client, auth, info):
+    me = info["interns"][3]
+    r = client.post("/visits", json={"patient_id": info["patients"][0], "text": "Silinecek.", "department": "TEST_SYNC"},
+                    headers=auth(me))
+    vid = r.json()["id"]
+    since = _cursor(client, auth(me))
+    assert client.delete(f"/visits/{vid}", headers=auth(me)).status_code == 200
+    page = _sync(client, auth(me), since)
+    assert page["deleted_visit_ids"] == [vid]
+    assert page["visits"] == [] and page["patients"] == []
+
+
+# ================== Postgres: eşzamanlı yazıcılar ==================
+@pytest.fixture
+def pg():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL verilmedi")
+    eng = create_engine(TEST_POSTGRES_URL)
+    upgrade(eng)
+    yield sessionmaker(bind=eng)
+    eng.dispose()
+
+
+def _log(db, vid: int) -> None:
+    changes.visit_changed(db, Visit(id=vid, patient_id="PX-pgsync", author_id=1))
+
+
+@pytest.mark.parametrize("outcome", ["commit", "rollback"])
+def test_postgres_reader_waits_for_in_flight_writer(pg, outcome):
+    """
+    A günlüğe ekler (düşük seq) ama commit etmez; B ekler (yüksek seq) ve
+    commit eder. Okuyucu B'nin seq'ini tek başına görüp imleci A'nın üstüne
+    taşımamalı: A bitene kadar bekler, sonra ikisini birden (ya da geri
+    alındıysa sadece B'yi) seq sırasıyla alır.
+    """
+    base_id = 900000000 + int(time.time() * 1000) % 10000000
+    ids = [base_id, base_id + 1]
+    with pg() as s:
+        since = changes.current_cursor(s)
+    a, b, reader = pg(), pg(), pg()
+    try:
+        _log(a, ids[0])  # A: seq alındı, paylaşımlı kilit tutuluyor
+
+        # B, A'yı beklemeden ekleyip commit edebilmeli (yazıcılar birbirini bloklamaz)
+        b.execute(text("SET LOCAL lock_timeout = '2s'"))
+        _log(b, ids[1])
+        b.commit()
+
+        with ThreadPoolExecutor(1) as ex:
+            fut = ex.submit(changes.read, reader, since, None, 1000)
+            time.sleep(0.5)
+            assert not fut.done()  # okuyucu süren yazımı bekliyor
+            getattr(a, outcome)()
+            rows, cursor, _ = fut.result(timeout=10)
+        mine = [r for r in rows if r.visit_id in ids]
+        want = ids if outcome == "commit" else ids[1:]
+        assert [r.visit_id for r in mine] == want
+        assert [r.seq for r in mine] == sorted(r.seq for r in mine)
+        assert cursor >= mine[-1].seq
+
+        # commit edilmemiş yazım yokken imleç beklemeden döner
+        with pg() as s:
+            assert changes.current_cursor(s) >= cursor
+    finally:
+        for s in (a, b, reader):
+            s.rollback()
+            s.close()
+        with pg() as s:
+            s.execute(delete(ChangeLog).where(ChangeLog.visit_id.in_(ids)))
+            s.commit()
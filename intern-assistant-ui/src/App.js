@@ -162,6 +162,7 @@ export default function App() {
   /* reports */
   const [serverReport, setServerReport] = useState(null);
   const [deptFeed, setDeptFeed] = useState(null);
+  const [feedCursor, setFeedCursor] = useState(null);
 
   /* loading + sert yenile */
   const [loadingList, setLoadingList] = useState(false);
@@ -182,6 +183,24 @@ export default function App() {
       { token: session.token }
     );
     setDeptFeed(r?.by_author || {});
+    setFeedCursor(r?.next_cursor || null);
+  };
+
+  // Akışın devamı: next_cursor ile bir sonraki (daha eski) sayfa, yazar bazında eklenir
+  const fetchMoreDeptFeed = async () => {
+    if (!session || !feedCursor) return;
+    const r = await api(
+      `/visits/by_department?department=${dept}&day=${day}&limit=200&cursor=${encodeURIComponent(feedCursor)}`,
+      { token: session.token }
+    );
+    setDeptFeed((prev) => {
+      const next = { ...(prev || {}) };
+      for (const [who, arr] of Object.entries(r?.by_author || {})) {
+        next[who] = [...(next[who] || []), ...arr];
+      }
+      return next;
+    });
+    setFeedCursor(r?.next_cursor || null);
   };
 
   // >>> GÜNCEL: sadece seçili gün+bölüm hastalarını state'e koyar, diğerlerini temizler
@@ -610,6 +629,8 @@ const deleteVisit = async (visitId) => {
             updateVisit,
             serverReport,
             deptFeed,
+            feedCursor,
+            onLoadMoreFeed: fetchMoreDeptFeed,
             day,
             deptSel: dept,
 
@@ -833,6 +854,8 @@ function RightPane({
   updateVisit,
   serverReport,
   deptFeed,
+  feedCursor,
+  onLoadMoreFeed,
   day,
   deptSel,
   refresh,
@@ -898,6 +921,8 @@ function RightPane({
           lines={serverReport?.lines || ["Önemli kritik bulgu kaydı yok."]}
           perfDetail={serverReport?.by_author_detail || {}}
           deptFeed={deptFeed || {}}
+          feedCursor={feedCursor}
+          onLoadMoreFeed={onLoadMoreFeed}
           department={deptSel}
           role={session.role}
           onRefresh={refresh}
@@ -1097,6 +1122,8 @@ function ReportPanel({
   lines,
   perfDetail,
   deptFeed,
+  feedCursor,
+  onLoadMoreFeed,
   department,
   role,
   onRefresh,
@@ -1280,6 +1307,14 @@ const displayDeptFeed = authorFilter
             </div>
           ))}
         </div>
+        {feedCursor && (
+          <button
+            onClick={onLoadMoreFeed}
+            className="mt-2 px-3 py-1.5 rounded-lg bg-slate-100 text-sm hover:bg-slate-200"
+          >
+            Daha eski kayıtlar
+          </button>
+        )}
         {role !== "supervisor" && role !== "admin" && (
           <div className="mt-2 text-xs text-slate-500">
             Not: Öğrenciler akışta yalnızca kendi vizitlerini görür.